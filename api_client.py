@@ -0,0 +1,183 @@
+import os
+import json
+import uuid
+import logging
+from config import (
+    API_SETTINGS_FILE, BASE_URL, API_REQUEST_TIMEOUT, TEMPERATURE, MAX_COMPLETION_TOKENS, SEED, SYSTEM_PROMPT,
+    RESPONSE_CACHE_ENABLED, ATTACHMENT_RETRIEVAL_ENABLED, API_LOGGING
+)
+from response_cache import make_cache_key
+from metrics import RequestTimeline, create_timed_session, take_connect_time
+from utils import _log_api_request, _log_api_response
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+FILE_TYPES = {"py": "python", "txt": "text", "json": "json"}
+
+def default_api_settings():
+    """Возвращает настройки API по умолчанию."""
+    return {
+        "BASE_URL": BASE_URL,
+        "API_REQUEST_TIMEOUT": API_REQUEST_TIMEOUT,
+        "TEMPERATURE": TEMPERATURE,
+        "MAX_COMPLETION_TOKENS": MAX_COMPLETION_TOKENS,
+        "SEED": SEED,
+        "SYSTEM_PROMPT": SYSTEM_PROMPT,
+        "RESPONSE_CACHE": RESPONSE_CACHE_ENABLED,
+        "ATTACHMENT_RETRIEVAL": ATTACHMENT_RETRIEVAL_ENABLED
+    }
+
+def load_api_settings(api_settings, settings_file=API_SETTINGS_FILE):
+    """Загружает настройки API из файла в словарь api_settings, пропуская некорректные значения."""
+    try:
+        if os.path.exists(settings_file):
+            with open(settings_file, "r", encoding="utf-8") as f:
+                loaded_settings = json.load(f)
+            for key in api_settings:
+                if key in loaded_settings:
+                    if key == "API_REQUEST_TIMEOUT":
+                        if isinstance(loaded_settings[key], int) and loaded_settings[key] > 0:
+                            api_settings[key] = loaded_settings[key]
+                    elif key == "TEMPERATURE":
+                        if isinstance(loaded_settings[key], (int, float)) and 0 <= loaded_settings[key] <= 2:
+                            api_settings[key] = float(loaded_settings[key])
+                    elif key == "MAX_COMPLETION_TOKENS":
+                        if isinstance(loaded_settings[key], int) and loaded_settings[key] > 0:
+                            api_settings[key] = loaded_settings[key]
+                    elif key == "SEED":
+                        if isinstance(loaded_settings[key], int):
+                            api_settings[key] = loaded_settings[key]
+                    elif key in ["RESPONSE_CACHE", "ATTACHMENT_RETRIEVAL"]:
+                        if isinstance(loaded_settings[key], bool):
+                            api_settings[key] = loaded_settings[key]
+                    elif key in ["BASE_URL", "SYSTEM_PROMPT"]:
+                        if isinstance(loaded_settings[key], str) and loaded_settings[key].strip():
+                            api_settings[key] = loaded_settings[key]
+            app_logger.info("Настройки API успешно загружены")
+        else:
+            app_logger.info("Файл настроек API не найден, используются значения по умолчанию")
+    except Exception as e:
+        app_logger.error(f"Ошибка загрузки настроек API: {str(e)}")
+    return api_settings
+
+def get_file_type(file_path):
+    """Определяет тип прикрепленного файла по расширению."""
+    ext = os.path.splitext(file_path)[1][1:].lower()
+    file_type = FILE_TYPES.get(ext)
+    if not file_type:
+        raise ValueError("Неподдерживаемый тип файла")
+    return file_type
+
+def build_user_content(prompt, image_urls=(), file_path=None, file_content=None, excerpt=None):
+    """Собирает содержимое сообщения пользователя для API и текст для истории чата.
+
+    Returns:
+        tuple: (список частей содержимого для API, текст сообщения для истории).
+    """
+    message_content = prompt
+    content = [{"type": "text", "text": message_content}]
+    if image_urls:
+        message_content += f" [Изображения: {len(image_urls)}]"
+        for img_url in image_urls:
+            content.append({"type": "image_url", "image_url": {"url": img_url}})
+    if file_content:
+        file_type = get_file_type(file_path)
+        if excerpt is not None:
+            message_content += f"\n``` {file_type}\n{excerpt}\n```"
+            content[0]["text"] += f"\n\nФрагменты файла {os.path.basename(file_path)} ({file_type}):\n```\n{excerpt}\n```"
+        else:
+            message_content += f"\n``` {file_type}\n{file_content}\n```"
+            content[0]["text"] += f"\n\nСодержимое файла ({file_type}):\n```\n{file_content}\n```"
+    return content, message_content
+
+def build_messages(system_prompt, history, content):
+    """Собирает список сообщений запроса из системного промпта, истории и нового сообщения."""
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt
+        }
+    ]
+    for msg in history:
+        messages.append({
+            "role": msg["role"],
+            "content": msg["content"]
+        })
+    messages.append({
+        "role": "user",
+        "content": content
+    })
+    return messages
+
+def create_completion(model_id, messages, api_settings, api_key, session=None, response_cache=None, timeline=None):
+    """Создает запрос на завершение чата к API, записывая этапы во временную шкалу.
+
+    Args:
+        session: Транспорт с интерфейсом requests.Session.post; по умолчанию создается новая сессия.
+        response_cache: Кэш ответов, используется при включенной настройке RESPONSE_CACHE.
+    """
+    timeline = timeline or RequestTimeline(model_id)
+    session = session or create_timed_session()
+    completions_url = f"{api_settings['BASE_URL']}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "X-Request-ID": str(uuid.uuid4())
+    }
+    data = {
+        "model": model_id,
+        "messages": messages,
+        "temperature": api_settings['TEMPERATURE'],
+        "max_completion_tokens": api_settings['MAX_COMPLETION_TOKENS'],
+        "seed": api_settings['SEED'],
+        "user": "user123"
+    }
+    timeline.request_id = headers["X-Request-ID"]
+    cache_key = None
+    if response_cache is not None and api_settings.get("RESPONSE_CACHE"):
+        cache_key = make_cache_key(
+            model_id,
+            messages,
+            data["temperature"],
+            data["max_completion_tokens"],
+            data["seed"]
+        )
+        cached_response = response_cache.get(cache_key)
+        timeline.mark("cache")
+        if cached_response is not None:
+            app_logger.info(f"Ответ модели {model_id} получен из кэша")
+            timeline.cached = True
+            timeline.usage = cached_response.get("usage") or {}
+            cached_response["from_cache"] = True
+            cached_response["timeline"] = timeline
+            return cached_response
+    if API_LOGGING["enabled"]:
+        _log_api_request(model_id, data, headers["X-Request-ID"])
+    body = json.dumps(data).encode("utf-8")
+    timeline.request_bytes = len(body)
+    timeline.mark("serialize")
+    take_connect_time()
+    response = session.post(
+        completions_url,
+        headers=headers,
+        data=body,
+        timeout=api_settings['API_REQUEST_TIMEOUT'],
+        stream=True
+    )
+    timeline.mark("ttfb")
+    timeline.move("ttfb", "connect", take_connect_time())
+    response.raise_for_status()
+    raw_content = response.content
+    timeline.response_bytes = len(raw_content)
+    timeline.mark("download")
+    result = json.loads(raw_content)
+    timeline.usage = result.get("usage") or {}
+    timeline.mark("parse")
+    if API_LOGGING["enabled"]:
+        # Запись сериализуется в потоке журнала, а в ответ ниже добавляется timeline: пишется копия
+        _log_api_response(dict(result), headers["X-Request-ID"])
+    if cache_key:
+        response_cache.put(cache_key, result)
+    result["timeline"] = timeline
+    return result
@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from config import ATTACHMENT_RETRIEVAL
+from embeddings import embed_texts
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+def chunk_text(text, chunk_lines=None, overlap=None):
+    """Разбивает текст на перекрывающиеся фрагменты по строкам.
+
+    Returns:
+        list: Список кортежей (первая строка, последняя строка, текст фрагмента), строки с 1.
+    """
+    chunk_lines = chunk_lines or ATTACHMENT_RETRIEVAL["chunk_lines"]
+    overlap = ATTACHMENT_RETRIEVAL["overlap_lines"] if overlap is None else overlap
+    lines = text.splitlines()
+    step = max(1, chunk_lines - overlap)
+    chunks = []
+    for start in range(0, max(1, len(lines)), step):
+        end = min(len(lines), start + chunk_lines)
+        chunk = "\n".join(lines[start:end])
+        if chunk.strip():
+            chunks.append((start + 1, end, chunk))
+        if end >= len(lines):
+            break
+    return chunks
+
+def _load_file_index(model_id, content):
+    """Возвращает фрагменты файла и их нормализованные эмбеддинги из кэша по хэшу файла."""
+    file_key = hashlib.sha256(
+        f"{model_id}\x00{ATTACHMENT_RETRIEVAL['chunk_lines']}\x00{ATTACHMENT_RETRIEVAL['overlap_lines']}\x00{content}".encode("utf-8")
+    ).hexdigest()
+    base_path = os.path.join(ATTACHMENT_RETRIEVAL["cache_dir"], file_key)
+    if os.path.exists(base_path + ".json") and os.path.exists(base_path + ".npy"):
+        try:
+            with open(base_path + ".json", "r", encoding="utf-8") as f:
+                bounds = json.load(f)
+            vectors = np.load(base_path + ".npy", mmap_mode="r")
+            return file_key, bounds, vectors
+        except Exception as e:
+            app_logger.error(f"Ошибка чтения кэша вложения {file_key}: {str(e)}")
+    return file_key, None, None
+
+def _save_file_index(file_key, bounds, vectors):
+    """Сохраняет фрагменты файла и их эмбеддинги в кэш."""
+    os.makedirs(ATTACHMENT_RETRIEVAL["cache_dir"], exist_ok=True)
+    base_path = os.path.join(ATTACHMENT_RETRIEVAL["cache_dir"], file_key)
+    np.save(base_path + ".npy", vectors)
+    with open(base_path + ".json", "w", encoding="utf-8") as f:
+        json.dump(bounds, f)
+
+def select_relevant_chunks(model_id, content, query, api_settings, api_key, top_k=None):
+    """Выбирает фрагменты файла, наиболее релевантные запросу.
+
+    Returns:
+        list: Фрагменты (первая строка, последняя строка, текст) в порядке следования в файле.
+    """
+    top_k = top_k or ATTACHMENT_RETRIEVAL["top_k"]
+    chunks = chunk_text(content)
+    if len(chunks) <= top_k:
+        return chunks
+    file_key, bounds, vectors = _load_file_index(model_id, content)
+    if vectors is None or len(bounds) != len(chunks):
+        vectors = embed_texts(model_id, [chunk for _, _, chunk in chunks], api_settings, api_key)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        _save_file_index(file_key, [[start, end] for start, end, _ in chunks], vectors)
+    query_vector = embed_texts(model_id, [query], api_settings, api_key)[0]
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    scores = vectors @ query_vector
+    best = np.argpartition(scores, -top_k)[-top_k:]
+    app_logger.debug(f"Выбрано {top_k} из {len(chunks)} фрагментов вложения")
+    return [chunks[i] for i in sorted(best)]
+
+def _merge_ranges(chunks):
+    """Объединяет перекрывающиеся и соседние диапазоны строк фрагментов."""
+    merged = []
+    for start, end, _ in chunks:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def build_excerpt(content, chunks):
+    """Формирует текст выдержки из файла по выбранным фрагментам."""
+    lines = content.splitlines()
+    parts = []
+    for start, end in _merge_ranges(chunks):
+        parts.append(f"# строки {start}-{end} из {len(lines)}\n" + "\n".join(lines[start - 1:end]))
+    return "\n...\n".join(parts)
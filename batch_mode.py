@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+from config import BATCH_SETTINGS, SUPPORTED_IMAGE_FORMATS, SUPPORTED_FILE_FORMATS, MAX_FILE_SIZE
+from logging_config import configure_logging
+from encrypt import load_api_key
+from response_cache import ResponseCache
+from metrics import create_timed_session
+from cassette import create_transport
+from utils import _is_valid_url, _process_images_task
+from api_client import default_api_settings, load_api_settings, build_user_content, build_messages, create_completion
+
+load_dotenv()
+configure_logging()
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+class RateLimiter:
+    """Равномерно распределяет запросы во времени не чаще rate в секунду."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Ожидает очередного разрешенного момента отправки."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def read_rows(filepath):
+    """Читает строки входного JSONL-файла, пропуская пустые."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield index, {"_error": f"Некорректный JSON: {str(e)}"}
+
+def row_prompt(row):
+    """Возвращает текст запроса строки: поле prompt или заголовок и описание."""
+    if row.get("prompt"):
+        return row["prompt"]
+    return "\n\n".join(part for part in (row.get("title"), row.get("body")) if part)
+
+def build_row_messages(row, api_settings):
+    """Собирает сообщения запроса для строки пакета, включая вложения."""
+    prompt = row_prompt(row)
+    attachments = row.get("attachments") or []
+    if isinstance(attachments, str):
+        attachments = [attachments]
+    image_urls = []
+    file_path = None
+    file_content = None
+    for attachment in attachments:
+        ext = os.path.splitext(attachment)[1].lower()
+        if _is_valid_url(attachment):
+            image_urls.append(attachment)
+        elif ext[1:] in SUPPORTED_IMAGE_FORMATS:
+            for _, encoded_image in _process_images_task([attachment]):
+                image_urls.append(f"data:image/jpeg;base64,{encoded_image}")
+        elif ext in SUPPORTED_FILE_FORMATS:
+            if file_path:
+                raise ValueError("Поддерживается только один файл на запрос")
+            if os.path.getsize(attachment) > MAX_FILE_SIZE:
+                raise ValueError(f"Файл {attachment} слишком большой")
+            with open(attachment, "r", encoding="utf-8") as f:
+                file_content = f.read()
+            file_path = attachment
+        else:
+            raise ValueError(f"Неподдерживаемое вложение: {attachment}")
+    if len(image_urls) > 10:
+        raise ValueError("Максимум 10 изображений за запрос")
+    if not prompt and image_urls:
+        prompt = "Что на этих изображениях?"
+    if not prompt and not file_content:
+        raise ValueError("Пустой запрос")
+    content, _ = build_user_content(prompt, image_urls, file_path, file_content)
+    return build_messages(api_settings["SYSTEM_PROMPT"], row.get("history", []), content)
+
+def _retry_delay(error, attempt, backoff):
+    """Возвращает паузу перед повтором или None, если ошибку повторять не нужно."""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        if response is None or (response.status_code != 429 and response.status_code < 500):
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    elif not isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return None
+    return backoff * (2 ** attempt)
+
+class BatchRunner:
+    """Выполняет запросы из JSONL-файла параллельно с ограничением частоты."""
+    def __init__(self, api_settings, api_key, default_model=None, max_workers=None, rate_limit=None,
+                 retries=None, retry_backoff=None, transport=None):
+        self.api_settings = api_settings
+        self.api_key = api_key
+        self.default_model = default_model
+        self.max_workers = max_workers or BATCH_SETTINGS["max_workers"]
+        self.retries = BATCH_SETTINGS["retries"] if retries is None else retries
+        self.retry_backoff = BATCH_SETTINGS["retry_backoff"] if retry_backoff is None else retry_backoff
+        self.rate_limiter = RateLimiter(BATCH_SETTINGS["rate_limit"] if rate_limit is None else rate_limit)
+        self.response_cache = ResponseCache() if api_settings.get("RESPONSE_CACHE") else None
+        self.transport = transport
+        self._local = threading.local()
+        self._output_lock = threading.Lock()
+        self.counts = {"ok": 0, "error": 0}
+
+    def _session(self):
+        """Возвращает общий транспорт (кассету) или HTTP-сессию текущего потока."""
+        if self.transport is not None:
+            return self.transport
+        if not hasattr(self._local, "session"):
+            self._local.session = create_timed_session()
+        return self._local.session
+
+    def run_row(self, index, row):
+        """Выполняет запрос одной строки и возвращает запись результата."""
+        result = {"index": index, "id": row.get("id", row.get("request_id", index))}
+        model_id = row.get("model") or self.default_model
+        result["model"] = model_id
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            if not model_id:
+                raise ValueError("Не указана модель")
+            messages = build_row_messages(row, self.api_settings)
+            while True:
+                self.rate_limiter.wait()
+                try:
+                    response = create_completion(
+                        model_id,
+                        messages,
+                        self.api_settings,
+                        self.api_key,
+                        session=self._session(),
+                        response_cache=self.response_cache
+                    )
+                    break
+                except Exception as e:
+                    delay = _retry_delay(e, attempt, self.retry_backoff)
+                    if delay is None or attempt >= self.retries:
+                        raise
+                    attempt += 1
+                    app_logger.warning(f"Строка {index}: повтор {attempt} через {delay:.1f} с ({str(e)})")
+                    time.sleep(delay)
+            timeline = response.pop("timeline")
+            result.update({
+                "status": "ok",
+                "content": response["choices"][0]["message"]["content"],
+                "usage": response.get("usage") or {},
+                "cached": bool(response.get("from_cache")),
+                "stages_ms": timeline.to_dict()["stages_ms"]
+            })
+        except Exception as e:
+            result.update({"status": "error", "error": str(e)})
+        result["attempts"] = attempt + 1
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def run(self, input_path, output_path):
+        """Обрабатывает входной файл и построчно дописывает результаты в выходной JSONL."""
+        # Ограничиваем число ожидающих задач, чтобы не держать в памяти весь входной файл
+        pending = threading.BoundedSemaphore(self.max_workers * 2)
+        started = time.perf_counter()
+        with open(output_path, "w", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def write_result(future):
+                try:
+                    result = future.result()
+                    with self._output_lock:
+                        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        output.flush()
+                        self.counts[result["status"]] += 1
+                finally:
+                    pending.release()
+
+            for index, row in read_rows(input_path):
+                pending.acquire()
+                executor.submit(self.run_row, index, row).add_done_callback(write_result)
+        elapsed = time.perf_counter() - started
+        app_logger.info(f"Пакет {input_path} обработан за {elapsed:.1f} с: {self.counts}")
+        return dict(self.counts, elapsed_s=round(elapsed, 3))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная отправка запросов из JSONL-файла без интерфейса")
+    parser.add_argument("input", help="Входной JSONL: prompt или title/body, model, attachments")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="Выходной JSONL с результатами")
+    parser.add_argument("--model", help="Модель для строк без поля model")
+    parser.add_argument("--workers", type=int, default=BATCH_SETTINGS["max_workers"], help="Одновременных запросов")
+    parser.add_argument("--rate", type=float, default=BATCH_SETTINGS["rate_limit"], help="Запросов в секунду (0 — без ограничения)")
+    parser.add_argument("--retries", type=int, default=BATCH_SETTINGS["retries"], help="Повторов при 429 и ошибках сети")
+    parser.add_argument("--base-url", help="Переопределить BASE_URL")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="CASSETTE", help="Записать обмены с API в кассету")
+    cassette_group.add_argument("--replay", metavar="CASSETTE", help="Отвечать на запросы из кассеты без сети")
+    parser.add_argument("--latency-scale", type=float, help="Множитель записанных задержек при воспроизведении")
+    args = parser.parse_args(argv)
+    transport = None
+    if args.record:
+        transport = create_transport("record", args.record)
+    elif args.replay:
+        transport = create_transport("replay", args.replay, args.latency_scale)
+    api_settings = load_api_settings(default_api_settings())
+    if args.base_url:
+        api_settings["BASE_URL"] = args.base_url
+    runner = BatchRunner(
+        api_settings,
+        load_api_key(),
+        default_model=args.model,
+        max_workers=args.workers,
+        rate_limit=args.rate,
+        retries=args.retries,
+        transport=transport
+    )
+    summary = runner.run(args.input, args.output)
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0 if summary["error"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import itertools
+import platform
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Бенчмарки выполняются без окна
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PIL import Image
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout
+from PyQt6.QtGui import QTextDocument, QTextCursor
+import utils
+import local_server
+from config import DATE_FORMAT
+from chat_message import ChatMessage
+from completion_index import CompletionIndex
+from cassette import ReplaySession
+from api_client import default_api_settings, create_completion
+import text_editors
+from text_editors import NonScrollableTextEdit, EnterKeyTextEdit, SyntaxHighlighter
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.25  # Допустимое замедление медианы относительно базовой линии
+HISTORY_SIZES = [1000, 10000, 100000]
+WORDS = ["модель", "ответ", "история", "def", "class", "return", "import", "запрос", "чат", "token", "image", "json"]
+CODE_SNIPPET = '''def process(items, limit=10):
+    """Обрабатывает элементы."""
+    result = []  # накапливаем результат
+    for index, item in enumerate(items):
+        if index > limit and item != "stop":
+            result.append(f"{index}: {item!r}" + 'x' * 3)
+        elif item == 3.14:
+            return None
+    return result
+'''
+
+def _generate_history(count, seed=0):
+    """Создает синтетическую историю чата из count сообщений."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    history = []
+    for i in range(count):
+        history.append({
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(WORDS) + str(rng.randint(0, 500)) for _ in range(rng.randint(5, 60))),
+            "timestamp": start + timedelta(seconds=i)
+        })
+    return history
+
+def _generate_images(directory, count, size=(1024, 1024), seed=0):
+    """Создает набор PNG-изображений со случайным шумом."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"bench_{i}.png")
+        Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+def _measure(func, repeat, setup=None):
+    """Выполняет func repeat раз и возвращает статистику времени в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3)
+    }
+
+def bench_history(workdir, sizes, repeat):
+    """Сохранение и загрузка истории чата."""
+    results = {}
+    history_file = os.path.join(workdir, "chat_history.json")
+    utils.CHAT_HISTORY_FILE = history_file
+    for size in sizes:
+        history = _generate_history(size)
+        results[f"history_save_{size}"] = _measure(
+            utils._save_chat_history_task,
+            repeat,
+            setup=lambda: ([dict(message) for message in history],)
+        )
+
+        def load():
+            for message in utils._load_full_history():
+                datetime.strptime(message["timestamp"], DATE_FORMAT)
+        results[f"history_load_{size}"] = _measure(load, repeat)
+    return results
+
+def bench_images(image_paths, repeat):
+    """Проверка и кодирование изображений, построение миниатюр."""
+    results = {"process_images": _measure(utils._process_images_task, repeat, setup=lambda: (image_paths,))}
+    # _load_image вызывается с минимальной заменой ChatMessage, чтобы измерять только конвертацию
+    message = SimpleNamespace(message_text=NonScrollableTextEdit(), thumbnail=None, _is_valid_url=lambda url: True)
+    container = QWidget()
+    layout = QVBoxLayout(container)
+
+    def load_thumbnails():
+        for path in image_paths:
+            # Построенная миниатюра сохраняется в сообщении, сбрасываем ее, чтобы измерять конвертацию
+            message.thumbnail = None
+            ChatMessage._load_image(message, layout, path, None)
+    results["load_image_thumbnails"] = _measure(load_thumbnails, repeat)
+    return results
+
+def bench_highlighter(lines, repeat):
+    """Разбор и подсветка синтаксиса большого ответа с кодом."""
+    code = CODE_SNIPPET * (lines // CODE_SNIPPET.count("\n"))
+
+    def uncached():
+        text_editors._runs_cache.clear()
+        return "python", code
+    results = {f"tokenize_{lines}_lines": _measure(text_editors.tokenize_code, repeat, setup=uncached)}
+    document = QTextDocument()
+    document.setPlainText("```python\n" + code + "```")
+    highlighter = SyntaxHighlighter(document, SimpleNamespace(current_theme="dark"))
+    # Разбор уже в кэше: измеряется только работа в потоке интерфейса
+    text_editors.tokenize_code("python", code.rstrip("\n"))
+    results[f"highlight_{lines}_lines"] = _measure(highlighter.rehighlight, repeat)
+    return results
+
+def bench_completions(workdir, sizes, repeat):
+    """Построение индекса автодополнения по истории чата и поиск по префиксу."""
+    results = {}
+    parent = QWidget()
+    editor = EnterKeyTextEdit(parent)
+    prefixes = itertools.cycle(sorted({word[:length] for word in WORDS for length in (2, 3)}))
+
+    def next_prefix():
+        # Каждый повтор — новый префикс: измеряется запрос к индексу, а не кэш результатов
+        editor.setPlainText(next(prefixes))
+        editor.moveCursor(QTextCursor.MoveOperation.End)
+        editor._completion_prefix = None
+        return ()
+    for size in sizes:
+        history = _generate_history(size)
+        filepath = os.path.join(workdir, f"completion_index_{size}.json")
+        results[f"completion_index_build_{size}"] = _measure(
+            lambda: CompletionIndex(filepath).update(history), repeat
+        )
+        parent.completion_index = CompletionIndex(filepath)
+        parent.completion_index.update(history)
+        results[f"update_completions_{size}"] = _measure(editor.update_completions, repeat, setup=next_prefix)
+    return results
+
+def bench_local_server(workdir, image_paths, repeat):
+    """Пропускная способность загрузки и выдачи файлов локальным сервером."""
+    upload_folder = os.path.join(workdir, "uploads")
+    os.makedirs(upload_folder, exist_ok=True)
+    local_server.app.config["UPLOAD_FOLDER"] = upload_folder
+    client = local_server.app.test_client()
+    payloads = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            payloads.append((os.path.basename(path), f.read()))
+    total_mb = sum(len(data) for _, data in payloads) / 1024 / 1024
+
+    def upload():
+        for name, data in payloads:
+            response = client.post("/upload", data={"image": (io.BytesIO(data), name)}, content_type="multipart/form-data")
+            assert response.status_code == 200, response.status_code
+
+    def serve():
+        for name, _ in payloads:
+            response = client.get(f"/uploads/{name}")
+            assert response.status_code == 200, response.status_code
+            response.get_data()
+            response.close()
+    results = {"server_upload": _measure(upload, repeat), "server_serve": _measure(serve, repeat)}
+    for name in ("server_upload", "server_serve"):
+        results[name]["throughput_mb_s"] = round(total_mb / (results[name]["median_ms"] / 1000), 2)
+    return results
+
+def bench_replay(cassette_path, repeat):
+    """Воспроизведение записанных ответов API и отрисовка их в сообщениях чата без сети."""
+    transport = ReplaySession(cassette_path, latency_scale=0, sequential=True)
+    api_settings = default_api_settings()
+    app_stub = SimpleNamespace(current_theme="dark")
+    responses = []
+
+    def replay():
+        responses.clear()
+        for i in range(len(transport)):
+            responses.append(create_completion("replay", [{"role": "user", "content": str(i)}], api_settings, "", session=transport))
+
+    def render():
+        for response in responses:
+            message = ChatMessage(None, response["choices"][0]["message"]["content"], is_user=False, timestamp=datetime.now(), app=app_stub)
+            message.deleteLater()
+    return {"replay_completions": _measure(replay, repeat), "replay_render": _measure(render, repeat)}
+
+def run_benchmarks(quick=False, only=None, cassette=None):
+    """Запускает все бенчмарки и возвращает результаты."""
+    qt_app = QApplication.instance() or QApplication(sys.argv)
+    repeat = 3 if quick else 5
+    sizes = HISTORY_SIZES[:2] if quick else HISTORY_SIZES
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    results = {}
+    try:
+        image_paths = _generate_images(workdir, 4 if quick else 8)
+        suites = {
+            "history": lambda: bench_history(workdir, sizes, repeat),
+            "images": lambda: bench_images(image_paths, repeat),
+            "highlighter": lambda: bench_highlighter(2000 if quick else 10000, repeat),
+            "completions": lambda: bench_completions(workdir, sizes, repeat),
+            "local_server": lambda: bench_local_server(workdir, image_paths, repeat)
+        }
+        if cassette:
+            suites["replay"] = lambda: bench_replay(cassette, repeat)
+        for name, suite in suites.items():
+            if only and name not in only:
+                continue
+            print(f"== {name}", flush=True)
+            for bench_name, result in suite().items():
+                print(f"  {bench_name:<32} {result['median_ms']:>12.3f} ms", flush=True)
+                results[bench_name] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        qt_app.processEvents()
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick
+        },
+        "results": results
+    }
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Сравнивает медианы с базовой линией и возвращает список регрессий."""
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        status = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"  {name:<32} {base['median_ms']:>12.3f} -> {result['median_ms']:>12.3f} ms  x{ratio:.2f}  {status}")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей приложения")
+    parser.add_argument("--output", help="Файл для сохранения результатов в JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Файл базовой линии для сравнения")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результаты как новую базовую линию")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Допустимое относительное замедление")
+    parser.add_argument("--quick", action="store_true", help="Уменьшенные размеры данных и число повторов")
+    parser.add_argument("--only", nargs="+", help="Запустить только указанные наборы")
+    parser.add_argument("--cassette", help="Кассета с записанными ответами API для набора replay")
+    args = parser.parse_args(argv)
+    results = run_benchmarks(quick=args.quick, only=args.only, cassette=args.cassette)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена в {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Базовая линия {args.baseline} не найдена, сравнение пропущено")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"== сравнение с {args.baseline} (допуск {args.tolerance:.0%})")
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Обнаружены регрессии: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import threading
+import logging
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import urlparse
+import requests
+from config import CASSETTE
+from metrics import create_timed_session
+from utils import _elide_images
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+def _open_cassette(filepath, mode):
+    """Открывает файл кассеты, сжатый gzip при расширении .gz."""
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, mode + "t", encoding="utf-8")
+    return open(filepath, mode, encoding="utf-8")
+
+def request_key(method, url, body):
+    """Ключ обмена: метод, конечная точка и тело запроса (без заголовков и BASE_URL)."""
+    digest = hashlib.sha256()
+    digest.update(f"{method.upper()} {urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]}\n".encode("utf-8"))
+    digest.update(body if isinstance(body, bytes) else (body or "").encode("utf-8"))
+    return digest.hexdigest()
+
+class CassetteResponse:
+    """Ответ из кассеты с интерфейсом requests.Response, воспроизводящий разбиение на чанки."""
+    def __init__(self, url, status_code, headers, body, chunks, latency_scale=1.0):
+        self.url = url
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        try:
+            self.reason = HTTPStatus(status_code).phrase
+        except ValueError:
+            self.reason = ""
+        self._body = body
+        self._chunks = chunks
+        self._latency_scale = latency_scale
+        self._content = None
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        """Отдает тело ответа исходными чанками с исходными паузами между ними."""
+        position = 0
+        last_offset = 0.0
+        for offset_ms, length in self._chunks:
+            delay = (offset_ms - last_offset) / 1000 * self._latency_scale
+            if delay > 0:
+                time.sleep(delay)
+            last_offset = offset_ms
+            chunk = self._body[position:position + length]
+            position += length
+            yield chunk.decode("utf-8", errors="replace") if decode_unicode else chunk
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.iter_content())
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        pass
+
+class RecordingSession:
+    """Транспорт, записывающий обмены с API в кассету.
+
+    Каждая строка кассеты хранит ключ запроса, тело запроса (без base64-изображений),
+    статус, заголовки, время до первого байта и границы чанков ответа
+    в виде пар [смещение от начала запроса в мс, длина в байтах].
+    """
+    def __init__(self, filepath, session=None):
+        self.filepath = filepath
+        self.session = session or create_timed_session()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        self._file = _open_cassette(filepath, "a")
+        atexit.register(self.close)
+
+    def post(self, url, data=None, **kwargs):
+        kwargs["stream"] = True
+        started = time.perf_counter()
+        response = self.session.post(url, data=data, **kwargs)
+        ttfb_ms = (time.perf_counter() - started) * 1000
+        chunks = []
+        parts = []
+        for chunk in response.iter_content(chunk_size=None):
+            if chunk:
+                chunks.append([round((time.perf_counter() - started) * 1000, 3), len(chunk)])
+                parts.append(chunk)
+        body = b"".join(parts)
+        try:
+            request_body = _elide_images(json.loads(data)) if data else None
+        except ValueError:
+            request_body = None
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() in ("content-type", "retry-after")
+        }
+        self._append({
+            "key": request_key("POST", url, data),
+            "method": "POST",
+            "path": urlparse(url).path,
+            "request": request_body,
+            "status": response.status_code,
+            "headers": headers,
+            "ttfb_ms": round(ttfb_ms, 3),
+            "chunks": chunks,
+            "body": body.decode("utf-8", errors="replace")
+        })
+        return CassetteResponse(url, response.status_code, headers, body, [[0.0, len(body)]] if body else [], 0)
+
+    def _append(self, interaction):
+        """Дописывает обмен в файл кассеты."""
+        line = json.dumps(interaction, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """Закрывает файл кассеты."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+class ReplaySession:
+    """Транспорт, отвечающий на запросы из кассеты с исходной или масштабированной задержкой.
+
+    Одинаковые запросы получают записанные ответы по очереди. При sequential=True
+    запросы без точного совпадения получают следующий по порядку записанный ответ.
+    """
+    def __init__(self, filepath, latency_scale=1.0, sequential=False):
+        self.latency_scale = latency_scale
+        self.sequential = sequential
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._sequence = []
+        self._position = 0
+        with _open_cassette(filepath, "r") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._by_key.setdefault(interaction["key"], deque()).append(interaction)
+                    self._sequence.append(interaction)
+        app_logger.info(f"Кассета {filepath} загружена: {len(self._sequence)} обменов")
+
+    def __len__(self):
+        return len(self._sequence)
+
+    def _take(self, key):
+        """Выбирает записанный обмен для запроса."""
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                # Последний ответ для ключа остается доступным для повторных запросов
+                return queue.popleft() if len(queue) > 1 else queue[0]
+            if self.sequential and self._sequence:
+                interaction = self._sequence[self._position % len(self._sequence)]
+                self._position += 1
+                return interaction
+            return None
+
+    def post(self, url, data=None, **kwargs):
+        interaction = self._take(request_key("POST", url, data))
+        if interaction is None:
+            raise ValueError(f"Запрос к {urlparse(url).path} отсутствует в кассете")
+        time.sleep(interaction["ttfb_ms"] / 1000 * self.latency_scale)
+        # Смещения чанков отсчитываются от начала запроса, первый байт уже получен
+        chunks = [[offset - interaction["ttfb_ms"], length] for offset, length in interaction["chunks"]]
+        return CassetteResponse(
+            url,
+            interaction["status"],
+            interaction["headers"],
+            interaction["body"].encode("utf-8"),
+            chunks,
+            self.latency_scale
+        )
+
+def create_transport(mode=None, filepath=None, latency_scale=None):
+    """Создает HTTP-транспорт для create_completion по настройкам CASSETTE."""
+    mode = mode or CASSETTE["mode"]
+    filepath = filepath or CASSETTE["path"]
+    if mode == "record":
+        app_logger.info(f"Обмены с API записываются в кассету {filepath}")
+        return RecordingSession(filepath)
+    if mode == "replay":
+        return ReplaySession(
+            filepath,
+            CASSETTE["latency_scale"] if latency_scale is None else latency_scale,
+            CASSETTE["sequential"]
+        )
+    return create_timed_session()
@@ -1,294 +1,517 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit, QSizePolicy
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QImage, QPixmap, QFont, QFontMetrics
-from PIL import Image
-import requests
-import os
-from urllib.parse import urlparse
-import logging
-from config import (
-    COLORS, TIMESTAMP_FORMAT, IMAGE_THUMBNAIL_SIZE, API_REQUEST_TIMEOUT,
-    COLLAPSED_MESSAGE_LINES, MESSAGE_HEIGHT_RULES
-)
-from text_editors import NonScrollableTextEdit, SyntaxHighlighter
-
-class ChatMessage(QWidget):
-    """Класс для отображения сообщения в чате."""
-    def __init__(self, parent, message, is_user=True, timestamp=None, image_path=None, image_url=None, app=None):
-        super().__init__(parent)
-        self.is_user = is_user
-        self.selected_color = COLORS["selection"]
-        self.is_selected = False
-        self.expanded = True
-        self.setStyleSheet(f"background-color: {COLORS['background']};")
-        self.app = app
-        main_layout = QVBoxLayout(self)
-        main_layout.setContentsMargins(5, 2, 5, 2)
-        container = QWidget()
-        container_layout = QHBoxLayout(container)
-        container_layout.setContentsMargins(0, 0, 0, 0)
-        label_text = "Вы" if is_user else "Ассистент"
-        label = QLabel(label_text)
-        label.setFont(QFont(COLORS['font_family'], 8))
-        label.setStyleSheet(f"color: {COLORS['text']}; background-color: {COLORS['background']};")
-        bubble = QWidget()
-        bubble.setStyleSheet(f"background-color: {COLORS['user_message_background'] if is_user else COLORS['widget_background']}; border: 1px solid {COLORS['border']}; padding: 10px;")
-        bubble_layout = QVBoxLayout(bubble)
-        self.message_text = NonScrollableTextEdit()
-        self.message_text.setReadOnly(True)
-        self.message_text.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-        self.message_text.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        self.message_text.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
-        scrollbar_background = COLORS['user_message_background'] if is_user else COLORS['border']
-        self.message_text.setStyleSheet(f"""
-            QTextEdit {{
-                background-color: {COLORS['user_message_background'] if is_user else COLORS['widget_background']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 2px;
-                selection-background-color: #0078d7;
-                selection-color: #ffffff;
-            }}
-            QScrollBar:vertical {{
-                border: none;
-                background: {scrollbar_background};
-                width: 10px;
-                margin: 0px 0px 0px 0px;
-            }}
-            QScrollBar::handle:vertical {{
-                background: {COLORS['border']};
-                min-height: 20px;
-                border-radius: 5px;
-            }}
-            QScrollBar::add-line:vertical {{
-                background: {scrollbar_background};
-                height: 0px;
-                subcontrol-position: bottom;
-                subcontrol-origin: margin;
-            }}
-            QScrollBar::sub-line:vertical {{
-                background: {scrollbar_background};
-                height: 0px;
-                subcontrol-position: top;
-                subcontrol-origin: margin;
-            }}
-            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-                background: none;
-            }}
-        """)
-        self.highlighter = SyntaxHighlighter(self.message_text.document(), self.app)
-        self.message_text.setPlainText(message)
-        bubble_layout.addWidget(self.message_text)
-        self.image_label = None
-        if image_path or image_url:
-            self._load_image(bubble_layout, image_path, image_url)
-        if is_user:
-            container_layout.addWidget(label, alignment=Qt.AlignmentFlag.AlignLeft)
-            container_layout.addWidget(bubble)
-            container_layout.setStretch(0, 0)
-            container_layout.setStretch(1, 1)
-        else:
-            container_layout.addWidget(bubble)
-            container_layout.addWidget(label, alignment=Qt.AlignmentFlag.AlignRight)
-            container_layout.setStretch(0, 1)
-            container_layout.setStretch(1, 0)
-        main_layout.addWidget(container)
-        if timestamp:
-            time_label = QLabel(timestamp.strftime(TIMESTAMP_FORMAT))
-            time_label.setFont(QFont(COLORS['font_family'], 7))
-            time_label.setStyleSheet(f"color: {COLORS['text']}; background-color: {COLORS['background']};")
-            main_layout.addWidget(time_label, alignment=Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft)
-        self.message_text.mousePressEvent = self.handle_single_click
-        self.message_text.mouseDoubleClickEvent = self.toggle_expansion
-        self._update_height_after_render()
-
-    def _calculate_wrapped_line_count(self):
-        """Вычисляет количество строк с учетом переноса."""
-        document = self.message_text.document()
-        if not document or document.isEmpty():
-            return 1
-        total_lines = document.blockCount()
-        self.message_text.document().setTextWidth(self.message_text.width())
-        block = document.begin()
-        while block.isValid():
-            layout = block.layout()
-            if layout:
-                total_lines += max(0, layout.lineCount() - 1)
-            block = block.next()
-        logging.debug(f"Всего строк: {total_lines}")
-        return max(1, total_lines)
-
-    def _update_height_after_render(self):
-        """Обновляет высоту сообщения после рендеринга."""
-        def delayed_update():
-            self.wrapped_line_count = self._calculate_wrapped_line_count()
-            font_metrics = QFontMetrics(self.message_text.font())
-            line_height = font_metrics.lineSpacing()
-            margins = self.message_text.contentsMargins()
-            extra_height = margins.top() + margins.bottom() + 4
-            if self.wrapped_line_count <= COLLAPSED_MESSAGE_LINES and not self.expanded:
-                line_multiplier = MESSAGE_HEIGHT_RULES.get(self.wrapped_line_count, COLLAPSED_MESSAGE_LINES + 0.5)
-                base_height = line_height * line_multiplier
-                final_height = int(base_height + extra_height)
-                self.message_text.setFixedHeight(final_height)
-                self.message_text.setVerticalScrollBarPolicy(Qt.Scroll.ScrollBarAlwaysOff)
-            elif not self.expanded:
-                collapsed_height = int(line_height * (COLLAPSED_MESSAGE_LINES + 0.5) + extra_height)
-                self.message_text.setFixedHeight(collapsed_height)
-                self.message_text.setVerticalScrollBarPolicy(Qt.Scroll.ScrollBarAsNeeded)
-            else:
-                doc_height = self.message_text.document().size().height()
-                self.message_text.setFixedHeight(int(doc_height + extra_height))
-            self.message_text.updateGeometry()
-            self.updateGeometry()
-            if self.parent():
-                self.parent().updateGeometry()
-        QTimer.singleShot(0, delayed_update)
-
-    def _load_image(self, layout, image_path, image_url):
-        """Загружает и отображает изображение в сообщении."""
-        try:
-            if image_path:
-                img = Image.open(image_path)
-                img.verify()
-                img = Image.open(image_path)
-            elif image_url:
-                if not self._is_valid_url(image_url):
-                    raise ValueError("Некорректный URL изображения")
-                if image_url.startswith("http://localhost:5000/uploads/"):
-                    filename = image_url.split("/")[-1]
-                    file_path = os.path.join("uploads", filename)
-                    if not os.path.exists(file_path):
-                        raise FileNotFoundError(f"Файл {file_path} не найден на локальном сервере")
-                    img = Image.open(file_path)
-                else:
-                    response = requests.get(image_url, stream=True, timeout=API_REQUEST_TIMEOUT)
-                    response.raise_for_status()
-                    img = Image.open(response.raw)
-            img.thumbnail(IMAGE_THUMBNAIL_SIZE)
-            img = img.convert("RGB")
-            qimage = QImage(img.size[0], img.size[1], QImage.Format.Format_RGB32)
-            for x in range(img.size[0]):
-                for y in range(img.size[1]):
-                    r, g, b = img.getpixel((x, y))
-                    rgb = (r << 16) | (g << 8) | b
-                    qimage.setPixel(x, y, rgb)
-            pixmap = QPixmap.fromImage(qimage)
-            self.image_label = QLabel()
-            self.image_label.setPixmap(pixmap)
-            layout.addWidget(self.image_label)
-        except Exception as e:
-            self.message_text.setPlainText(self.message_text.toPlainText() + f"\n[Ошибка загрузки изображения: {str(e)}]")
-            logging.error(f"Ошибка загрузки изображения: {str(e)}")
-
-    def _is_valid_url(self, url):
-        """Проверяет валидность URL."""
-        try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except:
-            return False
-
-    def handle_single_click(self, event):
-        """Обрабатывает одиночный клик мыши для выделения сообщения."""
-        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
-            self.is_selected = not self.is_selected
-            self.update_selection_visuals()
-        else:
-            QTextEdit.mousePressEvent(self.message_text, event)
-
-    def toggle_expansion(self, event):
-        """Переключает развернутое/свернутое состояние сообщения."""
-        if self.wrapped_line_count <= COLLAPSED_MESSAGE_LINES:
-            return
-        self.expanded = not self.expanded
-        if self.expanded:
-            doc_height = self.message_text.document().size().height()
-            self.message_text.setFixedHeight(min(int(doc_height), 1000))
-            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)  # Исправлено
-        else:
-            font_metrics = QFontMetrics(self.message_text.font())
-            line_height = font_metrics.lineSpacing()
-            margins = self.message_text.contentsMargins()
-            collapsed_height = int(line_height * (COLLAPSED_MESSAGE_LINES + 0.5) + margins.top() + margins.bottom())
-            self.message_text.setFixedHeight(collapsed_height)
-            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)  # Исправлено
-        self.message_text.updateGeometry()
-        self.updateGeometry()
-        self.parent().updateGeometry()
-        super(QTextEdit, self.message_text).mouseDoubleClickEvent(event)
-
-    def update_selection_visuals(self):
-        """Обновляет визуальное отображение выделения сообщения."""
-        if self.is_selected:
-            self.setStyleSheet(f"background-color: {self.selected_color};")
-            self.message_text.setStyleSheet(f"""
-                QTextEdit {{
-                    background-color: {self.selected_color};
-                    color: {COLORS['text']};
-                    border: none;
-                    padding: 2px;
-                }}
-                QScrollBar:vertical {{
-                    border: none;
-                    background: {COLORS['widget_background']};
-                    width: 10px;
-                    margin: 0px 0px 0px 0px;
-                }}
-                QScrollBar::handle:vertical {{
-                    background: {COLORS['border']};
-                    min-height: 20px;
-                    border-radius: 5px;
-                }}
-                QScrollBar::add-line:vertical {{
-                    background: {COLORS['widget_background']};
-                    height: 0px;
-                    subcontrol-position: bottom;
-                    subcontrol-origin: margin;
-                }}
-                QScrollBar::sub-line:vertical {{
-                    background: {COLORS['widget_background']};
-                    height: 0px;
-                    subcontrol-position: top;
-                    subcontrol-origin: margin;
-                }}
-                QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-                    background: none;
-                }}
-            """)
-        else:
-            self.setStyleSheet(f"background-color: {COLORS['background']};")
-            self.message_text.setStyleSheet(f"""
-                QTextEdit {{
-                    background-color: {COLORS['user_message_background'] if self.is_user else COLORS['widget_background']};
-                    color: {COLORS['text']};
-                    border: none;
-                    padding: 2px;
-                }}
-                QScrollBar:vertical {{
-                    border: none;
-                    background: {COLORS['widget_background']};
-                    width: 10px;
-                    margin: 0px 0px 0px 0px;
-                }}
-                QScrollBar::handle:vertical {{
-                    background: {COLORS['border']};
-                    min-height: 20px;
-                    border-radius: 5px;
-                }}
-                QScrollBar::add-line:vertical {{
-                    background: {COLORS['widget_background']};
-                    height: 0px;
-                    subcontrol-position: bottom;
-                    subcontrol-origin: margin;
-                }}
-                QScrollBar::sub-line:vertical {{
-                    background: {COLORS['widget_background']};
-                    height: 0px;
-                    subcontrol-position: top;
-                    subcontrol-origin: margin;
-                }}
-                QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-                    background: none;
-                }}
-            """)
\ No newline at end of file
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit, QSizePolicy
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QImage, QPixmap, QFont, QFontMetrics, QTextCursor
+from PIL import Image
+import requests
+import os
+import hashlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+import logging
+from config import (
+    COLORS, TIMESTAMP_FORMAT, IMAGE_THUMBNAIL_SIZE, API_REQUEST_TIMEOUT,
+    COLLAPSED_MESSAGE_LINES, MESSAGE_HEIGHT_RULES, MESSAGE_HEIGHT_CACHE, LAZY_MESSAGES, LARGE_MESSAGES, MARKDOWN
+)
+from text_editors import NonScrollableTextEdit, SyntaxHighlighter, tokenize_fences, _highlight_workers, _release_highlight_worker
+from styles import set_style_property
+from chat_view import preview_text, estimate_content_height
+from markdown_render import MarkdownRenderer
+from worker import Worker
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+# Кэш измерений текста сообщений: (хэш текста, ширина, шрифт) -> (строк с переносом, высота документа)
+_height_cache = OrderedDict()
+# Сообщения, ожидающие обновления высоты, и общий таймер пачки обновлений
+_pending_height_updates = {}
+_height_timer = None
+
+def _content_key(text):
+    """Возвращает хэш текста сообщения для кэша высот."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def seed_height_cache(entries):
+    """Заполняет кэш высот измерениями из снимка запуска."""
+    for content_key, width, family, size, wrapped_line_count, doc_height in entries:
+        _height_cache[(bytes.fromhex(content_key), width, family, size)] = (wrapped_line_count, doc_height)
+    while len(_height_cache) > MESSAGE_HEIGHT_CACHE["cache_size"]:
+        _height_cache.popitem(last=False)
+
+def _flush_height_updates():
+    """Обновляет высоту всех сообщений, запросивших это с прошлой пачки."""
+    pending = list(_pending_height_updates.values())
+    _pending_height_updates.clear()
+    for message in pending:
+        try:
+            message._apply_height()
+        except RuntimeError:
+            # Сообщение удалено до выполнения пачки
+            continue
+    if pending:
+        app_logger.debug(f"Обновлена высота {len(pending)} сообщений")
+
+class ChatMessage(QWidget):
+    """Класс для отображения сообщения в чате.
+
+    Сообщение создается лентой чата (ChatMessagesView) как легкая заглушка
+    с оценочной высотой для строки возле видимой области: поле текста,
+    подсветка и изображение создаются в materialize(). Когда строка надолго
+    уходит далеко за пределы видимой области, лента сохраняет состояние
+    сообщения (state()), освобождает содержимое (release()) и удаляет виджет.
+
+    Большое сообщение (от LARGE_MESSAGES["min_chars"] символов) показывается
+    свернутым превью; при разворачивании блоки кода разбираются в фоновом
+    потоке, после чего полный текст вставляется в документ порциями между
+    итерациями цикла событий и подсвечивается по мере вставки. Остальные
+    ответы ассистента отображаются как Markdown (MarkdownRenderer).
+
+    Сообщения из снимка запуска получают сохраненную высоту содержимого
+    (content_height) и готовую миниатюру изображения (thumbnail).
+    """
+    def __init__(self, parent, message, is_user=True, timestamp=None, image_path=None, image_url=None, app=None,
+                 content_height=None, thumbnail=None):
+        super().__init__(parent)
+        self.is_user = is_user
+        self.is_selected = False
+        self.is_large = len(message) >= LARGE_MESSAGES["min_chars"]
+        self.expanded = not self.is_large
+        self.renders_markdown = MARKDOWN["enabled"] and not is_user and not self.is_large
+        # Документ содержит весь текст сообщения (у большого — после порционной вставки)
+        self.loaded = False
+        self._load_position = None
+        self._load_timer = None
+        self.app = app
+        self.message = message
+        self.image_path = image_path
+        self.image_url = image_url
+        self.message_text = None
+        self.highlighter = None
+        self.image_label = None
+        self.thumbnail = thumbnail
+        self.offscreen_since = None
+        self.height_stale = False
+        # Цвета задаются общей таблицей стилей (styles.py) по именам объектов и свойствам role/selected
+        self.setObjectName("chatMessage")
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(5, 2, 5, 2)
+        container = QWidget()
+        container_layout = QHBoxLayout(container)
+        container_layout.setContentsMargins(0, 0, 0, 0)
+        label_text = "Вы" if is_user else "Ассистент"
+        self.role_label = QLabel(label_text)
+        self.role_label.setObjectName("messageMeta")
+        self.bubble = QWidget()
+        self.bubble.setObjectName("messageBubble")
+        self.bubble.setProperty("role", "user" if is_user else "assistant")
+        self.bubble_layout = QVBoxLayout(self.bubble)
+        self.placeholder = QWidget()
+        self.placeholder.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        self.placeholder.setFixedHeight(content_height or self._estimate_content_height())
+        self.bubble_layout.addWidget(self.placeholder)
+        if is_user:
+            container_layout.addWidget(self.role_label, alignment=Qt.AlignmentFlag.AlignLeft)
+            container_layout.addWidget(self.bubble)
+            container_layout.setStretch(0, 0)
+            container_layout.setStretch(1, 1)
+        else:
+            container_layout.addWidget(self.bubble)
+            container_layout.addWidget(self.role_label, alignment=Qt.AlignmentFlag.AlignRight)
+            container_layout.setStretch(0, 1)
+            container_layout.setStretch(1, 0)
+        main_layout.addWidget(container)
+        self.time_label = None
+        if timestamp:
+            self.time_label = QLabel(timestamp.strftime(TIMESTAMP_FORMAT))
+            self.time_label.setObjectName("messageMeta")
+            main_layout.addWidget(self.time_label, alignment=Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft)
+        self._apply_fonts()
+        # Вне окна чата (например, в бенчмарках) видимость не отслеживается
+        if not (LAZY_MESSAGES["enabled"] and hasattr(app, "chat_area")):
+            self.materialize()
+
+    def _apply_fonts(self):
+        """Применяет шрифт текущих настроек к подписям сообщения."""
+        self.role_label.setFont(QFont(COLORS['font_family'], 8))
+        if self.time_label is not None:
+            self.time_label.setFont(QFont(COLORS['font_family'], 7))
+
+    def update_theme(self):
+        """Применяет новые тему и шрифт на месте, без пересоздания сообщения."""
+        self._apply_fonts()
+        if self.message_text is None:
+            self.placeholder.setFixedHeight(self._estimate_content_height())
+            return
+        self.message_text.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
+        if self.is_large and (self.loaded or self._load_position is not None):
+            # Переподсветка готового документа раскладывает его заново на каждом блоке,
+            # поэтому большой текст вставляется заново и подсвечивается при вставке
+            self.highlighter.update_colors()
+            self._stop_loading()
+            self._start_loading()
+            return
+        self.highlighter.rehighlight()
+        self._update_height_after_render()
+
+    @property
+    def materialized(self):
+        return self.message_text is not None
+
+    @property
+    def height_pending(self):
+        """Высота сообщения ожидает пересчета в пачке обновлений."""
+        return id(self) in _pending_height_updates
+
+    def plain_text(self):
+        """Возвращает текст сообщения, не создавая его содержимое."""
+        return self.message_text.toPlainText() if self.loaded and not self.renders_markdown else self.message
+
+    def _preview_text(self):
+        """Возвращает превью свернутого большого сообщения."""
+        return preview_text(self.message, COLLAPSED_MESSAGE_LINES, LARGE_MESSAGES["preview_chars"])
+
+    def _estimate_content_height(self):
+        """Оценивает высоту содержимого по числу символов и ширине области чата."""
+        font_metrics = QFontMetrics(QFont(COLORS['font_family'], COLORS['font_size']))
+        chat_area = getattr(self.app, "chat_area", None)
+        # Из ширины области вычитаются подпись, отступы пузыря и полоса прокрутки
+        width = max((chat_area.viewport().width() if chat_area is not None else 800) - 120, 100)
+        return estimate_content_height(self.message, self.expanded, bool(self.image_path or self.image_url),
+                                       width, font_metrics, self.bubble_layout.spacing())
+
+    def materialize(self):
+        """Создает поле текста, подсветку и изображение вместо заглушки."""
+        if self.message_text is not None:
+            return
+        is_user = self.is_user
+        self.message_text = NonScrollableTextEdit()
+        self.message_text.setReadOnly(True)
+        self.message_text.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        self.message_text.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.message_text.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
+        self.message_text.setObjectName("messageText")
+        self.message_text.setProperty("role", "user" if self.is_user else "assistant")
+        self.message_text.setProperty("selected", self.is_selected)
+        if self.renders_markdown:
+            self.highlighter = MarkdownRenderer(self.message_text.document(), self.app)
+            self.highlighter.set_text(self.message)
+            self.loaded = True
+        elif self.is_large:
+            self.highlighter = SyntaxHighlighter(self.message_text.document(), self.app)
+            # Сначала показывается превью, полный текст вставляется при разворачивании
+            self.message_text.setPlainText(self._preview_text())
+        else:
+            self.highlighter = SyntaxHighlighter(self.message_text.document(), self.app)
+            self.message_text.setPlainText(self.message)
+            self.loaded = True
+        # Пока поле не получило высоту, его место занимает заглушка
+        self.message_text.setFixedHeight(self.placeholder.height())
+        self.bubble_layout.replaceWidget(self.placeholder, self.message_text)
+        self.placeholder.hide()
+        if self.image_path or self.image_url:
+            self._load_image(self.bubble_layout, self.image_path, self.image_url)
+        self.message_text.mousePressEvent = self.handle_single_click
+        self.message_text.mouseDoubleClickEvent = self.toggle_expansion
+        self._content_key = _content_key(self.message_text.toPlainText())
+        self._update_height_after_render()
+        if self.is_large and self.expanded:
+            self._start_loading()
+
+    def _start_loading(self):
+        """Разбирает блоки кода в фоновом потоке, затем начинает порционную вставку полного текста."""
+        if self.message_text is None or self._load_position is not None:
+            return
+        self._load_position = 0
+        message_text = self.message_text
+        worker = Worker(tokenize_fences, self.message)
+        # Без разметки из кэша текст все равно вставляется, блоки кода подсветятся по готовности
+        worker.signals.finished.connect(lambda _: self._on_fences_tokenized(message_text))
+        worker.signals.error.connect(lambda _: self._on_fences_tokenized(message_text))
+        worker.finished.connect(lambda: _release_highlight_worker(worker))
+        _highlight_workers.add(worker)
+        worker.start()
+
+    def _on_fences_tokenized(self, message_text):
+        """Начинает вставку текста, если сообщение не освобождено за время разбора."""
+        if self.message_text is not message_text or self._load_position != 0:
+            return
+        try:
+            if self._load_timer is None:
+                self._load_timer = QTimer(self)
+                self._load_timer.setSingleShot(True)
+                self._load_timer.setInterval(LARGE_MESSAGES["chunk_interval_ms"])
+                self._load_timer.timeout.connect(self._insert_next_chunk)
+            self.highlighter.set_source_text(self.message)
+            self._insert_next_chunk()
+        except RuntimeError:
+            # Сообщение удалено до окончания разбора
+            return
+
+    def _insert_next_chunk(self):
+        """Вставляет в документ следующую порцию полного текста."""
+        if self.message_text is None or self._load_position is None:
+            return
+        start = self._load_position
+        end = start + LARGE_MESSAGES["chunk_chars"]
+        if end < len(self.message):
+            # Порция по возможности заканчивается на границе строки, чтобы строка раскладывалась один раз
+            line_end = self.message.find("\n", end, end + LARGE_MESSAGES["chunk_chars"])
+            if line_end >= 0:
+                end = line_end + 1
+        chunk = self.message[start:end]
+        if start == 0:
+            self.message_text.setPlainText(chunk)
+        else:
+            cursor = QTextCursor(self.message_text.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(chunk)
+        if end < len(self.message):
+            self._load_position = end
+            self._load_timer.start()
+        else:
+            self._load_position = None
+            self.loaded = True
+            app_logger.debug(f"Большое сообщение вставлено полностью: {len(self.message)} символов")
+        self._update_height_after_render()
+
+    def _stop_loading(self):
+        """Останавливает порционную вставку текста."""
+        self._load_position = None
+        self.loaded = False
+        if self._load_timer is not None:
+            self._load_timer.stop()
+
+    def release(self):
+        """Освобождает содержимое сообщения, оставляя заглушку той же высоты."""
+        if self.message_text is None:
+            return
+        self._stop_loading()
+        height = self.content_height()
+        if self.image_label is not None:
+            self.bubble_layout.removeWidget(self.image_label)
+            self.image_label.deleteLater()
+            self.image_label = None
+        self.placeholder.setFixedHeight(height)
+        self.bubble_layout.replaceWidget(self.message_text, self.placeholder)
+        self.placeholder.show()
+        self.message_text.deleteLater()
+        self.message_text = None
+        self.highlighter = None
+
+    def content_height(self):
+        """Возвращает высоту содержимого пузыря: поля текста с изображением или заглушки."""
+        if self.message_text is None:
+            return self.placeholder.height()
+        height = self.message_text.height()
+        if self.image_label is not None:
+            height += self.image_label.height() + self.bubble_layout.spacing()
+        return height
+
+    def state(self):
+        """Возвращает состояние сообщения, которое лента сохраняет в строке при удалении виджета."""
+        return {
+            "content_height": self.content_height(),
+            "measurement": self.measurement(),
+            "selected": self.is_selected,
+            "expanded": self.expanded,
+            "thumbnail": self.thumbnail
+        }
+
+    def measurement(self):
+        """Возвращает запись кэша высот для снимка запуска или None, если текст не измерялся."""
+        if self.message_text is None:
+            return None
+        font = self.message_text.font()
+        key = (self._content_key, self.message_text.viewport().width(), font.family(), font.pointSize())
+        measured = _height_cache.get(key)
+        if measured is None:
+            return None
+        return [key[0].hex(), key[1], key[2], key[3], measured[0], measured[1]]
+
+    def _calculate_wrapped_line_count(self):
+        """Вычисляет количество строк с учетом переноса."""
+        document = self.message_text.document()
+        if not document or document.isEmpty():
+            return 1
+        total_lines = document.blockCount()
+        # Ширина переноса — ширина области текста: при ленивом создании поле уже имеет итоговый размер
+        self.message_text.document().setTextWidth(self.message_text.viewport().width())
+        block = document.begin()
+        while block.isValid():
+            layout = block.layout()
+            if layout:
+                total_lines += max(0, layout.lineCount() - 1)
+            block = block.next()
+        app_logger.debug(f"Всего строк: {total_lines}")
+        return max(1, total_lines)
+
+    def _update_height_after_render(self):
+        """Планирует обновление высоты сообщения; обновления всех сообщений выполняются одной пачкой."""
+        self.height_stale = False
+        _pending_height_updates[id(self)] = self
+        global _height_timer
+        if _height_timer is None:
+            _height_timer = QTimer()
+            _height_timer.setSingleShot(True)
+            _height_timer.setInterval(MESSAGE_HEIGHT_CACHE["batch_delay_ms"])
+            _height_timer.timeout.connect(_flush_height_updates)
+        if not _height_timer.isActive():
+            _height_timer.start()
+
+    def _measure_text(self):
+        """Возвращает число строк с переносом и высоту документа, используя кэш высот."""
+        font = self.message_text.font()
+        key = (self._content_key, self.message_text.viewport().width(), font.family(), font.pointSize())
+        cached = _height_cache.get(key)
+        if cached is not None:
+            _height_cache.move_to_end(key)
+            return cached
+        wrapped_line_count = self._calculate_wrapped_line_count()
+        measured = (wrapped_line_count, self.message_text.document().size().height())
+        _height_cache[key] = measured
+        if len(_height_cache) > MESSAGE_HEIGHT_CACHE["cache_size"]:
+            _height_cache.popitem(last=False)
+        return measured
+
+    def _apply_height(self):
+        """Устанавливает высоту поля текста по измерениям документа."""
+        if self.message_text is None:
+            return
+        font_metrics = QFontMetrics(self.message_text.font())
+        line_height = font_metrics.lineSpacing()
+        margins = self.message_text.contentsMargins()
+        extra_height = margins.top() + margins.bottom() + 4
+        if self.is_large and (self.loaded or self._load_position is not None):
+            # Полный текст большого сообщения не измеряется: это раскладывало бы весь документ.
+            # Поле имеет фиксированную высоту, а документ раскладывается по мере прокрутки
+            self.wrapped_line_count = self.message_text.document().blockCount()
+            if self.expanded:
+                self.message_text.setFixedHeight(LARGE_MESSAGES["expanded_height"])
+            else:
+                self.message_text.setFixedHeight(int(line_height * (COLLAPSED_MESSAGE_LINES + 0.5) + extra_height))
+            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+            self.updateGeometry()
+            self._notify_height_changed()
+            return
+        self.wrapped_line_count, doc_height = self._measure_text()
+        if self.is_large:
+            # Превью большого сообщения показывается целиком
+            self.message_text.setFixedHeight(int(doc_height + extra_height))
+        elif self.wrapped_line_count <= COLLAPSED_MESSAGE_LINES and not self.expanded:
+            line_multiplier = MESSAGE_HEIGHT_RULES.get(self.wrapped_line_count, COLLAPSED_MESSAGE_LINES + 0.5)
+            base_height = line_height * line_multiplier
+            final_height = int(base_height + extra_height)
+            self.message_text.setFixedHeight(final_height)
+            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        elif not self.expanded:
+            collapsed_height = int(line_height * (COLLAPSED_MESSAGE_LINES + 0.5) + extra_height)
+            self.message_text.setFixedHeight(collapsed_height)
+            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        else:
+            self.message_text.setFixedHeight(int(doc_height + extra_height))
+        self.message_text.updateGeometry()
+        self.updateGeometry()
+        if self.parent():
+            self.parent().updateGeometry()
+        self._notify_height_changed()
+
+    def _notify_height_changed(self):
+        """Сообщает ленте чата об изменении высоты сообщения для пересчета раскладки."""
+        chat_area = getattr(self.app, "chat_area", None)
+        if chat_area is not None and self.parent() is chat_area.viewport():
+            chat_area.message_resized(self)
+
+    def _load_image(self, layout, image_path, image_url):
+        """Загружает и отображает изображение в сообщении."""
+        try:
+            if self.thumbnail is not None:
+                # Миниатюра уже построена (ранее или в снимке запуска): файл и сеть не читаются
+                self.image_label = QLabel()
+                self.image_label.setPixmap(self.thumbnail)
+                layout.addWidget(self.image_label)
+                return
+            if image_path:
+                img = Image.open(image_path)
+                img.verify()
+                img = Image.open(image_path)
+            elif image_url:
+                if not self._is_valid_url(image_url):
+                    raise ValueError("Некорректный URL изображения")
+                if image_url.startswith("http://localhost:5000/uploads/"):
+                    filename = image_url.split("/")[-1]
+                    file_path = os.path.join("uploads", filename)
+                    if not os.path.exists(file_path):
+                        raise FileNotFoundError(f"Файл {file_path} не найден на локальном сервере")
+                    img = Image.open(file_path)
+                else:
+                    response = requests.get(image_url, stream=True, timeout=API_REQUEST_TIMEOUT)
+                    response.raise_for_status()
+                    img = Image.open(response.raw)
+            img.thumbnail(IMAGE_THUMBNAIL_SIZE)
+            img = img.convert("RGB")
+            qimage = QImage(img.size[0], img.size[1], QImage.Format.Format_RGB32)
+            for x in range(img.size[0]):
+                for y in range(img.size[1]):
+                    r, g, b = img.getpixel((x, y))
+                    rgb = (r << 16) | (g << 8) | b
+                    qimage.setPixel(x, y, rgb)
+            pixmap = QPixmap.fromImage(qimage)
+            self.thumbnail = pixmap
+            self.image_label = QLabel()
+            self.image_label.setPixmap(pixmap)
+            layout.addWidget(self.image_label)
+        except Exception as e:
+            self.message_text.setPlainText(self.message_text.toPlainText() + f"\n[Ошибка загрузки изображения: {str(e)}]")
+            app_logger.error(f"Ошибка загрузки изображения: {str(e)}")
+
+    def _is_valid_url(self, url):
+        """Проверяет валидность URL."""
+        try:
+            result = urlparse(url)
+            return all([result.scheme, result.netloc])
+        except:
+            return False
+
+    def handle_single_click(self, event):
+        """Обрабатывает одиночный клик мыши для выделения сообщения."""
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            self.is_selected = not self.is_selected
+            self.update_selection_visuals()
+        else:
+            QTextEdit.mousePressEvent(self.message_text, event)
+
+    def toggle_expansion(self, event):
+        """Переключает развернутое/свернутое состояние сообщения."""
+        if self.is_large:
+            if not self.loaded and self._load_position is None:
+                # Превью большого сообщения разворачивается загрузкой полного текста
+                self.expanded = True
+                self._start_loading()
+            else:
+                self.expanded = not self.expanded
+            self._update_height_after_render()
+            return
+        if self.wrapped_line_count <= COLLAPSED_MESSAGE_LINES:
+            return
+        self.expanded = not self.expanded
+        if self.expanded:
+            doc_height = self.message_text.document().size().height()
+            self.message_text.setFixedHeight(min(int(doc_height), 1000))
+            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)  # Исправлено
+        else:
+            font_metrics = QFontMetrics(self.message_text.font())
+            line_height = font_metrics.lineSpacing()
+            margins = self.message_text.contentsMargins()
+            collapsed_height = int(line_height * (COLLAPSED_MESSAGE_LINES + 0.5) + margins.top() + margins.bottom())
+            self.message_text.setFixedHeight(collapsed_height)
+            self.message_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)  # Исправлено
+        self.message_text.updateGeometry()
+        self.updateGeometry()
+        self._notify_height_changed()
+        super(QTextEdit, self.message_text).mouseDoubleClickEvent(event)
+
+    def update_selection_visuals(self):
+        """Обновляет визуальное отображение выделения сообщения."""
+        set_style_property(self, "selected", self.is_selected)
+        if self.message_text is not None:
+            set_style_property(self.message_text, "selected", self.is_selected)
@@ -0,0 +1,447 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import time
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QPoint, QTimer, QCoreApplication, QEvent, QPersistentModelIndex, pyqtSignal
+from PyQt6.QtGui import QFont, QFontMetrics, QColor, QPen
+from config import (
+    COLORS, CHAT_VIEW_SETTINGS, TIMESTAMP_FORMAT, COLLAPSED_MESSAGE_LINES, IMAGE_THUMBNAIL_SIZE,
+    LAZY_MESSAGES, LARGE_MESSAGES
+)
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+# Роли данных модели истории
+RoleRole = Qt.ItemDataRole.UserRole + 1
+TimestampRole = Qt.ItemDataRole.UserRole + 2
+ContentRole = Qt.ItemDataRole.UserRole + 3
+SelectedRole = Qt.ItemDataRole.UserRole + 4
+
+TEXT_FLAGS = Qt.TextFlag.TextWordWrap | Qt.TextFlag.TextWrapAnywhere | Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop
+
+def preview_text(text, max_lines=None, max_chars=None):
+    """Сокращает длинное сообщение до превью, чтобы отрисовка строки списка оставалась дешевой."""
+    max_lines = max_lines or CHAT_VIEW_SETTINGS["max_preview_lines"]
+    max_chars = max_chars or CHAT_VIEW_SETTINGS["max_preview_chars"]
+    if len(text) <= max_chars and text.count("\n") < max_lines:
+        return text
+    preview = "\n".join(text[:max_chars].split("\n", max_lines)[:max_lines])
+    return preview + "\n… (двойной щелчок — показать полностью)"
+
+def estimate_content_height(message, expanded, has_image, width, font_metrics, image_spacing=6):
+    """Оценивает высоту содержимого сообщения по числу символов, без раскладки документа."""
+    if len(message) >= LARGE_MESSAGES["min_chars"]:
+        if expanded:
+            height = LARGE_MESSAGES["expanded_height"]
+        else:
+            text = preview_text(message, COLLAPSED_MESSAGE_LINES, LARGE_MESSAGES["preview_chars"])
+            height = _estimate_text_height(text, width, font_metrics)
+    else:
+        # Длинное обычное сообщение показывается свернутым до COLLAPSED_MESSAGE_LINES строк
+        max_lines = None if expanded else COLLAPSED_MESSAGE_LINES + 0.5
+        height = _estimate_text_height(message, width, font_metrics, max_lines)
+    if has_image:
+        height += IMAGE_THUMBNAIL_SIZE[1] + image_spacing
+    return height
+
+def _estimate_text_height(text, width, font_metrics, max_lines=None):
+    """Оценивает высоту текста по средней ширине символа."""
+    chars_per_line = max(width // max(font_metrics.averageCharWidth(), 1), 1)
+    line_count = sum(len(line) // chars_per_line + 1 for line in text.split("\n"))
+    if max_lines is not None:
+        line_count = min(line_count, max_lines)
+    return int(line_count * font_metrics.lineSpacing()) + 8
+
+class ChatHistoryModel(QAbstractListModel):
+    """Модель истории чата: хранит только словари сообщений, без виджетов."""
+    def __init__(self, messages=None, parent=None):
+        super().__init__(parent)
+        self._messages = list(messages or [])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return preview_text(message.get("content", ""))
+        if role == ContentRole:
+            return message.get("content", "")
+        if role == RoleRole:
+            return message.get("role")
+        if role == TimestampRole:
+            timestamp = message.get("timestamp") or ""
+            if isinstance(timestamp, datetime):
+                return timestamp.strftime(TIMESTAMP_FORMAT)
+            return timestamp.replace("T", " ")
+        if role == SelectedRole:
+            return message.get("selected", False)
+        return None
+
+    def set_messages(self, messages):
+        """Заменяет все сообщения модели."""
+        self.beginResetModel()
+        self._messages = list(messages)
+        self.endResetModel()
+
+    def append_messages(self, messages):
+        """Добавляет сообщения в конец модели."""
+        if not messages:
+            return
+        first = len(self._messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self._messages.extend(messages)
+        self.endInsertRows()
+
+    def message(self, row):
+        return self._messages[row]
+
+    def messages(self):
+        return self._messages
+
+    def prepend_messages(self, messages):
+        """Добавляет сообщения в начало модели."""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = messages
+        self.endInsertRows()
+
+class ChatMessageDelegate(QStyledItemDelegate):
+    """Отрисовка сообщения-пузыря прямо на viewport списка.
+
+    Высота строки зависит от текста и ширины viewport; измерения кэшируются
+    (LRU по тексту, роли и ширине), поэтому повторная раскладка и прокрутка
+    не переизмеряют уже виденные сообщения. Кэш сбрасывается при смене шрифта.
+    """
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._heights = OrderedDict()
+        self.update_fonts()
+
+    def update_fonts(self):
+        """Перечитывает шрифты из COLORS и сбрасывает кэш высот."""
+        self.text_font = QFont(COLORS['font_family'], COLORS['font_size'])
+        self.header_font = QFont(COLORS['font_family'], 8)
+        self.text_metrics = QFontMetrics(self.text_font)
+        self.header_height = QFontMetrics(self.header_font).height()
+        self.clear_cache()
+
+    def clear_cache(self):
+        self._heights.clear()
+
+    def _text_width(self):
+        """Ширина текста внутри пузыря при текущей ширине viewport."""
+        padding = CHAT_VIEW_SETTINGS["padding"]
+        return max(self.view.viewport().width() - 10 - 2 * padding, 50)
+
+    def sizeHint(self, option, index):
+        text = index.data(Qt.ItemDataRole.DisplayRole)
+        width = self._text_width()
+        key = (text, index.data(RoleRole), width)
+        height = self._heights.get(key)
+        if height is None:
+            text_height = self.text_metrics.boundingRect(QRect(0, 0, width, 10 ** 7), TEXT_FLAGS, text).height()
+            height = self.header_height + text_height + 2 * CHAT_VIEW_SETTINGS["padding"] + CHAT_VIEW_SETTINGS["spacing"] + 2
+            self._heights[key] = height
+            if len(self._heights) > CHAT_VIEW_SETTINGS["height_cache_size"]:
+                self._heights.popitem(last=False)
+        else:
+            self._heights.move_to_end(key)
+        return QSize(width, height)
+
+    def paint(self, painter, option, index):
+        padding = CHAT_VIEW_SETTINGS["padding"]
+        is_user = index.data(RoleRole) == "user"
+        rect = option.rect.adjusted(5, CHAT_VIEW_SETTINGS["spacing"] // 2, -5, -CHAT_VIEW_SETTINGS["spacing"] // 2)
+        painter.save()
+        painter.setFont(self.header_font)
+        painter.setPen(QColor(COLORS['text']))
+        header_rect = QRect(rect.left(), rect.top(), rect.width(), self.header_height)
+        header = f"{'Вы' if is_user else 'Ассистент'}  {index.data(TimestampRole)}"
+        painter.drawText(header_rect, Qt.AlignmentFlag.AlignLeft if is_user else Qt.AlignmentFlag.AlignRight, header)
+        bubble_rect = rect.adjusted(0, self.header_height, 0, 0)
+        if option.state & QStyle.StateFlag.State_Selected or index.data(SelectedRole):
+            background = COLORS['selection']
+        else:
+            background = COLORS['user_message_background'] if is_user else COLORS['widget_background']
+        painter.setPen(QPen(QColor(COLORS['border'])))
+        painter.setBrush(QColor(background))
+        painter.drawRect(bubble_rect.adjusted(0, 0, -1, -1))
+        painter.setFont(self.text_font)
+        painter.setPen(QColor(COLORS['text']))
+        painter.drawText(bubble_rect.adjusted(padding, padding, -padding, -padding), TEXT_FLAGS, index.data(Qt.ItemDataRole.DisplayRole))
+        painter.restore()
+
+class ChatHistoryView(QListView):
+    """Виртуализированный список сообщений: отрисовываются только видимые строки.
+
+    Раскладка выполняется порциями по layout_batch_size строк между итерациями
+    цикла событий, так что открытие истории из десятков тысяч сообщений
+    не блокирует интерфейс, а память не растет с числом сообщений.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.history_model = ChatHistoryModel(parent=self)
+        self.setModel(self.history_model)
+        self.message_delegate = ChatMessageDelegate(self)
+        self.setItemDelegate(self.message_delegate)
+        self.setUniformItemSizes(False)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(CHAT_VIEW_SETTINGS["layout_batch_size"])
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setObjectName("chatHistoryView")
+
+    def update_colors(self):
+        """Применяет текущие цвета и шрифт: цвета берутся при отрисовке, шрифт требует новой раскладки."""
+        self.message_delegate.update_fonts()
+        self.scheduleDelayedItemsLayout()
+        self.viewport().update()
+
+    def set_messages(self, messages):
+        """Показывает сообщения и прокручивает к последнему."""
+        self.history_model.set_messages(messages)
+        self.scrollToBottom()
+
+    def selected_text(self):
+        """Возвращает полный текст выделенных сообщений в порядке истории."""
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        parts = []
+        for row in rows:
+            index = self.history_model.index(row)
+            role = "Вы" if index.data(RoleRole) == "user" else "Ассистент"
+            parts.append(f"[{index.data(TimestampRole)}] {role}:\n{index.data(ContentRole)}")
+        return "\n\n".join(parts)
+
+    def resizeEvent(self, event):
+        # Ширина текста изменилась: старые измерения остаются в LRU и вытесняются новыми
+        super().resizeEvent(event)
+        self.scheduleDelayedItemsLayout()
+
+class LiveMessageDelegate(ChatMessageDelegate):
+    """Делегат основной ленты чата.
+
+    Высота строки хранится в словаре сообщения: у строки с виджетом ее обновляет
+    лента после изменения высоты виджета, у строки без виджета это высота,
+    сохраненная при удалении виджета, или оценка по числу символов, которая
+    запоминается до смены ширины. Строки с виджетом делегат не рисует.
+    """
+    def sizeHint(self, option, index):
+        width = self.view.viewport().width()
+        entry = self.view.history_model.message(index.row())
+        if entry.get("widget") is None and entry.get("row_width") != width:
+            entry["row_height"] = self.view.estimate_row_height(entry)
+            entry["row_width"] = width
+        return QSize(width, entry["row_height"])
+
+    def paint(self, painter, option, index):
+        if self.view.history_model.message(index.row()).get("widget") is None:
+            super().paint(painter, option, index)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def eventFilter(self, obj, event):
+        # Виджеты сообщений не редакторы: клавиши и потеря фокуса не должны их закрывать
+        return False
+
+class ChatMessagesView(ChatHistoryView):
+    """Основная лента чата: сообщения хранятся в модели, виджеты есть только у строк возле видимой области.
+
+    Для строк в пределах LAZY_MESSAGES["preload_screens"] экранов от видимой
+    области создаются виджеты сообщений (widget_factory) и встраиваются в строки
+    (setIndexWidget). Виджет, который дольше release_after_ms находится дальше
+    release_screens экранов, удаляется, а его состояние (высота, выделение,
+    развернутость, миниатюра) сохраняется в словаре сообщения и передается
+    следующему виджету этой строки. Число виджетов и время раскладки поэтому
+    не зависят от длины истории.
+
+    Изменения высоты сообщений собираются в один пересчет раскладки; если
+    изменилось сообщение выше видимой области, прокрутка сдвигается на ту же
+    величину, а лента, прокрученная до конца, остается в конце. Для строки
+    с временной шкалой запроса ("timeline") после раскладки ее виджета
+    с рассчитанной высотой отправляется сигнал message_laid_out.
+    """
+    # Словарь сообщения, виджет которого создан и разложен с рассчитанной высотой
+    message_laid_out = pyqtSignal(object)
+
+    def __init__(self, widget_factory, parent=None):
+        super().__init__(parent)
+        self.widget_factory = widget_factory
+        self.message_delegate = LiveMessageDelegate(self)
+        self.setItemDelegate(self.message_delegate)
+        # Высоты строк известны без измерения текста, поэтому раскладка выполняется за один проход
+        self.setLayoutMode(QListView.LayoutMode.SinglePass)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setObjectName("chatArea")
+        # Строки с виджетами: id(виджет) -> словарь сообщения
+        self._live = {}
+        # Индексы строк с виджетами, сдвигаются моделью при вставке строк: id(виджет) -> индекс
+        self._live_index = {}
+        # Высота подписей и отступов сообщения вокруг содержимого, уточняется по созданным виджетам
+        self._chrome_height = 60
+        # Виджеты, изменившие высоту с прошлого пересчета раскладки: id(виджет) -> виджет
+        self._resized = {}
+        self._relayout_timer = QTimer(self)
+        self._relayout_timer.setSingleShot(True)
+        self._relayout_timer.setInterval(0)
+        self._relayout_timer.timeout.connect(self._relayout)
+
+    def entries(self):
+        """Возвращает словари сообщений ленты в порядке истории."""
+        return self.history_model.messages()
+
+    def live_widgets(self):
+        """Возвращает созданные виджеты сообщений."""
+        return [entry["widget"] for entry in self._live.values()]
+
+    def set_messages(self, messages):
+        """Заменяет сообщения ленты; виджеты старых строк удаляются вместе с ними."""
+        for entry in self._live.values():
+            entry["widget"] = None
+        self._live.clear()
+        self._live_index.clear()
+        self._resized.clear()
+        super().set_messages(messages)
+
+    def append_messages(self, messages):
+        """Добавляет сообщения в конец ленты."""
+        self.history_model.append_messages(messages)
+
+    def prepend_messages(self, messages):
+        """Добавляет более ранние сообщения в начало ленты, не сдвигая видимую часть."""
+        if not messages:
+            return
+        self.executeDelayedItemsLayout()
+        anchor = self.indexAt(QPoint(self.viewport().width() // 2, 0))
+        offset = self.visualRect(anchor).top() if anchor.isValid() else 0
+        self.history_model.prepend_messages(messages)
+        self.doItemsLayout()
+        if anchor.isValid():
+            rect = self.visualRect(self.history_model.index(anchor.row() + len(messages)))
+            scroll_bar = self.verticalScrollBar()
+            scroll_bar.setValue(scroll_bar.value() + rect.top() - offset)
+
+    def estimate_row_height(self, entry):
+        """Оценивает высоту строки без виджета."""
+        content = entry.get("content", "")
+        expanded = entry.get("expanded")
+        if expanded is None:
+            expanded = len(content) < LARGE_MESSAGES["min_chars"]
+        # Из ширины области вычитаются подпись, отступы пузыря и полоса прокрутки, как в ChatMessage
+        width = max(self.viewport().width() - 120, 100)
+        has_image = bool(entry.get("image_path") or entry.get("image_url"))
+        return estimate_content_height(content, expanded, has_image, width, self.message_delegate.text_metrics) + self._chrome_height
+
+    def update_colors(self):
+        # Высоты строк без виджетов измерены старым шрифтом
+        for entry in self.entries():
+            entry.pop("row_width", None)
+            entry.pop("content_height", None)
+        super().update_colors()
+
+    def _row_at(self, y, default):
+        index = self.indexAt(QPoint(self.viewport().width() // 2, int(y)))
+        return index.row() if index.isValid() else default
+
+    def update_visibility(self):
+        """Создает виджеты сообщений возле видимой области и удаляет надолго ушедшие далеко; возвращает число созданных."""
+        count = self.history_model.rowCount()
+        if not count:
+            return 0
+        self.executeDelayedItemsLayout()
+        viewport_height = self.viewport().height()
+        if LAZY_MESSAGES["enabled"]:
+            preload = viewport_height * LAZY_MESSAGES["preload_screens"]
+            first = self._row_at(-preload, 0)
+            last = self._row_at(viewport_height + preload, count - 1)
+        else:
+            first, last = 0, count - 1
+        created = 0
+        for row in range(first, last + 1):
+            entry = self.history_model.message(row)
+            widget = entry.get("widget")
+            if widget is None:
+                self._create_widget(row, entry)
+                created += 1
+            elif widget.height_stale:
+                widget._update_height_after_render()
+        if LAZY_MESSAGES["enabled"]:
+            release = viewport_height * LAZY_MESSAGES["release_screens"]
+            now = time.monotonic()
+            for entry in list(self._live.values()):
+                widget = entry["widget"]
+                if widget.y() + widget.height() < -release or widget.y() > viewport_height + release:
+                    if widget.offscreen_since is None:
+                        widget.offscreen_since = now
+                    elif (now - widget.offscreen_since) * 1000 >= LAZY_MESSAGES["release_after_ms"]:
+                        self._release_widget(entry)
+                else:
+                    widget.offscreen_since = None
+        return created
+
+    def _create_widget(self, row, entry):
+        widget = self.widget_factory(entry)
+        entry["widget"] = widget
+        self._live[id(widget)] = entry
+        index = self.history_model.index(row)
+        self._live_index[id(widget)] = QPersistentModelIndex(index)
+        self.setIndexWidget(index, widget)
+        widget.materialize()
+        # Оценочная высота строки заменяется высотой виджета
+        self.message_resized(widget)
+
+    def _release_widget(self, entry):
+        widget = entry["widget"]
+        del self._live[id(widget)]
+        index = QModelIndex(self._live_index.pop(id(widget)))
+        self._resized.pop(id(widget), None)
+        entry.update(widget.state())
+        entry["widget"] = None
+        entry["row_height"] = widget.height()
+        entry["row_width"] = self.viewport().width()
+        widget.release()
+        self.setIndexWidget(index, None)
+
+    def message_resized(self, widget):
+        """Планирует пересчет раскладки после изменения высоты виджета сообщения."""
+        self._resized[id(widget)] = widget
+        self._relayout_timer.start()
+
+    def _relayout(self):
+        # Новая высота вложенных раскладок сообщения известна после обработки отложенных LayoutRequest
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.LayoutRequest)
+        delta = 0
+        laid_out = []
+        for widget in self._resized.values():
+            entry = self._live.get(id(widget))
+            if entry is None:
+                continue
+            if "timeline" in entry and widget.materialized and not widget.height_pending:
+                laid_out.append(entry)
+            height = widget.sizeHint().height()
+            self._chrome_height = height - widget.content_height()
+            old_height = entry.get("row_height", height)
+            if widget.y() + old_height <= 0:
+                delta += height - old_height
+            entry["row_height"] = height
+        self._resized.clear()
+        scroll_bar = self.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        self.doItemsLayout()
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+        elif delta:
+            scroll_bar.setValue(scroll_bar.value() + delta)
+        for entry in laid_out:
+            self.message_laid_out.emit(entry)
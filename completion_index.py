@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import heapq
+import hashlib
+import threading
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime
+from config import COMPLETION_INDEX, DATE_FORMAT
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+WORD_PATTERN = re.compile(r"\w[\w-]*")
+
+def _message_key(msg):
+    """Вычисляет ключ сообщения по роли, времени и содержимому."""
+    timestamp = msg.get("timestamp", "")
+    if isinstance(timestamp, datetime):
+        # В истории на диске время хранится строкой, ключ должен совпадать
+        timestamp = timestamp.strftime(DATE_FORMAT)
+    raw = f"{msg.get('role', '')}\x00{timestamp}\x00{msg.get('content', '')}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+class CompletionIndex:
+    """Частотный префиксный индекс слов сообщений для автодополнения запроса.
+
+    Слова в нижнем регистре хранятся в отсортированном списке, поэтому поиск
+    по префиксу — двоичный поиск диапазона; частоты и исходное написание
+    хранятся в словарях. Сообщения добавляются инкрементально (учтенные
+    отмечаются ключом), результаты запросов кэшируются по префиксу до
+    следующего изменения индекса. Индекс сохраняется в COMPLETION_INDEX["file"].
+    """
+    def __init__(self, filepath=None):
+        self.filepath = filepath or COMPLETION_INDEX["file"]
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._words = []
+        self._counts = {}
+        self._forms = {}
+        self._keys = set()
+        self._results = {}
+        self._dirty = False
+        self._load()
+
+    def __len__(self):
+        return len(self._words)
+
+    def _load(self):
+        """Загружает индекс с диска."""
+        try:
+            if not os.path.exists(self.filepath):
+                return
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._counts = {word.lower(): count for word, count in data["counts"].items()}
+            self._forms = {word.lower(): word for word in data["counts"]}
+            self._words = sorted(self._counts)
+            self._keys = set(data["keys"])
+            app_logger.debug(f"Индекс автодополнения: {len(self._words)} слов, {len(self._keys)} сообщений")
+        except Exception as e:
+            app_logger.error(f"Ошибка загрузки индекса автодополнения: {str(e)}")
+            self._words, self._counts, self._forms, self._keys = [], {}, {}, set()
+
+    def save(self):
+        """Сохраняет индекс на диск, если он изменился."""
+        # Сохранение из фонового потока и при закрытии окна не должно писать один файл одновременно
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {
+                    "counts": {self._forms[word]: count for word, count in self._counts.items()},
+                    "keys": sorted(self._keys)
+                }
+                self._dirty = False
+            try:
+                os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+                tmp_path = self.filepath + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, self.filepath)
+            except Exception as e:
+                self._dirty = True
+                app_logger.error(f"Ошибка сохранения индекса автодополнения: {str(e)}")
+
+    def add_message(self, msg):
+        """Добавляет слова сообщения в индекс; возвращает True, если сообщение новое."""
+        if msg.get("role") not in COMPLETION_INDEX["roles"] or not isinstance(msg.get("content"), str):
+            return False
+        key = _message_key(msg)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            for word in WORD_PATTERN.findall(msg["content"]):
+                if len(word) < COMPLETION_INDEX["min_word_length"]:
+                    continue
+                lower = word.lower()
+                count = self._counts.get(lower)
+                if count is None:
+                    insort(self._words, lower)
+                    self._forms[lower] = word
+                    count = 0
+                self._counts[lower] = count + 1
+            self._results.clear()
+            self._dirty = True
+        return True
+
+    def update(self, messages):
+        """Добавляет в индекс еще не учтенные сообщения; возвращает их число."""
+        return sum(1 for msg in messages if self.add_message(msg))
+
+    def complete(self, prefix, limit=None):
+        """Возвращает самые частые слова, начинающиеся с префикса."""
+        prefix = prefix.lower()
+        if len(prefix) < COMPLETION_INDEX["min_prefix_length"]:
+            return []
+        limit = limit or COMPLETION_INDEX["max_results"]
+        with self._lock:
+            cached = self._results.get(prefix)
+            if cached is None:
+                start = bisect_left(self._words, prefix)
+                end = bisect_left(self._words, prefix + "\U0010ffff", start)
+                best = heapq.nlargest(
+                    COMPLETION_INDEX["max_results"],
+                    (self._words[i] for i in range(start, end)),
+                    key=self._counts.__getitem__
+                )
+                cached = [self._forms[word] for word in best]
+                if len(self._results) >= COMPLETION_INDEX["result_cache_size"]:
+                    self._results.clear()
+                self._results[prefix] = cached
+            return cached[:limit]
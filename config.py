@@ -1,106 +1,270 @@
-import os
-
-# Путь к файлам настроек
-API_SETTINGS_FILE = "api_settings.json"
-THEME_SETTINGS_FILE = "theme_settings.json"
-
-# Настройки API
-BASE_URL = "https://api.intelligence.io.solutions/api/v1"
-API_REQUEST_TIMEOUT = 60
-TEMPERATURE = 0.7
-MAX_COMPLETION_TOKENS = 2000
-SEED = 42
-SYSTEM_PROMPT = "Ты эксперт в области программирования и анализа изображений. Отвечай коротко, внятно и четко на русском языке. Генерация кода, Отладка кода, Рефакторинг кода, Объяснение кода, Анализ кода"
-
-# Пути к файлам
-ENCRYPTED_KEY_FILE = "encrypted_api_key.bin"
-ENCRYPTION_KEY_FILE = "encryption_key.bin"
-CHAT_HISTORY_FILE = "chat_history.json"
-API_LOGS_DIR = "api_logs"
-
-# Модели
-VISION_MODELS = [
-    "meta-llama/Llama-3.2-90B-Vision-Instruct",
-    "Qwen/Qwen2-VL-7B-Instruct"
-]
-
-UPLOAD_FOLDER = "uploads"  # Папка для хранения загруженных файлов
-ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}  # Разрешенные расширения файлов
-
-# Обработка файлов
-MAX_FILE_SIZE = 20 * 1024 * 1024
-SUPPORTED_IMAGE_FORMATS = ["jpg", "jpeg", "png", "webp", "gif"]
-SUPPORTED_FILE_FORMATS = [".py", ".txt", ".json"]
-IMAGE_THUMBNAIL_SIZE = (200, 200)
-MAX_IMAGE_RESOLUTION = (4096, 4096)
-MIN_IMAGE_RESOLUTION = (512, 512)
-
-# Цветовые темы и связанные константы
-THEMES = {
-    "dark": {
-        "background": "#2b2b2b",
-        "widget_background": "#424242",
-        "border": "#555555",
-        "text": "#e0e0e0",
-        "error": "#ff5555",
-        "selection": "#4a6a92",
-        "user_message_background": "#3b4a5a",
-        "font_family": "Arial",
-        "font_size": 14
-    },
-    "light": {
-        "background": "#f7f3e8",
-        "widget_background": "#ffffff",
-        "border": "#d3c6b0",
-        "text": "#4a4a4a",
-        "error": "#d32f2f",
-        "selection": "#b0c4de",
-        "user_message_background": "#d3e3fd",
-        "font_family": "Arial",
-        "font_size": 14
-    }
-}
-
-# Настройки интерфейса
-COLORS = THEMES["dark"]
-CHAT_HISTORY_MAXLEN = 20
-MESSAGES_PER_PAGE = 3  # Количество сообщений на одной странице
-MESSAGE_HEIGHT_RULES = {
-    1: 1.5,
-    2: 2.5,
-    3: 3.5,
-    4: 4.5,
-    5: 5.5
-}
-COLLAPSED_MESSAGE_LINES = 5
-
-# Форматы даты и времени
-TIMESTAMP_FORMAT = "%H:%M:%S"
-DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
-EXPORT_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
-
-# Подсветка синтаксиса
-HIGHLIGHT_RULES = {
-    "keywords": r'\b(and|as|assert|break|class|continue|def|del|elif|else|except|exec|finally|for|from|global|if|import|in|is|lambda|not|or|pass|print|raise|return|try|while|with|yield)\b',
-    "strings": r'\".*?\"|\'.*?\'',
-    "comments": r'#.*$',
-    "numbers": r'\b\d+\b'
-}
-
-# Логирование программы (OFF отключает логирование)
-LOGGING = {
-    "level": "INFO",
-    "format": "%(asctime)s - %(levelname)s - %(message)s",
-    "filename": "app.log",
-    "encoding": "utf-8",
-    "mode": "append"  # Режим записи: append (дописывать) или recreate (пересоздавать)
-}
-
-# Логирование сервера (OFF отключает логирование)
-SERVER_LOGGING = {
-    "level": "INFO",
-    "format": "%(asctime)s - %(levelname)s - %(message)s",
-    "filename": "server.log",
-    "encoding": "utf-8",
-    "mode": "append"  # Режим записи: append (дописывать) или recreate (пересоздавать)
-}
+import os
+
+# Путь к файлам настроек
+API_SETTINGS_FILE = "api_settings.json"
+THEME_SETTINGS_FILE = "theme_settings.json"
+
+# Настройки API
+BASE_URL = "https://api.intelligence.io.solutions/api/v1"
+API_REQUEST_TIMEOUT = 60
+TEMPERATURE = 0.7
+MAX_COMPLETION_TOKENS = 2000
+SEED = 42
+RESPONSE_CACHE_ENABLED = False  # Кэширование ответов (включается в меню)
+SYSTEM_PROMPT = "Ты эксперт в области программирования и анализа изображений. Отвечай коротко, внятно и четко на русском языке. Генерация кода, Отладка кода, Рефакторинг кода, Объяснение кода, Анализ кода"
+
+# Пути к файлам
+ENCRYPTED_KEY_FILE = "encrypted_api_key.bin"
+ENCRYPTION_KEY_FILE = "encryption_key.bin"
+CHAT_HISTORY_FILE = "chat_history.json"
+API_LOGS_DIR = "api_logs"
+
+# Журнал запросов и ответов API (JSONL-сегменты в API_LOGS_DIR)
+API_LOGGING = {
+    "enabled": False,
+    "segment_max_bytes": 50 * 1024 * 1024,  # Ротация сегмента по размеру
+    "segment_max_seconds": 60 * 60,  # Ротация сегмента по времени
+    "gzip": False,  # Сжимать сегменты
+    "elide_images": True  # Не сохранять base64-данные изображений
+}
+
+# Кэш ответов API: ключ — хэш модели, сообщений, температуры, лимита токенов и seed
+RESPONSE_CACHE = {
+    "dir": "response_cache",
+    "ttl": 7 * 24 * 60 * 60,  # Время жизни записи в секундах (0 — без ограничения)
+    "max_entries": 500  # Максимальное количество записей (LRU)
+}
+
+# Эмбеддинги: размер пакетов запросов и число параллельных запросов
+EMBEDDING_SETTINGS = {
+    "batch_size": 64,  # Максимум текстов в одном запросе
+    "max_batch_chars": 100000,  # Максимум символов в одном запросе
+    "max_workers": 4,  # Количество параллельных запросов
+    "cache": True,  # Кэшировать эмбеддинги на диске по модели и хэшу текста
+    "cache_dir": "embedding_cache"
+}
+
+# Семантический поиск по истории чата
+SEMANTIC_SEARCH = {
+    "dir": "semantic_index",
+    "top_k": 10,  # Количество результатов поиска
+    "max_text_chars": 4000  # Максимальная длина индексируемого текста сообщения
+}
+
+# Вложения файлов: в запрос добавляются только релевантные фрагменты
+ATTACHMENT_RETRIEVAL_ENABLED = False  # Режим по умолчанию (переключается в меню)
+ATTACHMENT_RETRIEVAL = {
+    "min_chars": 8000,  # Файлы короче вставляются целиком
+    "chunk_lines": 60,  # Размер фрагмента в строках
+    "overlap_lines": 10,  # Перекрытие соседних фрагментов
+    "top_k": 5,  # Количество фрагментов в запросе
+    "cache_dir": "attachment_index"
+}
+
+# Метрики запросов: кольцевой буфер временных шкал и их выгрузка в JSONL
+METRICS = {
+    "ring_size": 1000,  # Количество хранимых временных шкал
+    "auto_export": True,  # Дописывать каждую временную шкалу в файл метрик
+    "dir": "metrics"
+}
+
+# Пакетный режим: параллельные запросы из JSONL-файла без интерфейса
+BATCH_SETTINGS = {
+    "max_workers": 8,  # Одновременных запросов
+    "rate_limit": 5.0,  # Запросов в секунду (0 — без ограничения)
+    "retries": 3,  # Повторов при ответе 429 и ошибках сети
+    "retry_backoff": 2.0  # Пауза перед повтором без заголовка Retry-After, сек (удваивается)
+}
+
+# Запись и воспроизведение обменов с API: "off", "record" или "replay"
+CASSETTE = {
+    "mode": "off",
+    "path": "cassettes/api.jsonl.gz",
+    "latency_scale": 1.0,  # Множитель записанных задержек при воспроизведении (0 — без задержек)
+    "sequential": False  # Отвечать следующим записанным ответом на запросы без точного совпадения
+}
+
+# Профилирование: отчеты cProfile и tracemalloc
+PROFILING = {
+    "dir": "profiles",
+    "top_n": 30,  # Строк в сводке
+    "tracemalloc_frames": 10  # Глубина стека для выделений памяти
+}
+
+# Детектор зависаний интерфейса: пульс цикла событий и снятие стека главного потока
+STALL_DETECTION = {
+    "enabled": True,
+    "interval_ms": 50,  # Период пульса
+    "threshold_ms": 200,  # Задержка пульса, считающаяся зависанием
+    "sample_ms": 500,  # Период повторного снятия стека во время зависания
+    "max_samples": 10,  # Стеков на одно зависание
+    "stack_depth": 40,
+    "dir": "stalls"
+}
+
+# Модели
+VISION_MODELS = [
+    "meta-llama/Llama-3.2-90B-Vision-Instruct",
+    "Qwen/Qwen2-VL-7B-Instruct"
+]
+
+UPLOAD_FOLDER = "uploads"  # Папка для хранения загруженных файлов
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}  # Разрешенные расширения файлов
+
+# Обработка файлов
+MAX_FILE_SIZE = 20 * 1024 * 1024
+SUPPORTED_IMAGE_FORMATS = ["jpg", "jpeg", "png", "webp", "gif"]
+SUPPORTED_FILE_FORMATS = [".py", ".txt", ".json"]
+IMAGE_THUMBNAIL_SIZE = (200, 200)
+MAX_IMAGE_RESOLUTION = (4096, 4096)
+MIN_IMAGE_RESOLUTION = (512, 512)
+
+# Цветовые темы и связанные константы
+THEMES = {
+    "dark": {
+        "background": "#2b2b2b",
+        "widget_background": "#424242",
+        "border": "#555555",
+        "text": "#e0e0e0",
+        "error": "#ff5555",
+        "selection": "#4a6a92",
+        "user_message_background": "#3b4a5a",
+        "font_family": "Arial",
+        "font_size": 14
+    },
+    "light": {
+        "background": "#f7f3e8",
+        "widget_background": "#ffffff",
+        "border": "#d3c6b0",
+        "text": "#4a4a4a",
+        "error": "#d32f2f",
+        "selection": "#b0c4de",
+        "user_message_background": "#d3e3fd",
+        "font_family": "Arial",
+        "font_size": 14
+    }
+}
+
+# Настройки интерфейса
+# Текущие цвета и шрифт; тема переключается изменением словаря на месте (styles.set_theme)
+COLORS = dict(THEMES["dark"])
+CHAT_HISTORY_MAXLEN = 20
+MESSAGES_PER_PAGE = 3  # Количество сообщений на одной странице
+# Снимок последнего сеанса для мгновенной первой отрисовки окна при запуске
+STARTUP_SNAPSHOT = {
+    "enabled": True,
+    "file": "startup_snapshot.json",
+    "messages": MESSAGES_PER_PAGE  # Сообщений последней страницы в снимке
+}
+MESSAGE_HEIGHT_RULES = {
+    1: 1.5,
+    2: 2.5,
+    3: 3.5,
+    4: 4.5,
+    5: 5.5
+}
+COLLAPSED_MESSAGE_LINES = 5
+# Большие сообщения: свернутое превью, полный текст вставляется порциями при разворачивании
+LARGE_MESSAGES = {
+    "min_chars": 30000,  # Сообщения от этой длины показываются свернутыми
+    "preview_chars": 2000,  # Символов в превью свернутого сообщения
+    "chunk_chars": 16000,  # Символов, вставляемых в документ за один проход цикла событий
+    "chunk_interval_ms": 0,  # Пауза между порциями
+    "expanded_height": 1000  # Высота поля развернутого сообщения, px; текст прокручивается внутри
+}
+# Кэш измерений высоты сообщений и пакетная перераскладка
+MESSAGE_HEIGHT_CACHE = {
+    "cache_size": 5000,  # Измерений в кэше (текст, ширина, шрифт)
+    "batch_delay_ms": 0,  # Задержка пачки обновлений высоты после создания сообщений
+    "resize_debounce_ms": 150  # Пересчет высоты после окончания изменения ширины окна
+}
+# Виджеты сообщений ленты чата создаются только возле видимой области
+LAZY_MESSAGES = {
+    "enabled": True,
+    "preload_screens": 1.0,  # Виджеты создаются в пределах стольких экранов выше и ниже видимой области
+    "release_screens": 3.0,  # Виджеты удаляются дальше стольких экранов от видимой области
+    "release_after_ms": 30000,  # ...если сообщение пробыло там дольше этого времени
+    "update_delay_ms": 30,  # Задержка пересчета видимости после прокрутки
+    "sweep_interval_ms": 5000  # Период проверки сообщений для освобождения
+}
+
+# Форматы даты и времени
+TIMESTAMP_FORMAT = "%H:%M:%S"
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EXPORT_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Подсветка синтаксиса: цвета категорий токенов Pygments в блоках кода ``` по темам
+HIGHLIGHT_STYLES = {
+    "dark": {
+        "keyword": "#00ffff",
+        "string": "#00ff00",
+        "comment": "#a0a0a4",
+        "number": "#ff00ff",
+        "function": "#ffff80",
+        "builtin": "#80c0ff",
+        "decorator": "#ffa040"
+    },
+    "light": {
+        "keyword": "#000080",
+        "string": "#008000",
+        "comment": "#808080",
+        "number": "#800080",
+        "function": "#806000",
+        "builtin": "#005f87",
+        "decorator": "#a05000"
+    }
+}
+HIGHLIGHT_SETTINGS = {
+    "default_language": None,  # Язык блоков без указания языка (None — определять по содержимому)
+    "cache_size": 256,  # Блоков кода в кэше разметки
+    "async_min_lines": 300  # Блоки кода от этого числа строк разбираются в фоновом потоке
+}
+# Отрисовка Markdown в ответах ассистента
+MARKDOWN = {
+    "enabled": True,
+    "cache_size": 2000,  # Сообщений в кэше разметки блоков кода
+    "persist": True,  # Сохранять кэш между запусками
+    "cache_file": "markdown_cache.json"
+}
+
+# Автодополнение запроса: частотный префиксный индекс слов сообщений
+COMPLETION_INDEX = {
+    "file": "completion_index.json",
+    "roles": ["user"],  # Слова сообщений этих ролей попадают в индекс
+    "min_word_length": 3,
+    "min_prefix_length": 2,  # Подсказки начинаются с префикса этой длины
+    "max_results": 20,
+    "result_cache_size": 1000  # Префиксов с готовыми подсказками до очистки кэша
+}
+
+# Виртуализированные списки сообщений: лента чата и архив истории
+CHAT_VIEW_SETTINGS = {
+    "height_cache_size": 20000,  # Измеренных высот сообщений в кэше
+    "layout_batch_size": 100,  # Сообщений, раскладываемых за один проход цикла событий
+    "max_preview_lines": 40,  # Строк длинного сообщения, показываемых в списке
+    "max_preview_chars": 4000,  # Символов длинного сообщения, показываемых в списке
+    "padding": 10,  # Внутренний отступ пузыря сообщения, px
+    "spacing": 4  # Расстояние между сообщениями, px
+}
+
+# Логирование программы (OFF отключает логирование)
+LOGGING = {
+    "level": "INFO",
+    "format": "%(asctime)s - %(levelname)s - %(message)s",
+    "filename": "app.log",
+    "encoding": "utf-8",
+    "mode": "append",  # Режим записи: append (дописывать) или recreate (пересоздавать)
+    "max_bytes": 10 * 1024 * 1024,  # Ротация файла по размеру
+    "backup_count": 5  # Количество архивных файлов
+}
+
+# Логирование сервера (OFF отключает логирование)
+SERVER_LOGGING = {
+    "level": "INFO",
+    "format": "%(asctime)s - %(levelname)s - %(message)s",
+    "filename": "server.log",
+    "encoding": "utf-8",
+    "mode": "append",  # Режим записи: append (дописывать) или recreate (пересоздавать)
+    "max_bytes": 10 * 1024 * 1024,  # Ротация файла по размеру
+    "backup_count": 5  # Количество архивных файлов
+}
@@ -0,0 +1,265 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from config import EMBEDDING_SETTINGS
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def text_keys(texts):
+    """Вычисляет 64-битные хэши текстов для индекса кэша эмбеддингов."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little") for text in texts),
+        dtype=np.uint64,
+        count=len(texts)
+    )
+
+class EmbeddingCache:
+    """Дисковый кэш эмбеддингов одной модели.
+
+    Векторы хранятся в отображаемой в память матрице float32 (vectors.f32),
+    хэши текстов — в компактном индексе uint64 (keys.u64), где номер записи
+    совпадает с номером строки матрицы.
+    """
+    def __init__(self, model_id, directory=None):
+        self.model_id = model_id
+        self.path = os.path.join(
+            directory or EMBEDDING_SETTINGS["cache_dir"],
+            hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        )
+        self.dim = None
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._sorted_keys = np.empty(0, dtype=np.uint64)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._count = 0
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        """Загружает индекс и отображает матрицу векторов в память."""
+        try:
+            if not os.path.exists(self._file("meta.json")):
+                return
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            keys_path = self._file("keys.u64")
+            vectors_path = self._file("vectors.f32")
+            keys = np.fromfile(keys_path, dtype=np.uint64) if os.path.exists(keys_path) else np.empty(0, dtype=np.uint64)
+            vector_rows = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+            # Индекс дописывается после векторов, поэтому обрезаем его по матрице
+            self._count = min(len(keys), vector_rows)
+            self._truncate()
+            self._index(keys[:self._count])
+            self._map()
+            app_logger.debug(f"Кэш эмбеддингов {self.model_id}: {self._count} векторов")
+        except Exception as e:
+            app_logger.error(f"Ошибка загрузки кэша эмбеддингов {self.model_id}: {str(e)}")
+            self.dim = None
+            self._count = 0
+            self._vectors = None
+            self._index(np.empty(0, dtype=np.uint64))
+
+    def _truncate(self):
+        """Обрезает файлы векторов и ключей до числа записей индекса.
+
+        После прерванной записи в файлах остаются строки без пары; новые записи,
+        дописанные после них, сдвинули бы соответствие ключей строкам матрицы.
+        """
+        for name, size in (("vectors.f32", self._count * (self.dim or 0) * 4), ("keys.u64", self._count * 8)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+                app_logger.warning(f"Кэш эмбеддингов {self.model_id}: {name} обрезан до {self._count} записей")
+
+    def _index(self, keys):
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = order.astype(np.int64)
+
+    def _map(self):
+        self._vectors = None
+        if self._count:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(self._count, self.dim))
+
+    def find(self, keys):
+        """Возвращает номера строк для хэшей текстов (-1 для отсутствующих)."""
+        with self._lock:
+            rows = np.full(len(keys), -1, dtype=np.int64)
+            if not len(self._sorted_keys) or not len(keys):
+                return rows
+            positions = np.searchsorted(self._sorted_keys, keys)
+            positions = np.minimum(positions, len(self._sorted_keys) - 1)
+            found = self._sorted_keys[positions] == keys
+            rows[found] = self._sorted_rows[positions[found]]
+            return rows
+
+    def vector(self, row):
+        """Возвращает вектор строки без копирования данных."""
+        return self._vectors[row]
+
+    def take(self, rows):
+        """Возвращает векторы для набора строк."""
+        return self._vectors[np.asarray(rows, dtype=np.int64)]
+
+    def add(self, keys, vectors):
+        """Дописывает новые векторы в кэш."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                os.makedirs(self.path, exist_ok=True)
+                with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_id, "dim": self.dim}, f, ensure_ascii=False)
+            elif vectors.shape[1] != self.dim:
+                app_logger.warning(f"Размерность эмбеддингов {self.model_id} изменилась ({self.dim} -> {vectors.shape[1]}), кэш не обновлен")
+                return
+            self._truncate()
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("keys.u64"), "ab") as f:
+                f.write(np.asarray(keys, dtype=np.uint64).tobytes())
+            all_keys = np.concatenate([self._keys_by_row(), np.asarray(keys, dtype=np.uint64)])
+            self._count += len(vectors)
+            self._index(all_keys)
+            self._map()
+
+    def _keys_by_row(self):
+        keys = np.empty(len(self._sorted_keys), dtype=np.uint64)
+        keys[self._sorted_rows] = self._sorted_keys
+        return keys
+
+    def __len__(self):
+        return self._count
+
+def get_embedding_cache(model_id):
+    """Возвращает общий экземпляр кэша эмбеддингов для модели."""
+    with _caches_lock:
+        if model_id not in _caches:
+            _caches[model_id] = EmbeddingCache(model_id)
+        return _caches[model_id]
+
+def split_into_batches(texts, batch_size=None, max_batch_chars=None):
+    """Разбивает тексты на пакеты с ограничением по числу элементов и суммарной длине.
+
+    Returns:
+        list: Список пар (индекс первого текста, список текстов пакета).
+    """
+    batch_size = batch_size or EMBEDDING_SETTINGS["batch_size"]
+    max_batch_chars = max_batch_chars or EMBEDDING_SETTINGS["max_batch_chars"]
+    batches = []
+    start = 0
+    current = []
+    current_chars = 0
+    for i, text in enumerate(texts):
+        if current and (len(current) >= batch_size or current_chars + len(text) > max_batch_chars):
+            batches.append((start, current))
+            start = i
+            current = []
+            current_chars = 0
+        current.append(text)
+        current_chars += len(text)
+    if current:
+        batches.append((start, current))
+    return batches
+
+def _request_embeddings(model_id, texts, api_settings, api_key):
+    """Отправляет один пакет текстов в API эмбеддингов."""
+    embeddings_url = f"{api_settings['BASE_URL']}/embeddings"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    data = {
+        "model": model_id,
+        "input": texts
+    }
+    response = requests.post(embeddings_url, headers=headers, json=data, timeout=api_settings['API_REQUEST_TIMEOUT'])
+    response.raise_for_status()
+    items = sorted(response.json()['data'], key=lambda item: item.get('index', 0))
+    if len(items) != len(texts):
+        raise ValueError(f"API вернул {len(items)} эмбеддингов вместо {len(texts)}")
+    return [item['embedding'] for item in items]
+
+def embed_texts(model_id, texts, api_settings, api_key, max_workers=None, use_cache=None):
+    """Создает эмбеддинги для списка текстов, запрашивая у API только отсутствующие в кэше.
+
+    Returns:
+        numpy.ndarray: Непрерывная матрица float32 размером (len(texts), dim).
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    if use_cache is None:
+        use_cache = EMBEDDING_SETTINGS["cache"]
+    if not use_cache:
+        return _embed_uncached(model_id, texts, api_settings, api_key, max_workers)
+    cache = get_embedding_cache(model_id)
+    keys = text_keys(texts)
+    rows = cache.find(keys)
+    missing = np.flatnonzero(rows < 0)
+    if len(missing):
+        # Одинаковые тексты отправляем в API один раз
+        unique_keys, first_positions = np.unique(keys[missing], return_index=True)
+        missing_texts = [texts[i] for i in missing[first_positions]]
+        app_logger.debug(f"Кэш эмбеддингов {model_id}: {len(texts) - len(missing)} попаданий, {len(missing_texts)} запросов")
+        new_vectors = _embed_uncached(model_id, missing_texts, api_settings, api_key, max_workers)
+        cache.add(unique_keys, new_vectors)
+        rows = cache.find(keys)
+        if (rows < 0).any():
+            # Кэш не принял векторы (сменилась размерность модели) — обходим его
+            return _embed_uncached(model_id, texts, api_settings, api_key, max_workers)
+    return np.ascontiguousarray(cache.take(rows))
+
+def _embed_uncached(model_id, texts, api_settings, api_key, max_workers=None):
+    """Создает эмбеддинги для списка текстов пакетными параллельными запросами."""
+    batches = split_into_batches(texts)
+    max_workers = max(1, min(max_workers or EMBEDDING_SETTINGS["max_workers"], len(batches)))
+    app_logger.debug(f"Эмбеддинг {len(texts)} текстов в {len(batches)} пакетах ({max_workers} потоков)")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (start, executor.submit(_request_embeddings, model_id, batch, api_settings, api_key))
+            for start, batch in batches
+        ]
+        vectors = None
+        for start, future in futures:
+            batch_vectors = np.asarray(future.result(), dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[start:start + len(batch_vectors)] = batch_vectors
+    return vectors
+
+def read_corpus(filepath):
+    """Читает тексты для эмбеддинга: по одному на строку (.txt) или поле "text" (.jsonl)."""
+    texts = []
+    ext = os.path.splitext(filepath)[1].lower()
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if ext == ".jsonl":
+                record = json.loads(line)
+                text = record.get("text") if isinstance(record, dict) else record
+                if isinstance(text, str) and text.strip():
+                    texts.append(text)
+            else:
+                texts.append(line)
+    return texts
+
+def save_embeddings(filepath, vectors):
+    """Сохраняет матрицу эмбеддингов в формате .npy."""
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    np.save(filepath, np.ascontiguousarray(vectors, dtype=np.float32))
@@ -0,0 +1,97 @@
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import threading
+import logging
+from datetime import datetime
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+_STOP = object()
+
+class JsonlWriter(threading.Thread):
+    """Фоновый писатель JSONL-записей в сегменты с ротацией по размеру и времени.
+
+    Записи ставятся в очередь без ожидания диска; сериализация и запись
+    выполняются в отдельном потоке. Сегменты называются
+    <prefix>_<дата>_<pid>_<номер>.jsonl[.gz].
+    """
+    def __init__(self, directory, prefix, max_bytes=50 * 1024 * 1024, max_seconds=3600,
+                 use_gzip=False, transform=None, flush_interval=1.0):
+        super().__init__(name=f"JsonlWriter-{prefix}", daemon=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.use_gzip = use_gzip
+        self.transform = transform
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._segment_bytes = 0
+        self._segment_started = 0.0
+        self._segment_index = 0
+        self.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        """Ставит запись в очередь на запись."""
+        self._queue.put(record)
+
+    def close(self, timeout=5.0):
+        """Дописывает очередь и закрывает текущий сегмент."""
+        if self.is_alive():
+            self._queue.put(_STOP)
+            self.join(timeout)
+
+    def _open_segment(self):
+        """Открывает новый файл сегмента."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_index += 1
+        name = f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._segment_index:04d}.jsonl"
+        if self.use_gzip:
+            self._file = gzip.open(os.path.join(self.directory, name + ".gz"), "ab")
+        else:
+            self._file = open(os.path.join(self.directory, name), "ab")
+        self._segment_bytes = 0
+        self._segment_started = time.monotonic()
+
+    def _close_segment(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_record(self, record):
+        if self.transform:
+            record = self.transform(record)
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        if self._file and (
+            self._segment_bytes + len(line) > self.max_bytes
+            or time.monotonic() - self._segment_started > self.max_seconds
+        ):
+            self._close_segment()
+        if not self._file:
+            self._open_segment()
+        self._file.write(line)
+        self._segment_bytes += len(line)
+
+    def run(self):
+        """Обрабатывает очередь записей."""
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._file:
+                    self._file.flush()
+                continue
+            if record is _STOP:
+                break
+            try:
+                self._write_record(record)
+            except Exception as e:
+                app_logger.error(f"Ошибка записи в журнал {self.prefix}: {str(e)}")
+        self._close_segment()
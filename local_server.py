@@ -1,22 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask import send_from_directory
 import os
+import time
 import logging
 from werkzeug.utils import secure_filename
 from config import UPLOAD_FOLDER, ALLOWED_EXTENSIONS
 from logging_config import configure_logging
+from server_metrics import ServerMetrics
 
-# Настраиваем логирование
-configure_logging()
+# Настраиваем логирование; файлы логов ротирует процесс приложения
+configure_logging(rotate=False)
 server_logger = logging.getLogger('server')
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+metrics = ServerMetrics()
 
 def allowed_file(filename):
     """Checking if the file has an allowed extension."""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def start_request_timer():
+    """Remembering the request start time for latency metrics."""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Recording request count, latency and traffic for the /metrics endpoint."""
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(
+            route,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            request.content_length or 0,
+            response.content_length or 0
+        )
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Exposing server metrics in the Prometheus text format."""
+    return metrics.render(app.config["UPLOAD_FOLDER"]), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Returning a simple health check endpoint."""
@@ -1,83 +1,159 @@
-import os
-import json
-import logging
-from config import LOGGING, SERVER_LOGGING
-
-def configure_logging():
-    """Настраивает систему логирования на основе конфигурации из JSON или config."""
-    global LOGGING, SERVER_LOGGING
-    logging_settings_file = "logging_settings.json"
-
-    # Проверяем наличие JSON-файла с настройками логирования
-    if os.path.exists(logging_settings_file):
-        try:
-            with open(logging_settings_file, "r", encoding="utf-8") as f:
-                logging_config = json.load(f)
-            # Проверяем наличие и тип ключей
-            if not isinstance(logging_config, dict):
-                raise ValueError("Файл logging_settings.json должен содержать словарь")
-            if "LOGGING" not in logging_config or not isinstance(logging_config["LOGGING"], dict):
-                raise ValueError("Ключ 'LOGGING' отсутствует или не является словарем")
-            if "SERVER_LOGGING" not in logging_config or not isinstance(logging_config["SERVER_LOGGING"], dict):
-                raise ValueError("Ключ 'SERVER_LOGGING' отсутствует или не является словарем")
-
-            # Обновляем глобальные переменные
-            LOGGING.clear()
-            LOGGING.update(logging_config["LOGGING"])
-            SERVER_LOGGING.clear()
-            SERVER_LOGGING.update(logging_config["SERVER_LOGGING"])
-            app_logger = logging.getLogger('app')
-            app_logger.info(f"Настройки логирования загружены из {logging_settings_file}")
-        except Exception as e:
-            app_logger = logging.getLogger('app')
-            app_logger.error(f"Ошибка загрузки настроек логирования из {logging_settings_file}: {str(e)}")
-    else:
-        app_logger = logging.getLogger('app')
-        app_logger.info(f"Файл {logging_settings_file} не найден, используются настройки по умолчанию")
-
-    # Очищаем существующие обработчики
-    app_logger = logging.getLogger('app')
-    server_logger = logging.getLogger('server')
-    for logger in (app_logger, server_logger):
-        logger.handlers.clear()
-
-    # Настраиваем логирование для приложения (app.log)
-    if LOGGING["level"] != "OFF":
-        file_mode = 'w' if LOGGING.get("mode", "recreate") == "recreate" else 'a'
-        app_handler = logging.FileHandler(LOGGING["filename"], mode=file_mode, encoding=LOGGING["encoding"])
-        app_handler.setFormatter(logging.Formatter(LOGGING["format"]))
-        app_logger.setLevel(getattr(logging, LOGGING["level"]))
-        app_logger.handlers = [app_handler, logging.StreamHandler()]
-    else:
-        app_logger.setLevel(logging.CRITICAL + 1)
-        app_logger.handlers = []
-
-    # Настраиваем логирование для сервера (server.log)
-    if SERVER_LOGGING["level"] != "OFF":
-        file_mode = 'w' if SERVER_LOGGING.get("mode", "recreate") == "recreate" else 'a'
-        server_handler = logging.FileHandler(SERVER_LOGGING["filename"], mode=file_mode, encoding=SERVER_LOGGING["encoding"])
-        server_handler.setFormatter(logging.Formatter(SERVER_LOGGING["format"]))
-        server_logger.setLevel(getattr(logging, SERVER_LOGGING["level"]))
-        server_logger.handlers = [server_handler, logging.StreamHandler()]
-    else:
-        server_logger.setLevel(logging.CRITICAL + 1)
-        server_logger.handlers = []
-
-def save_logging_config():
-    """Сохраняет конфигурацию логирования в JSON-файл."""
-    try:
-        logging_settings_file = "logging_settings.json"
-        os.makedirs(os.path.dirname(logging_settings_file) or ".", exist_ok=True)
-        with open(logging_settings_file, "w", encoding="utf-8") as f:
-            json.dump({
-                "LOGGING": LOGGING,
-                "SERVER_LOGGING": SERVER_LOGGING
-            }, f, ensure_ascii=False, indent=2)
-        app_logger = logging.getLogger('app')
-        if LOGGING["level"] != "OFF":
-            app_logger.info("Конфигурация логирования сохранена в logging_settings.json")
-    except Exception as e:
-        app_logger = logging.getLogger('app')
-        if LOGGING["level"] != "OFF":
-            app_logger.error(f"Ошибка сохранения конфигурации логирования: {str(e)}")
+import os
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOGGING, SERVER_LOGGING
+
+class _DispatchHandler(logging.Handler):
+    """Передает записи из очереди обработчикам соответствующего логгера."""
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def handle(self, record):
+        with self.lock:
+            for handler in self.routes.get(record.name.split(".")[0], ()):
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+# Все записи логгеров 'app' и 'server' проходят через одну очередь и один поток записи
+_log_queue = queue.SimpleQueue()
+_dispatch_handler = _DispatchHandler()
+_listener = None
+_handler_signatures = {}
+_opened_files = set()
+_settings_mtime = -1  # Файл настроек еще не читался
+
+def _start_listener():
+    """Запускает поток записи логов, если он еще не запущен."""
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_log_queue, _dispatch_handler)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+def _stop_listener():
+    """Останавливает поток записи логов, дописывая очередь."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handlers in _dispatch_handler.routes.values():
+            for handler in handlers:
+                handler.close()
+
+def _apply_logger_settings(name, settings, rotate=True):
+    """Применяет настройки к логгеру, пересоздавая файловый обработчик только при смене файла."""
+    logger = logging.getLogger(name)
+    if settings["level"] == "OFF":
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+    signature = (
+        settings["filename"],
+        settings["encoding"],
+        settings.get("max_bytes", 10 * 1024 * 1024),
+        settings.get("backup_count", 5),
+        rotate
+    )
+    formatter = logging.Formatter(settings["format"])
+    if _handler_signatures.get(name) != signature:
+        filename, encoding, max_bytes, backup_count, rotate = signature
+        # Режим recreate очищает файл только при первом открытии в процессе
+        if settings.get("mode", "recreate") == "recreate" and filename not in _opened_files:
+            open(filename, "w", encoding=encoding).close()
+        _opened_files.add(filename)
+        if rotate:
+            file_handler = RotatingFileHandler(
+                filename, mode='a', maxBytes=max_bytes, backupCount=backup_count, encoding=encoding
+            )
+        else:
+            # Файл ротирует другой процесс: дозапись без ротации безопасна при общем файле
+            file_handler = logging.FileHandler(filename, mode='a', encoding=encoding)
+        with _dispatch_handler.lock:
+            old_handlers = _dispatch_handler.routes.get(name, [])
+            _dispatch_handler.routes[name] = [file_handler, logging.StreamHandler()]
+            for handler in old_handlers:
+                handler.close()
+        _handler_signatures[name] = signature
+    for handler in _dispatch_handler.routes[name]:
+        handler.setFormatter(formatter)
+    if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        logger.handlers = [QueueHandler(_log_queue)]
+    logger.setLevel(getattr(logging, settings["level"]))
+    _start_listener()
+
+def _load_logging_settings(logging_settings_file):
+    """Загружает настройки логирования из JSON-файла в LOGGING и SERVER_LOGGING."""
+    # Проверяем наличие JSON-файла с настройками логирования
+    if os.path.exists(logging_settings_file):
+        try:
+            with open(logging_settings_file, "r", encoding="utf-8") as f:
+                logging_config = json.load(f)
+            # Проверяем наличие и тип ключей
+            if not isinstance(logging_config, dict):
+                raise ValueError("Файл logging_settings.json должен содержать словарь")
+            if "LOGGING" not in logging_config or not isinstance(logging_config["LOGGING"], dict):
+                raise ValueError("Ключ 'LOGGING' отсутствует или не является словарем")
+            if "SERVER_LOGGING" not in logging_config or not isinstance(logging_config["SERVER_LOGGING"], dict):
+                raise ValueError("Ключ 'SERVER_LOGGING' отсутствует или не является словарем")
+
+            # Обновляем глобальные переменные
+            LOGGING.clear()
+            LOGGING.update(logging_config["LOGGING"])
+            SERVER_LOGGING.clear()
+            SERVER_LOGGING.update(logging_config["SERVER_LOGGING"])
+            app_logger = logging.getLogger('app')
+            app_logger.info(f"Настройки логирования загружены из {logging_settings_file}")
+        except Exception as e:
+            app_logger = logging.getLogger('app')
+            app_logger.error(f"Ошибка загрузки настроек логирования из {logging_settings_file}: {str(e)}")
+    else:
+        app_logger = logging.getLogger('app')
+        app_logger.info(f"Файл {logging_settings_file} не найден, используются настройки по умолчанию")
+
+def configure_logging(rotate=True):
+    """Настраивает систему логирования на основе конфигурации из JSON или config.
+
+    Повторные вызовы безопасны: файл настроек перечитывается только при его
+    изменении, а обработчики пересоздаются только при смене файла логов.
+
+    Args:
+        rotate (bool): Ротировать файлы логов по размеру. Файлы app.log и
+            server.log общие для приложения и процесса локального сервера,
+            поэтому ротирует их только приложение, а сервер вызывает
+            configure_logging(rotate=False).
+    """
+    global _settings_mtime
+    logging_settings_file = "logging_settings.json"
+    settings_mtime = os.path.getmtime(logging_settings_file) if os.path.exists(logging_settings_file) else None
+    if settings_mtime != _settings_mtime:
+        _settings_mtime = settings_mtime
+        _load_logging_settings(logging_settings_file)
+
+    _apply_logger_settings('app', LOGGING, rotate)
+    _apply_logger_settings('server', SERVER_LOGGING, rotate)
+
+def save_logging_config():
+    """Сохраняет конфигурацию логирования в JSON-файл."""
+    try:
+        logging_settings_file = "logging_settings.json"
+        os.makedirs(os.path.dirname(logging_settings_file) or ".", exist_ok=True)
+        with open(logging_settings_file, "w", encoding="utf-8") as f:
+            json.dump({
+                "LOGGING": LOGGING,
+                "SERVER_LOGGING": SERVER_LOGGING
+            }, f, ensure_ascii=False, indent=2)
+        app_logger = logging.getLogger('app')
+        if LOGGING["level"] != "OFF":
+            app_logger.info("Конфигурация логирования сохранена в logging_settings.json")
+    except Exception as e:
+        app_logger = logging.getLogger('app')
+        if LOGGING["level"] != "OFF":
+            app_logger.error(f"Ошибка сохранения конфигурации логирования: {str(e)}")
         raise
\ No newline at end of file
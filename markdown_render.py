@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from PyQt6.QtCore import QObject
+from PyQt6.QtGui import QTextDocument, QTextFormat, QTextCursor, QTextBlockFormat, QColor
+from config import COLORS, MARKDOWN
+from text_editors import tokenize_code, highlight_formats, _highlight_workers, _release_highlight_worker
+from worker import Worker
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+class MarkdownCache:
+    """LRU разметки блоков кода отрисованных сообщений по хэшу текста сообщения.
+
+    Разбор Markdown выполняется заново при каждой отрисовке (md4c в Qt быстрее
+    разбора готового HTML), а дорогая часть — определение языка и разбор кода
+    Pygments — берется из кэша. Разметка не зависит от темы, поэтому смена темы
+    только перекрашивает блоки кода. Кэш сохраняется в MARKDOWN["cache_file"].
+    """
+    def __init__(self, filepath=None):
+        self.filepath = filepath or MARKDOWN["cache_file"]
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loaded = False
+        self._dirty = False
+
+    def _load(self):
+        """Загружает кэш с диска при первом обращении."""
+        self._loaded = True
+        if not MARKDOWN["persist"] or not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                self._entries = OrderedDict(json.load(f))
+            app_logger.debug(f"Кэш Markdown загружен: {len(self._entries)} сообщений")
+        except Exception as e:
+            app_logger.error(f"Ошибка загрузки кэша Markdown: {str(e)}")
+            self._entries = OrderedDict()
+
+    def get(self, key):
+        """Возвращает разметку блоков кода сообщения или None."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            runs = self._entries.get(key)
+            if runs is not None:
+                self._entries.move_to_end(key)
+            return runs
+
+    def put(self, key, runs):
+        """Сохраняет разметку блоков кода сообщения."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._entries[key] = runs
+            self._entries.move_to_end(key)
+            while len(self._entries) > MARKDOWN["cache_size"]:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        """Сохраняет кэш на диск, если он изменился."""
+        with self._lock:
+            if not MARKDOWN["persist"] or not self._dirty:
+                return
+            data = list(self._entries.items())
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+            tmp_path = self.filepath + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.filepath)
+        except Exception as e:
+            app_logger.error(f"Ошибка сохранения кэша Markdown: {str(e)}")
+
+# Общий кэш разметки сообщений
+markdown_cache = MarkdownCache()
+
+def _message_key(text):
+    """Возвращает хэш текста сообщения для кэша разметки."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _tokenize_sources(sources):
+    """Разбирает блоки кода сообщения в фоновом потоке."""
+    return [tokenize_code(language, code) for language, code in sources]
+
+class MarkdownRenderer(QObject):
+    """Отрисовка Markdown в документе сообщения с подсветкой блоков кода.
+
+    Заголовки, списки, таблицы и блоки кода строит QTextDocument.setMarkdown.
+    Блоки кода подсвечиваются форматами символов по разметке из markdown_cache;
+    если разметки нет, код разбирается в фоновом потоке и подсвечивается
+    по готовности. Объект принадлежит документу и удаляется вместе с ним.
+    """
+    def __init__(self, document, app):
+        super().__init__(document)
+        self.document = document
+        self.app = app
+        self.formats = {}
+        self._key = None
+        self._runs = None
+        self.update_colors()
+
+    def update_colors(self):
+        """Обновляет форматы подсветки в зависимости от темы."""
+        self.formats = highlight_formats(self.app)
+
+    def set_text(self, text):
+        """Отрисовывает текст сообщения как Markdown."""
+        self.document.setMarkdown(text, QTextDocument.MarkdownFeature.MarkdownDialectGitHub)
+        blocks = self._code_blocks()
+        self._key = _message_key(text)
+        self._runs = None
+        if not blocks:
+            return
+        runs = markdown_cache.get(self._key)
+        if runs is not None and len(runs) == len(blocks):
+            self._runs = runs
+            self._apply()
+            return
+        sources = [(language, "\n".join(block.text() for block in lines)) for language, lines in blocks]
+        key = self._key
+        worker = Worker(_tokenize_sources, sources)
+        worker.signals.finished.connect(lambda result: self._on_tokenized(key, result))
+        worker.finished.connect(lambda: _release_highlight_worker(worker))
+        _highlight_workers.add(worker)
+        worker.start()
+
+    def rehighlight(self):
+        """Перекрашивает блоки кода по сохраненной разметке, не разбирая текст заново."""
+        self.update_colors()
+        self._apply()
+
+    def _code_blocks(self):
+        """Возвращает блоки кода документа: [(язык, [текстовые блоки строк])]."""
+        blocks = []
+        current = None
+        block = self.document.begin()
+        while block.isValid():
+            block_format = block.blockFormat()
+            if block_format.hasProperty(QTextFormat.Property.BlockCodeFence):
+                language = block_format.stringProperty(QTextFormat.Property.BlockCodeLanguage)
+                if current is None or current[0] != language:
+                    current = (language, [])
+                    blocks.append(current)
+                current[1].append(block)
+            else:
+                current = None
+            block = block.next()
+        return blocks
+
+    def _on_tokenized(self, key, runs):
+        """Сохраняет разметку, разобранную в фоновом потоке, и подсвечивает код."""
+        markdown_cache.put(key, runs)
+        try:
+            if key != self._key:
+                return
+            self._runs = runs
+            self._apply()
+        except RuntimeError:
+            # Документ удален до окончания разбора
+            return
+
+    def _apply(self):
+        """Применяет форматы подсветки и фон к блокам кода одной правкой документа."""
+        if self._runs is None:
+            return
+        blocks = self._code_blocks()
+        if len(blocks) != len(self._runs):
+            return
+        cursor = QTextCursor(self.document)
+        cursor.beginEditBlock()
+        background = QTextBlockFormat()
+        background.setBackground(QColor(COLORS["background"]))
+        for (_, lines), runs in zip(blocks, self._runs):
+            for block, line_runs in zip(lines, runs):
+                position = block.position()
+                cursor.setPosition(position)
+                cursor.mergeBlockFormat(background)
+                for start, length, category in line_runs:
+                    cursor.setPosition(position + start)
+                    cursor.setPosition(position + start + length, QTextCursor.MoveMode.KeepAnchor)
+                    cursor.mergeCharFormat(self.formats[category])
+        cursor.endEditBlock()
@@ -0,0 +1,166 @@
+import time
+import json
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import METRICS
+from jsonl_writer import JsonlWriter
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+# Этапы запроса в порядке выполнения
+STAGES = ["build", "cache", "serialize", "connect", "ttfb", "download", "parse", "dispatch", "render"]
+
+_connect_times = threading.local()
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP-соединение, запоминающее время установки соединения в текущем потоке."""
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_times.value = getattr(_connect_times, "value", 0.0) + time.perf_counter() - start
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS-соединение, запоминающее время установки соединения (с TLS) в текущем потоке."""
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_times.value = getattr(_connect_times, "value", 0.0) + time.perf_counter() - start
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedAdapter(HTTPAdapter):
+    """Адаптер requests с измерением времени соединения."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+def create_timed_session():
+    """Создает сессию requests с keep-alive и измерением времени соединения."""
+    session = requests.Session()
+    adapter = _TimedAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def take_connect_time():
+    """Возвращает и сбрасывает время установки соединений в текущем потоке (сек)."""
+    value = getattr(_connect_times, "value", 0.0)
+    _connect_times.value = 0.0
+    return value
+
+class RequestTimeline:
+    """Временная шкала одного запроса к модели."""
+    def __init__(self, model_id, request_id=None):
+        self.model_id = model_id
+        self.request_id = request_id
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.stages = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.usage = {}
+        self.cached = False
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def mark(self, stage):
+        """Завершает этап, отсчитывая его длительность от предыдущей отметки."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def move(self, from_stage, to_stage, seconds):
+        """Переносит часть длительности одного этапа в другой."""
+        ms = min(seconds * 1000, self.stages.get(from_stage, 0.0))
+        self.stages[from_stage] = self.stages.get(from_stage, 0.0) - ms
+        self.stages[to_stage] = self.stages.get(to_stage, 0.0) + ms
+
+    @property
+    def total_ms(self):
+        return sum(self.stages.values())
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "model": self.model_id,
+            "started_at": self.started_at,
+            "cached": self.cached,
+            "stages_ms": {stage: round(value, 3) for stage, value in self.stages.items()},
+            "total_ms": round(self.total_ms, 3),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "usage": self.usage
+        }
+
+class MetricsRecorder:
+    """Кольцевой буфер временных шкал запросов со сводной статистикой."""
+    def __init__(self, size=None):
+        self._timelines = deque(maxlen=size or METRICS["ring_size"])
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def record(self, timeline):
+        """Добавляет завершенную временную шкалу."""
+        with self._lock:
+            self._timelines.append(timeline)
+            if METRICS["auto_export"] and self._writer is None:
+                self._writer = JsonlWriter(METRICS["dir"], "metrics")
+        if METRICS["auto_export"]:
+            self._writer.write(timeline.to_dict())
+        app_logger.debug(f"Запрос {timeline.request_id} к {timeline.model_id}: {timeline.total_ms:.1f} мс")
+
+    def timelines(self):
+        with self._lock:
+            return list(self._timelines)
+
+    def summary(self):
+        """Возвращает p50/p95 общей длительности и этапов по каждой модели."""
+        by_model = {}
+        for timeline in self.timelines():
+            by_model.setdefault(timeline.model_id, []).append(timeline)
+        summary = {}
+        for model_id, timelines in by_model.items():
+            totals = np.array([t.total_ms for t in timelines])
+            model_summary = {
+                "count": len(timelines),
+                "cached": sum(1 for t in timelines if t.cached),
+                "total_p50": float(np.percentile(totals, 50)),
+                "total_p95": float(np.percentile(totals, 95)),
+                "stages": {}
+            }
+            for stage in STAGES:
+                values = np.array([t.stages[stage] for t in timelines if stage in t.stages])
+                if len(values):
+                    model_summary["stages"][stage] = {
+                        "p50": float(np.percentile(values, 50)),
+                        "p95": float(np.percentile(values, 95))
+                    }
+            tokens = [t.usage.get("completion_tokens") for t in timelines if t.usage.get("completion_tokens")]
+            model_summary["avg_completion_tokens"] = float(np.mean(tokens)) if tokens else None
+            summary[model_id] = model_summary
+        return summary
+
+    def export(self, filepath):
+        """Экспортирует буфер временных шкал и сводку в JSON-файл."""
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump({
+                "timelines": [timeline.to_dict() for timeline in self.timelines()],
+                "summary": self.summary()
+            }, f, ensure_ascii=False, indent=2)
+
+# Общий регистратор метрик приложения
+metrics = MetricsRecorder()
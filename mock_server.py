@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+import logging
+from flask import Flask, Response, request, jsonify
+from config import VISION_MODELS
+from logging_config import configure_logging
+
+# Настраиваем логирование
+configure_logging()
+server_logger = logging.getLogger('server')
+
+app = Flask(__name__)
+
+# Behaviour of the mock server; every value can be overridden from the command line
+MOCK_SETTINGS = {
+    "latency": 0.2,  # Seconds before the first byte of every response
+    "latency_jitter": 0.05,  # Random extra latency, seconds
+    "tokens_per_second": 50.0,  # Generation speed for completions (0 disables the delay)
+    "completion_tokens": 64,  # Number of generated tokens per answer
+    "embedding_dim": 384,
+    "error_rate": 0.0,  # Share of requests answered with HTTP 500
+    "rate_limit_rate": 0.0,  # Share of requests answered with HTTP 429
+    "rate_limit_rps": 0.0,  # Requests per second before answering 429 (0 disables the limit)
+    "retry_after": 1  # Retry-After header value for 429 answers, seconds
+}
+CHAT_MODELS = ["mock/chat-small", "mock/chat-large"] + VISION_MODELS
+EMBEDDING_MODELS = ["mock/embedding-small"]
+WORDS = ["mock", "answer", "token", "latency", "benchmark", "offline", "model", "response", "stream", "load"]
+
+_rate_lock = threading.Lock()
+_rate_window = {"second": 0, "count": 0}
+
+def _sleep_latency():
+    """Waiting for the configured response latency."""
+    delay = MOCK_SETTINGS["latency"] + random.uniform(0, MOCK_SETTINGS["latency_jitter"])
+    if delay > 0:
+        time.sleep(delay)
+
+def _rate_limited():
+    """Checking the configured requests-per-second limit."""
+    if MOCK_SETTINGS["rate_limit_rps"] <= 0:
+        return False
+    second = int(time.time())
+    with _rate_lock:
+        if _rate_window["second"] != second:
+            _rate_window["second"] = second
+            _rate_window["count"] = 0
+        _rate_window["count"] += 1
+        return _rate_window["count"] > MOCK_SETTINGS["rate_limit_rps"]
+
+def _injected_error():
+    """Returning an error response according to the configured error injection, or None."""
+    if _rate_limited() or random.random() < MOCK_SETTINGS["rate_limit_rate"]:
+        server_logger.debug("Mock server answers 429")
+        response = jsonify({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(MOCK_SETTINGS["retry_after"])
+        return response
+    if random.random() < MOCK_SETTINGS["error_rate"]:
+        server_logger.debug("Mock server answers 500")
+        response = jsonify({"error": {"message": "Injected server error", "type": "server_error"}})
+        response.status_code = 500
+        return response
+    return None
+
+def _completion_tokens(messages):
+    """Generating a deterministic answer for the given messages."""
+    seed = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).digest()
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) + " " for _ in range(MOCK_SETTINGS["completion_tokens"])]
+
+def _prompt_tokens(messages):
+    """Roughly counting prompt tokens as whitespace-separated words."""
+    return sum(len(json.dumps(message.get("content", ""), ensure_ascii=False).split()) for message in messages)
+
+def _token_delay():
+    """Delay between generated tokens, seconds."""
+    rate = MOCK_SETTINGS["tokens_per_second"]
+    return 1.0 / rate if rate > 0 else 0.0
+
+@app.route("/models", methods=["GET"])
+def list_models():
+    """Listing mock chat models."""
+    return jsonify({"object": "list", "data": [{"id": model, "object": "model"} for model in CHAT_MODELS]})
+
+@app.route("/embedding-models", methods=["GET"])
+def list_embedding_models():
+    """Listing mock embedding models."""
+    return jsonify({"object": "list", "data": [{"id": model, "object": "model"} for model in EMBEDDING_MODELS]})
+
+@app.route("/chat/completions", methods=["POST"])
+def chat_completions():
+    """Answering a chat completion request, optionally as a server-sent event stream."""
+    _sleep_latency()
+    error = _injected_error()
+    if error is not None:
+        return error
+    data = request.get_json(force=True)
+    messages = data.get("messages", [])
+    tokens = _completion_tokens(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = data.get("model", CHAT_MODELS[0])
+    prompt_tokens = _prompt_tokens(messages)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens)
+    }
+    if data.get("stream"):
+        def generate():
+            for token in tokens:
+                time.sleep(_token_delay())
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+            yield f"data: {json.dumps(final_chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+        return Response(generate(), mimetype="text/event-stream")
+    time.sleep(_token_delay() * len(tokens))
+    return jsonify({
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()}, "finish_reason": "stop"}],
+        "usage": usage
+    })
+
+@app.route("/embeddings", methods=["POST"])
+def embeddings():
+    """Answering an embedding request with deterministic vectors."""
+    _sleep_latency()
+    error = _injected_error()
+    if error is not None:
+        return error
+    data = request.get_json(force=True)
+    inputs = data.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    items = []
+    for index, text in enumerate(inputs):
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        items.append({
+            "object": "embedding",
+            "index": index,
+            "embedding": [rng.uniform(-1, 1) for _ in range(MOCK_SETTINGS["embedding_dim"])]
+        })
+    prompt_tokens = sum(len(text.split()) for text in inputs)
+    return jsonify({
+        "object": "list",
+        "data": items,
+        "model": data.get("model", EMBEDDING_MODELS[0]),
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+    })
+
+def parse_args(argv=None):
+    """Parsing command line options that override MOCK_SETTINGS."""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock inference server for offline load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MOCK_SERVER_PORT", 5001)))
+    for key, value in MOCK_SETTINGS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    for key in MOCK_SETTINGS:
+        MOCK_SETTINGS[key] = getattr(args, key)
+    server_logger.info(f"Starting mock inference server on http://{args.host}:{args.port} with {MOCK_SETTINGS}")
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,156 @@
+import os
+import io
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from config import PROFILING
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+class Profiler:
+    """Профилирование всего приложения: cProfile в главном потоке и потоках Worker, tracemalloc.
+
+    Профили фоновых задач собираются в их потоках и объединяются с профилем
+    главного потока при остановке. Результаты сохраняются в PROFILING["dir"]:
+    profile_<время>.prof (pstats), profile_<время>.txt (топ функций)
+    и tracemalloc_<время>.txt (топ выделений памяти).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._main_profile = None
+        self._thread_stats = []
+        self._memory_snapshot = None
+        self._started_memory = False
+        self._started_at = None
+        self.label = None
+        self.single_turn_armed = False
+
+    @property
+    def active(self):
+        return self._main_profile is not None
+
+    def start(self, trace_memory=True, label=None):
+        """Запускает профилирование; вызывается из главного потока."""
+        with self._lock:
+            if self.active:
+                return
+            self._thread_stats = []
+            self._started_at = time.perf_counter()
+            self.label = label
+            if trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start(PROFILING["tracemalloc_frames"])
+                self._started_memory = True
+            self._memory_snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+        app_logger.info("Профилирование запущено")
+
+    def stop(self):
+        """Останавливает профилирование и сохраняет отчеты; возвращает пути к файлам."""
+        with self._lock:
+            if not self.active:
+                return []
+            profile = self._main_profile
+            profile.disable()
+            self._main_profile = None
+            thread_stats = self._thread_stats
+            self._thread_stats = []
+            memory_snapshot = self._memory_snapshot
+            current_snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            traced_memory = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+            if self._started_memory:
+                tracemalloc.stop()
+                self._started_memory = False
+        elapsed = time.perf_counter() - self._started_at
+        os.makedirs(PROFILING["dir"], exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = f"{timestamp}_{self.label}" if self.label else timestamp
+        stats = pstats.Stats(profile)
+        for item in thread_stats:
+            stats.add(item)
+        paths = [
+            os.path.join(PROFILING["dir"], f"profile_{suffix}.prof"),
+            os.path.join(PROFILING["dir"], f"profile_{suffix}.txt")
+        ]
+        stats.dump_stats(paths[0])
+        with open(paths[1], "w", encoding="utf-8") as f:
+            f.write(f"Длительность: {elapsed:.3f} с, профилей фоновых задач: {len(thread_stats)}\n\n")
+            f.write(self._format_stats(stats, "cumulative"))
+            f.write(self._format_stats(stats, "tottime"))
+        if current_snapshot is not None:
+            paths.append(os.path.join(PROFILING["dir"], f"tracemalloc_{suffix}.txt"))
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                f.write(self._format_memory(current_snapshot, memory_snapshot, traced_memory))
+        app_logger.info(f"Профилирование остановлено, отчеты сохранены: {', '.join(paths)}")
+        return paths
+
+    def arm_single_turn(self):
+        """Включает профилирование только следующего запроса к модели."""
+        self.single_turn_armed = True
+
+    def take_single_turn(self):
+        """Возвращает True и снимает флаг, если следующий запрос нужно профилировать."""
+        armed = self.single_turn_armed and not self.active
+        self.single_turn_armed = False
+        return armed
+
+    @contextmanager
+    def thread_profile(self):
+        """Профилирует фоновую задачу в текущем потоке, если профилирование запущено."""
+        if not self.active:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # С Python 3.12 одновременно может работать только один cProfile
+            app_logger.debug("Профилирование фонового потока недоступно")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if self.active:
+                    self._thread_stats.append(pstats.Stats(profile))
+
+    def _format_stats(self, stats, sort_key):
+        """Форматирует топ функций по заданной сортировке."""
+        stream = io.StringIO()
+        stats.stream = stream
+        stream.write(f"=== Топ-{PROFILING['top_n']} по {sort_key}\n")
+        stats.sort_stats(sort_key).print_stats(PROFILING["top_n"])
+        return stream.getvalue() + "\n"
+
+    def _format_memory(self, snapshot, start_snapshot, traced_memory):
+        """Форматирует топ выделений памяти и прирост с момента запуска."""
+        top_n = PROFILING["top_n"]
+        # Исключаем выделения самих профилировщиков
+        filters = [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)]
+        snapshot = snapshot.filter_traces(filters)
+        if start_snapshot is not None:
+            start_snapshot = start_snapshot.filter_traces(filters)
+        lines = [f"=== Топ-{top_n} выделений памяти по строкам"]
+        for stat in snapshot.statistics("lineno")[:top_n]:
+            lines.append(str(stat))
+        if start_snapshot is not None:
+            lines.append("")
+            lines.append(f"=== Топ-{top_n} прироста памяти с момента запуска")
+            for stat in snapshot.compare_to(start_snapshot, "lineno")[:top_n]:
+                lines.append(str(stat))
+        current, peak = traced_memory
+        if peak:
+            lines.append("")
+            lines.append(f"Текущий объем: {current / 1024 / 1024:.1f} МБ, пик: {peak / 1024 / 1024:.1f} МБ")
+        return "\n".join(lines) + "\n"
+
+# Общий профилировщик приложения
+profiler = Profiler()
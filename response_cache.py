@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from config import RESPONSE_CACHE
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+INDEX_FILE_NAME = "index.json"
+
+def make_cache_key(model_id, messages, temperature, max_tokens, seed):
+    """Вычисляет отпечаток запроса для кэша ответов."""
+    fingerprint = json.dumps({
+        "model": model_id,
+        "messages": messages,
+        "temperature": temperature,
+        "max_completion_tokens": max_tokens,
+        "seed": seed
+    }, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Дисковый LRU-кэш ответов API с ограничением по времени жизни и размеру.
+
+    Порядок обращений из get() сохраняется в индекс при следующей записи
+    (put) или при закрытии приложения (save), а не на каждом попадании.
+    """
+    def __init__(self, directory=None, ttl=None, max_entries=None):
+        self.directory = directory or RESPONSE_CACHE["dir"]
+        self.ttl = ttl if ttl is not None else RESPONSE_CACHE["ttl"]
+        self.max_entries = max_entries if max_entries is not None else RESPONSE_CACHE["max_entries"]
+        self._lock = threading.Lock()
+        # key -> время создания записи; порядок соответствует последнему обращению
+        self._index = OrderedDict()
+        # Индекс в памяти изменился после последнего сохранения
+        self._dirty = False
+        self._load_index()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE_NAME)
+
+    def _load_index(self):
+        """Загружает индекс кэша с диска."""
+        try:
+            if os.path.exists(self._index_path()):
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+                for key, created in entries:
+                    if os.path.exists(self._entry_path(key)):
+                        self._index[key] = created
+        except Exception as e:
+            app_logger.error(f"Ошибка загрузки индекса кэша ответов: {str(e)}")
+            self._index.clear()
+
+    def _save_index(self):
+        """Сохраняет индекс кэша на диск."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._index.items()), f)
+        os.replace(tmp_path, self._index_path())
+        self._dirty = False
+
+    def save(self):
+        """Сохраняет индекс кэша на диск, если он изменился."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self._save_index()
+            except Exception as e:
+                app_logger.error(f"Ошибка сохранения индекса кэша ответов: {str(e)}")
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        self._dirty = True
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def get(self, key):
+        """Возвращает закэшированный ответ или None."""
+        with self._lock:
+            created = self._index.get(key)
+            if created is None:
+                return None
+            if self.ttl and time.time() - created > self.ttl:
+                # Индекс без удаленного файла загружается корректно, сохранение откладывается
+                self._remove(key)
+                return None
+            try:
+                with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                    response = json.load(f)
+            except Exception as e:
+                app_logger.error(f"Ошибка чтения записи кэша ответов {key}: {str(e)}")
+                self._remove(key)
+                return None
+            self._index.move_to_end(key)
+            self._dirty = True
+            return response
+
+    def put(self, key, response):
+        """Сохраняет ответ в кэш, вытесняя самые давние записи; ошибка записи не прерывает запрос."""
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._entry_path(key), "w", encoding="utf-8") as f:
+                    json.dump(response, f, ensure_ascii=False)
+                self._index[key] = time.time()
+                self._index.move_to_end(key)
+                while len(self._index) > self.max_entries:
+                    oldest_key = next(iter(self._index))
+                    self._remove(oldest_key)
+                self._save_index()
+            except Exception as e:
+                app_logger.error(f"Ошибка записи в кэш ответов {key}: {str(e)}")
+
+    def clear(self):
+        """Удаляет все записи кэша."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
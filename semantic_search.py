@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+import numpy as np
+from config import SEMANTIC_SEARCH
+from embeddings import embed_texts
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _message_text(msg):
+    """Возвращает текст сообщения для индексации."""
+    content = msg.get("content", "")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return content[:SEMANTIC_SEARCH["max_text_chars"]]
+
+def _message_key(msg):
+    """Вычисляет ключ сообщения по роли, времени и содержимому."""
+    timestamp = msg.get("timestamp", "")
+    if not isinstance(timestamp, str):
+        timestamp = str(timestamp)
+    content = msg.get("content", "")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    raw = f"{msg.get('role', '')}\x00{timestamp}\x00{content}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+class SemanticIndex:
+    """Инкрементальный индекс сообщений чата для семантического поиска.
+
+    Нормализованные векторы дописываются в vectors.f32, метаданные
+    сообщений — в messages.jsonl; строка матрицы соответствует строке файла.
+    В source.json хранится подпись (время изменения и размер) файла истории
+    на момент последнего обновления: пока файл не изменился, он не перечитывается.
+    """
+    def __init__(self, model_id, directory=None):
+        self.model_id = model_id
+        self.path = os.path.join(
+            directory or SEMANTIC_SEARCH["dir"],
+            hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        )
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._messages = []
+        self._keys = set()
+        # Размер начала messages.jsonl в байтах, занятого записями индекса
+        self._messages_size = 0
+        self.source_signature = None
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        """Загружает индекс с диска."""
+        try:
+            if os.path.exists(self._file("source.json")):
+                with open(self._file("source.json"), "r", encoding="utf-8") as f:
+                    self.source_signature = json.load(f).get("history")
+            messages = []
+            # Смещение конца каждой записи: по нему файл обрезается до числа записей с векторами
+            ends = []
+            if os.path.exists(self._file("messages.jsonl")):
+                with open(self._file("messages.jsonl"), "rb") as f:
+                    offset = 0
+                    for line in f:
+                        offset += len(line)
+                        if not line.strip():
+                            continue
+                        try:
+                            messages.append(json.loads(line))
+                        except ValueError:
+                            # Последняя запись дописана не полностью
+                            break
+                        ends.append(offset)
+            count = 0
+            if messages and os.path.exists(self._file("vectors.f32")):
+                count = min(len(messages), os.path.getsize(self._file("vectors.f32")) // (4 * messages[0]["dim"]))
+            self._messages = messages[:count]
+            self._messages_size = ends[count - 1] if count else 0
+            self._keys = {msg["key"] for msg in self._messages}
+            self._truncate()
+            if self._messages:
+                self._map(self._messages[0]["dim"])
+            app_logger.debug(f"Семантический индекс {self.model_id}: {len(self._messages)} сообщений")
+        except Exception as e:
+            app_logger.error(f"Ошибка загрузки семантического индекса {self.model_id}: {str(e)}")
+            self._vectors = None
+            self._messages = []
+            self._keys = set()
+            self._messages_size = 0
+            self.source_signature = None
+
+    def _truncate(self):
+        """Обрезает vectors.f32 и messages.jsonl до числа сообщений индекса.
+
+        После прерванного обновления в одном из файлов остаются строки без пары;
+        записи, дописанные после них, сопоставили бы сообщениям чужие векторы.
+        """
+        dim = self._messages[0]["dim"] if self._messages else 0
+        for name, size in (("vectors.f32", len(self._messages) * dim * 4), ("messages.jsonl", self._messages_size)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+                app_logger.warning(f"Семантический индекс {self.model_id}: {name} обрезан до {len(self._messages)} сообщений")
+
+    def set_source_signature(self, signature):
+        """Запоминает подпись файла истории, по которому индекс обновлен."""
+        with self._lock:
+            self.source_signature = signature
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                with open(self._file("source.json"), "w", encoding="utf-8") as f:
+                    json.dump({"history": signature}, f)
+            except Exception as e:
+                app_logger.error(f"Ошибка сохранения состояния семантического индекса {self.model_id}: {str(e)}")
+
+    def _map(self, dim):
+        """Отображает матрицу векторов в память."""
+        self._vectors = None
+        if self._messages:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self._messages), dim))
+
+    def update(self, history, api_settings, api_key):
+        """Добавляет в индекс сообщения, которых в нем еще нет.
+
+        Returns:
+            int: Количество добавленных сообщений.
+        """
+        new_messages = []
+        with self._lock:
+            seen = set(self._keys)
+            for msg in history:
+                text = _message_text(msg)
+                if not text.strip():
+                    continue
+                key = _message_key(msg)
+                if key in seen:
+                    continue
+                seen.add(key)
+                new_messages.append((key, msg, text))
+        if not new_messages:
+            return 0
+        vectors = embed_texts(self.model_id, [text for _, _, text in new_messages], api_settings, api_key)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32)
+        records = []
+        for key, msg, text in new_messages:
+            timestamp = msg.get("timestamp", "")
+            records.append({
+                "key": key,
+                "dim": int(vectors.shape[1]),
+                "role": msg.get("role", ""),
+                "timestamp": timestamp if isinstance(timestamp, str) else str(timestamp),
+                "text": text
+            })
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] != vectors.shape[1]:
+                raise ValueError("Размерность эмбеддингов не совпадает с индексом")
+            # Пока векторы запрашивались без блокировки, те же сообщения мог добавить другой поток
+            fresh = [i for i, record in enumerate(records) if record["key"] not in self._keys]
+            if not fresh:
+                return 0
+            vectors = vectors[fresh]
+            records = [records[i] for i in fresh]
+            os.makedirs(self.path, exist_ok=True)
+            self._truncate()
+            data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("messages.jsonl"), "ab") as f:
+                f.write(data)
+            self._messages_size += len(data)
+            self._messages.extend(records)
+            self._keys.update(record["key"] for record in records)
+            self._map(vectors.shape[1])
+        app_logger.info(f"Семантический индекс {self.model_id}: добавлено {len(records)} сообщений")
+        return len(records)
+
+    def search(self, query_vector, top_k=None):
+        """Ищет сообщения, наиболее близкие к запросу по косинусной мере.
+
+        Returns:
+            list: Список пар (сходство, метаданные сообщения) по убыванию сходства.
+        """
+        top_k = top_k or SEMANTIC_SEARCH["top_k"]
+        with self._lock:
+            vectors = self._vectors
+            messages = self._messages
+        if vectors is None or not len(vectors):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = vectors @ query
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(scores, -top_k)[-top_k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [(float(scores[i]), messages[i]) for i in best]
+
+    def __len__(self):
+        return len(self._messages)
+
+def get_semantic_index(model_id):
+    """Возвращает общий экземпляр семантического индекса для модели."""
+    with _indexes_lock:
+        if model_id not in _indexes:
+            _indexes[model_id] = SemanticIndex(model_id)
+        return _indexes[model_id]
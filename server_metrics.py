@@ -0,0 +1,103 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class ServerMetrics:
+    """Collecting request counters and latency histograms for the local server."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._bytes_in = defaultdict(int)
+        self._bytes_out = defaultdict(int)
+        self._latency_counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._latency_sum = defaultdict(float)
+
+    def observe(self, route, method, status, seconds, bytes_in, bytes_out):
+        """Recording a finished request."""
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._requests[(route, method, status)] += 1
+            if status >= 400:
+                self._errors[route] += 1
+            self._bytes_in[route] += bytes_in
+            self._bytes_out[route] += bytes_out
+            self._latency_counts[route][bucket] += 1
+            self._latency_sum[route] += seconds
+
+    def render(self, upload_folder):
+        """Rendering all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            requests = dict(self._requests)
+            errors = dict(self._errors)
+            bytes_in = dict(self._bytes_in)
+            bytes_out = dict(self._bytes_out)
+            latency_counts = {route: list(counts) for route, counts in self._latency_counts.items()}
+            latency_sum = dict(self._latency_sum)
+        lines = [
+            "# HELP local_server_requests_total Total number of handled requests.",
+            "# TYPE local_server_requests_total counter"
+        ]
+        for (route, method, status), value in sorted(requests.items()):
+            lines.append(f'local_server_requests_total{{route="{route}",method="{method}",status="{status}"}} {value}')
+        lines += [
+            "# HELP local_server_request_errors_total Requests answered with a 4xx or 5xx status.",
+            "# TYPE local_server_request_errors_total counter"
+        ]
+        for route, value in sorted(errors.items()):
+            lines.append(f'local_server_request_errors_total{{route="{route}"}} {value}')
+        lines += [
+            "# HELP local_server_request_duration_seconds Request latency.",
+            "# TYPE local_server_request_duration_seconds histogram"
+        ]
+        for route, counts in sorted(latency_counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'local_server_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'local_server_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {cumulative}')
+            lines.append(f'local_server_request_duration_seconds_sum{{route="{route}"}} {latency_sum[route]:.6f}')
+            lines.append(f'local_server_request_duration_seconds_count{{route="{route}"}} {cumulative}')
+        lines += [
+            "# HELP local_server_received_bytes_total Request body bytes received.",
+            "# TYPE local_server_received_bytes_total counter"
+        ]
+        for route, value in sorted(bytes_in.items()):
+            lines.append(f'local_server_received_bytes_total{{route="{route}"}} {value}')
+        lines += [
+            "# HELP local_server_sent_bytes_total Response body bytes sent.",
+            "# TYPE local_server_sent_bytes_total counter"
+        ]
+        for route, value in sorted(bytes_out.items()):
+            lines.append(f'local_server_sent_bytes_total{{route="{route}"}} {value}')
+        file_count, total_size = _folder_usage(upload_folder)
+        lines += [
+            "# HELP local_server_uploads_files Number of files in the uploads folder.",
+            "# TYPE local_server_uploads_files gauge",
+            f"local_server_uploads_files {file_count}",
+            "# HELP local_server_uploads_bytes Total size of the uploads folder.",
+            "# TYPE local_server_uploads_bytes gauge",
+            f"local_server_uploads_bytes {total_size}"
+        ]
+        return "\n".join(lines) + "\n"
+
+def _folder_usage(folder):
+    """Counting files and their total size in a folder."""
+    file_count = 0
+    total_size = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file_count += 1
+                    total_size += entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return file_count, total_size
@@ -0,0 +1,124 @@
+import sys
+import time
+import threading
+import traceback
+import logging
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from PyQt6.QtCore import QObject, QTimer
+from config import STALL_DETECTION
+from jsonl_writer import JsonlWriter
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+# Верхние границы корзин гистограммы длительности зависаний, мс
+STALL_BUCKETS = (250, 500, 1000, 2500, 5000, 10000)
+
+class StallDetector(QObject):
+    """Обнаружение зависаний цикла событий Qt со снятием стека главного потока.
+
+    Таймер в главном потоке отмечает пульс каждые interval_ms. Сторожевой поток
+    проверяет, как давно был пульс, и пока цикл событий не отвечает дольше
+    threshold_ms, снимает стек главного потока (не чаще sample_ms). Следующий
+    пульс завершает зависание: событие с длительностью и стеками пишется
+    в JSONL-журнал и учитывается в гистограмме.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.interval = STALL_DETECTION["interval_ms"] / 1000
+        self.threshold = STALL_DETECTION["threshold_ms"] / 1000
+        self.sample_interval = STALL_DETECTION["sample_ms"] / 1000
+        self._main_thread_id = threading.main_thread().ident
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._samples = []
+        self._stop_event = threading.Event()
+        self._watchdog = None
+        self._writer = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(STALL_DETECTION["interval_ms"])
+        self._timer.timeout.connect(self._beat)
+        self.events = deque(maxlen=100)
+        self.histogram = [0] * (len(STALL_BUCKETS) + 1)
+
+    def start(self):
+        """Запускает пульс и сторожевой поток."""
+        if self._watchdog is not None:
+            return
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._writer = JsonlWriter(STALL_DETECTION["dir"], "stalls")
+        self._timer.start()
+        self._watchdog = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._watchdog.start()
+        app_logger.debug("Детектор зависаний интерфейса запущен")
+
+    def stop(self):
+        """Останавливает пульс и сторожевой поток."""
+        self._timer.stop()
+        self._stop_event.set()
+        if self._watchdog is not None:
+            self._watchdog.join(1.0)
+            self._watchdog = None
+
+    def _beat(self):
+        """Отмечает пульс цикла событий и завершает зависание, если оно было."""
+        now = time.monotonic()
+        with self._lock:
+            gap = now - self._last_beat - self.interval
+            self._last_beat = now
+            samples = self._samples
+            self._samples = []
+        if gap >= self.threshold:
+            self._record(gap, samples)
+
+    def _watch(self):
+        """Проверяет пульс и снимает стек главного потока во время зависания."""
+        check_interval = min(self.threshold / 4, 0.05)
+        while not self._stop_event.wait(check_interval):
+            now = time.monotonic()
+            with self._lock:
+                stalled_for = now - self._last_beat - self.interval
+                if stalled_for < self.threshold or len(self._samples) >= STALL_DETECTION["max_samples"]:
+                    continue
+                if self._samples and stalled_for - self._samples[-1]["at_ms"] / 1000 < self.sample_interval:
+                    continue
+                stack = self._capture_main_stack()
+                if stack:
+                    self._samples.append({"at_ms": round(stalled_for * 1000, 1), "stack": stack})
+
+    def _capture_main_stack(self):
+        """Возвращает стек главного потока в виде списка строк «файл:строка функция»."""
+        frame = sys._current_frames().get(self._main_thread_id)
+        if frame is None:
+            return []
+        return [
+            f"{entry.filename}:{entry.lineno} {entry.name}"
+            for entry in traceback.extract_stack(frame, limit=STALL_DETECTION["stack_depth"])
+        ]
+
+    def _record(self, duration, samples):
+        """Записывает событие зависания."""
+        duration_ms = duration * 1000
+        self.histogram[bisect_left(STALL_BUCKETS, duration_ms)] += 1
+        event = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 1),
+            "location": samples[0]["stack"][-1] if samples else None,
+            "samples": samples
+        }
+        self.events.append(event)
+        self._writer.write(event)
+        app_logger.warning(f"Интерфейс не отвечал {duration_ms:.0f} мс: {event['location'] or 'стек не снят'}")
+
+    def histogram_labels(self):
+        """Возвращает подписи корзин гистограммы."""
+        labels = []
+        lower = STALL_DETECTION["threshold_ms"]
+        for upper in STALL_BUCKETS:
+            labels.append(f"{lower}–{upper} мс")
+            lower = upper
+        labels.append(f"> {lower} мс")
+        return labels
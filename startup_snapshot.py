@@ -0,0 +1,91 @@
+import os
+import json
+import base64
+import logging
+from datetime import datetime
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QPixmap
+from config import STARTUP_SNAPSHOT, DATE_FORMAT
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+SNAPSHOT_VERSION = 1
+
+def snapshot_key(msg):
+    """Возвращает ключ сообщения для сравнения снимка с историей на диске."""
+    timestamp = msg.get("timestamp", "")
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime(DATE_FORMAT)
+    return [msg.get("role"), timestamp, msg.get("content")]
+
+def _encode_pixmap(pixmap):
+    """Кодирует миниатюру в PNG (base64)."""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    pixmap.save(buffer, "PNG")
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+def decode_pixmap(data):
+    """Восстанавливает миниатюру из PNG (base64)."""
+    pixmap = QPixmap()
+    if not pixmap.loadFromData(base64.b64decode(data), "PNG"):
+        return None
+    return pixmap
+
+def save_snapshot(app):
+    """Сохраняет снимок окна: последнюю страницу сообщений с высотами и миниатюрами, список моделей и выбранную модель."""
+    if not STARTUP_SNAPSHOT["enabled"]:
+        return
+    try:
+        rows = app.chat_area.entries()
+        page = list(app.chat_history)[-STARTUP_SNAPSHOT["messages"]:]
+        messages = []
+        for msg in page:
+            entry = {"role": msg.get("role"), "content": msg.get("content"), "timestamp": snapshot_key(msg)[1]}
+            if isinstance(msg.get("image"), str):
+                entry["image"] = msg["image"]
+            # Сообщение истории сопоставляется с последней строкой ленты с тем же текстом и ролью;
+            # состояние строки без виджета сохранено в ней при удалении виджета
+            row = next((r for r in reversed(rows) if r["content"] == msg.get("content") and r["role"] == msg.get("role")), None)
+            if row is not None:
+                state = row["widget"].state() if row.get("widget") is not None else row
+                if state.get("content_height"):
+                    entry["content_height"] = state["content_height"]
+                if state.get("measurement"):
+                    entry["measurement"] = state["measurement"]
+                if state.get("thumbnail") is not None:
+                    entry["thumbnail"] = _encode_pixmap(state["thumbnail"])
+            messages.append(entry)
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "models": [app.model_combobox.itemText(i) for i in range(app.model_combobox.count())],
+            "selected_model": app.model_combobox.currentText(),
+            "has_more": not app.load_more_button.isHidden(),
+            "messages": messages
+        }
+        filepath = STARTUP_SNAPSHOT["file"]
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, filepath)
+        app_logger.debug(f"Снимок запуска сохранен: {len(messages)} сообщений, {len(snapshot['models'])} моделей")
+    except Exception as e:
+        app_logger.error(f"Ошибка сохранения снимка запуска: {str(e)}")
+
+def load_snapshot():
+    """Читает снимок последнего сеанса; возвращает None, если его нет или он устарел."""
+    filepath = STARTUP_SNAPSHOT["file"]
+    if not STARTUP_SNAPSHOT["enabled"] or not os.path.exists(filepath):
+        return None
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+    except Exception as e:
+        app_logger.error(f"Ошибка загрузки снимка запуска: {str(e)}")
+        return None
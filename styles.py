@@ -0,0 +1,143 @@
+import logging
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QPalette, QColor
+from config import COLORS, THEMES
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+def set_theme(theme, font_family=None, font_size=None):
+    """Переключает COLORS на тему и шрифт.
+
+    Словарь изменяется на месте, поэтому новые цвета сразу видят все модули,
+    импортировавшие COLORS из config. Шрифт по умолчанию сохраняется текущий.
+    """
+    font_family = font_family or COLORS["font_family"]
+    font_size = font_size or COLORS["font_size"]
+    COLORS.clear()
+    COLORS.update(THEMES[theme])
+    COLORS["font_family"] = font_family
+    COLORS["font_size"] = font_size
+
+def build_stylesheet(colors=COLORS):
+    """Собирает общую таблицу стилей приложения для текущей темы."""
+    return f"""
+        QMainWindow, QDialog, QWidget#centralWidget {{
+            background-color: {colors['background']};
+        }}
+        QLabel, QRadioButton {{
+            color: {colors['text']};
+            background-color: transparent;
+        }}
+        QPushButton, QComboBox, QLineEdit, QTextEdit, QSpinBox, QListWidget, QTableWidget {{
+            background-color: {colors['widget_background']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+        }}
+        QMenu {{
+            background-color: {colors['widget_background']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+        }}
+        QMenu::item:selected {{
+            background-color: {colors['selection']};
+        }}
+        QTextEdit[invalid="true"] {{
+            border: 2px solid {colors['error']};
+        }}
+        QWidget#chatMessage, QLabel#messageMeta {{
+            background-color: {colors['background']};
+        }}
+        QWidget#chatMessage[selected="true"] {{
+            background-color: {colors['selection']};
+        }}
+        QWidget#messageBubble, QWidget#messageBubble QLabel {{
+            background-color: {colors['widget_background']};
+            border: 1px solid {colors['border']};
+            padding: 10px;
+        }}
+        QWidget#messageBubble[role="user"], QWidget#messageBubble[role="user"] QLabel {{
+            background-color: {colors['user_message_background']};
+        }}
+        QTextEdit#messageText {{
+            background-color: {colors['widget_background']};
+            color: {colors['text']};
+            border: none;
+            padding: 2px;
+            selection-background-color: #0078d7;
+            selection-color: #ffffff;
+        }}
+        QTextEdit#messageText[role="user"] {{
+            background-color: {colors['user_message_background']};
+        }}
+        QTextEdit#messageText[selected="true"] {{
+            background-color: {colors['selection']};
+        }}
+        QListView#chatHistoryView, QListView#chatArea {{
+            background-color: {colors['background']};
+            border: 1px solid {colors['border']};
+        }}
+        QScrollBar:vertical {{
+            border: none;
+            background: {colors['widget_background']};
+            width: 10px;
+            margin: 0px 0px 0px 0px;
+        }}
+        QScrollBar::handle:vertical {{
+            background: {colors['border']};
+            min-height: 20px;
+            border-radius: 5px;
+        }}
+        QScrollBar::add-line:vertical {{
+            background: {colors['widget_background']};
+            height: 0px;
+            subcontrol-position: bottom;
+            subcontrol-origin: margin;
+        }}
+        QScrollBar::sub-line:vertical {{
+            background: {colors['widget_background']};
+            height: 0px;
+            subcontrol-position: top;
+            subcontrol-origin: margin;
+        }}
+        QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
+            background: none;
+        }}
+    """
+
+def set_style_property(widget, name, value):
+    """Меняет динамическое свойство, от которого зависит стиль, и обновляет вид виджета.
+
+    Стиль берется из уже разобранной таблицы стилей приложения, поэтому
+    переключение дешевле замены таблицы стилей виджета.
+    """
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+    widget.update()
+
+def build_palette(colors=COLORS):
+    """Собирает палитру для элементов, не покрытых таблицей стилей (подсказки, диалоги выбора файлов)."""
+    palette = QPalette()
+    palette.setColor(QPalette.ColorRole.Window, QColor(colors['background']))
+    palette.setColor(QPalette.ColorRole.WindowText, QColor(colors['text']))
+    palette.setColor(QPalette.ColorRole.Base, QColor(colors['widget_background']))
+    palette.setColor(QPalette.ColorRole.AlternateBase, QColor(colors['background']))
+    palette.setColor(QPalette.ColorRole.Text, QColor(colors['text']))
+    palette.setColor(QPalette.ColorRole.Button, QColor(colors['widget_background']))
+    palette.setColor(QPalette.ColorRole.ButtonText, QColor(colors['text']))
+    palette.setColor(QPalette.ColorRole.ToolTipBase, QColor(colors['widget_background']))
+    palette.setColor(QPalette.ColorRole.ToolTipText, QColor(colors['text']))
+    palette.setColor(QPalette.ColorRole.Highlight, QColor(colors['selection']))
+    palette.setColor(QPalette.ColorRole.PlaceholderText, QColor(colors['border']))
+    return palette
+
+def apply_app_style(qt_app=None):
+    """Применяет таблицу стилей и палитру текущей темы ко всему приложению."""
+    qt_app = qt_app or QApplication.instance()
+    qt_app.setPalette(build_palette())
+    qt_app.setStyleSheet(build_stylesheet())
+    app_logger.debug("Стиль приложения применен")
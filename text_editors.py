@@ -1,135 +1,371 @@
-from PyQt6.QtWidgets import QTextEdit, QCompleter
-from PyQt6.QtCore import Qt, QTimer, QStringListModel
-from PyQt6.QtGui import QTextCharFormat, QSyntaxHighlighter, QFont
-import re
-from config import COLORS, HIGHLIGHT_RULES, LOGGING
-import logging
-from logging_config import configure_logging
-configure_logging()
-
-# Логгер уже настроен в logging_config.py
-logger = logging.getLogger('app')
-
-class NonScrollableTextEdit(QTextEdit):
-    """Класс текстового редактора без прокрутки, если скроллбар не виден."""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-
-    def wheelEvent(self, event):
-        """Обрабатывает событие прокрутки колеса мыши."""
-        if self.verticalScrollBar().isVisible():
-            super().wheelEvent(event)
-
-    def mouseMoveEvent(self, event):
-        """Обрабатывает событие перемещения мыши."""
-        super().mouseMoveEvent(event)
-
-    def mouseReleaseEvent(self, event):
-        """Обрабатывает событие отпускания кнопки мыши."""
-        super().mouseReleaseEvent(event)
-
-class EnterKeyTextEdit(QTextEdit):
-    """Класс текстового редактора с автодополнением и обработкой клавиши Enter."""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.parent = parent
-        self.completer = QCompleter(self)
-        self.completer.setWidget(self)
-        self.completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
-        self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-        self.model = QStringListModel()
-        self.completer.setModel(self.model)
-        self.completer.activated.connect(self.insert_completion)
-        self.textChanged.connect(self.update_completions)
-        self.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
-
-    def update_completions(self):
-        """Обновляет список автодополнений на основе истории чата."""
-        if not hasattr(self.parent, 'chat_history'):
-            return
-        completions = set()
-        for msg in self.parent.chat_history:
-            if msg.get("role") == "user":
-                words = msg.get("content", "").split()
-                completions.update(words)
-        self.model.setStringList(list(completions))
-
-    def insert_completion(self, completion):
-        """Вставляет выбранное автодополнение в текст."""
-        cursor = self.textCursor()
-        cursor.select(cursor.SelectionType.WordUnderCursor)
-        cursor.insertText(completion)
-        self.setTextCursor(cursor)
-
-    def keyPressEvent(self, event):
-        if event.key() == Qt.Key.Key_Return and not event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
-            text = self.toPlainText()
-            logger.debug(f"Введенный текст: '{text}' (после strip: '{text.strip()}')")
-            if text:  # Проверяем наличие любого текста
-                if hasattr(self.parent, 'send_request'):
-                    logger.debug("Вызов send_request")
-                    self.parent.send_request()
-            else:
-                logger.debug("Текст пустой, send_request не вызывается")
-                self.setStyleSheet(f"background-color: {COLORS['widget_background']}; border: 2px solid {COLORS['error']}; color: {COLORS['text']};")
-                QTimer.singleShot(1000, lambda: self.setStyleSheet(f"background-color: {COLORS['widget_background']}; border: 1px solid {COLORS['border']}; color: {COLORS['text']};"))
-            event.accept()
-        elif event.key() == Qt.Key.Key_Space and event.modifiers() & Qt.KeyboardModifier.ControlModifier:
-            cursor = self.textCursor()
-            cursor.select(cursor.SelectionType.WordUnderCursor)
-            self.completer.setCompletionPrefix(cursor.selectedText())
-            popup = self.completer.popup()
-            popup.setCurrentIndex(self.completer.currentIndex())
-            cr = self.cursorRect()
-            cr.setWidth(popup.sizeHint().width())
-            popup.setGeometry(cr)
-            popup.show()
-            event.accept()
-        else:
-            super().keyPressEvent(event)
-
-class SyntaxHighlighter(QSyntaxHighlighter):
-    """Класс для подсветки синтаксиса текста в редакторе."""
-    def __init__(self, document, app):
-        super().__init__(document)
-        self.app = app
-        self.highlighting_rules = []
-        self.update_colors()
-
-    def update_colors(self):
-        """Обновляет правила подсветки синтаксиса в зависимости от темы."""
-        self.highlighting_rules.clear()
-        if self.app.current_theme == "dark":
-            keyword_format = QTextCharFormat()
-            keyword_format.setForeground(Qt.GlobalColor.cyan)
-            string_format = QTextCharFormat()
-            string_format.setForeground(Qt.GlobalColor.green)
-            comment_format = QTextCharFormat()
-            comment_format.setForeground(Qt.GlobalColor.gray)
-            number_format = QTextCharFormat()
-            number_format.setForeground(Qt.GlobalColor.magenta)
-        else:
-            keyword_format = QTextCharFormat()
-            keyword_format.setForeground(Qt.GlobalColor.darkBlue)
-            string_format = QTextCharFormat()
-            string_format.setForeground(Qt.GlobalColor.darkGreen)
-            comment_format = QTextCharFormat()
-            comment_format.setForeground(Qt.GlobalColor.darkGray)
-            number_format = QTextCharFormat()
-            number_format.setForeground(Qt.GlobalColor.darkMagenta)
-        self.highlighting_rules.append((HIGHLIGHT_RULES["keywords"], keyword_format))
-        self.highlighting_rules.append((HIGHLIGHT_RULES["strings"], string_format))
-        self.highlighting_rules.append((HIGHLIGHT_RULES["comments"], comment_format))
-        self.highlighting_rules.append((HIGHLIGHT_RULES["numbers"], number_format))
-
-    def highlightBlock(self, text):
-        """Применяет правила подсветки к блоку текста."""
-        for pattern, format_ in self.highlighting_rules:
-            for match in re.finditer(pattern, text):
-                self.setFormat(match.start(), match.end() - match.start(), format_)
-
-    def rehighlight(self):
-        """Перезапускает подсветку синтаксиса."""
-        self.update_colors()
-        super().rehighlight()
\ No newline at end of file
+from PyQt6.QtWidgets import QTextEdit, QCompleter
+from PyQt6.QtCore import Qt, QTimer, QStringListModel
+from PyQt6.QtGui import QTextCharFormat, QSyntaxHighlighter, QFont, QColor
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from itertools import islice
+from pygments.lexers import get_lexer_by_name, guess_lexer
+from pygments.token import Token
+from pygments.util import ClassNotFound
+from config import COLORS, HIGHLIGHT_STYLES, HIGHLIGHT_SETTINGS, LOGGING
+from worker import Worker
+from styles import set_style_property
+import logging
+from logging_config import configure_logging
+configure_logging()
+
+# Логгер уже настроен в logging_config.py
+logger = logging.getLogger('app')
+
+class NonScrollableTextEdit(QTextEdit):
+    """Класс текстового редактора без прокрутки, если скроллбар не виден."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+
+    def wheelEvent(self, event):
+        """Обрабатывает событие прокрутки колеса мыши."""
+        if self.verticalScrollBar().isVisible():
+            super().wheelEvent(event)
+
+    def mouseMoveEvent(self, event):
+        """Обрабатывает событие перемещения мыши."""
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        """Обрабатывает событие отпускания кнопки мыши."""
+        super().mouseReleaseEvent(event)
+
+# Незавершенное слово перед курсором
+WORD_PREFIX_PATTERN = re.compile(r"\w[\w-]*$")
+
+class EnterKeyTextEdit(QTextEdit):
+    """Класс текстового редактора с автодополнением и обработкой клавиши Enter."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.completer = QCompleter(self)
+        self.completer.setWidget(self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.model = QStringListModel()
+        self.completer.setModel(self.model)
+        self.completer.activated.connect(self.insert_completion)
+        self._completion_prefix = None
+        self.textChanged.connect(self.update_completions)
+        self.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
+
+    def update_completions(self):
+        """Обновляет список автодополнений по префиксу слова перед курсором."""
+        index = getattr(self.parent, 'completion_index', None)
+        if index is None:
+            return
+        cursor = self.textCursor()
+        text_before = cursor.block().text()[:cursor.positionInBlock()]
+        match = WORD_PREFIX_PATTERN.search(text_before)
+        prefix = match.group(0) if match else ""
+        if prefix == self._completion_prefix:
+            return
+        self._completion_prefix = prefix
+        self.model.setStringList(index.complete(prefix))
+        self.completer.setCompletionPrefix(prefix)
+
+    def insert_completion(self, completion):
+        """Вставляет выбранное автодополнение в текст."""
+        cursor = self.textCursor()
+        cursor.select(cursor.SelectionType.WordUnderCursor)
+        cursor.insertText(completion)
+        self.setTextCursor(cursor)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_Return and not event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+            text = self.toPlainText()
+            logger.debug(f"Введенный текст: '{text}' (после strip: '{text.strip()}')")
+            if text:  # Проверяем наличие любого текста
+                if hasattr(self.parent, 'send_request'):
+                    logger.debug("Вызов send_request")
+                    self.parent.send_request()
+            else:
+                logger.debug("Текст пустой, send_request не вызывается")
+                set_style_property(self, "invalid", True)
+                QTimer.singleShot(1000, lambda: set_style_property(self, "invalid", False))
+            event.accept()
+        elif event.key() == Qt.Key.Key_Space and event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            cursor = self.textCursor()
+            cursor.select(cursor.SelectionType.WordUnderCursor)
+            self.completer.setCompletionPrefix(cursor.selectedText())
+            popup = self.completer.popup()
+            popup.setCurrentIndex(self.completer.currentIndex())
+            cr = self.cursorRect()
+            cr.setWidth(popup.sizeHint().width())
+            popup.setGeometry(cr)
+            popup.show()
+            event.accept()
+        else:
+            super().keyPressEvent(event)
+
+# Строка-ограничитель блока кода: ``` или ~~~ и необязательный язык
+FENCE_PATTERN = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+#.-]*)\s*$")
+# Разделители строк, которые QTextDocument превращает в границы текстовых блоков
+LINE_BREAK_PATTERN = re.compile(r"\r\n|[\r\n\u2029]")
+# Категории подсветки токенов Pygments; более частные типы проверяются первыми
+TOKEN_CATEGORIES = [
+    (Token.Name.Decorator, "decorator"),
+    (Token.Name.Builtin, "builtin"),
+    (Token.Name.Function, "function"),
+    (Token.Name.Class, "function"),
+    (Token.Keyword, "keyword"),
+    (Token.Literal.String, "string"),
+    (Token.Literal.Number, "number"),
+    (Token.Comment, "comment")
+]
+
+_lexers = {}
+_guessed_languages = OrderedDict()
+_guessed_languages_lock = threading.Lock()
+_token_categories = {}
+_runs_cache = OrderedDict()
+_runs_cache_lock = threading.Lock()
+_highlight_workers = set()
+
+def guess_language(code):
+    """Определяет язык блока кода по содержимому; результат кэшируется по хэшу кода."""
+    key = hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+    with _guessed_languages_lock:
+        language = _guessed_languages.get(key)
+        if language is not None:
+            _guessed_languages.move_to_end(key)
+            return language
+    try:
+        lexer = guess_lexer(code)
+        language = lexer.aliases[0] if lexer.aliases else ""
+    except ClassNotFound:
+        language = ""
+    with _guessed_languages_lock:
+        _guessed_languages[key] = language
+        if len(_guessed_languages) > HIGHLIGHT_SETTINGS["cache_size"]:
+            _guessed_languages.popitem(last=False)
+    return language
+
+def resolve_language(language, code):
+    """Возвращает язык блока кода: указанный, язык по умолчанию или определенный по содержимому."""
+    return (language or HIGHLIGHT_SETTINGS["default_language"] or guess_language(code)).lower()
+
+def _get_lexer(language, code):
+    """Возвращает лексер Pygments для языка блока кода, создавая его один раз."""
+    language = resolve_language(language, code)
+    if not language:
+        return None
+    if language not in _lexers:
+        try:
+            _lexers[language] = get_lexer_by_name(language)
+        except ClassNotFound:
+            _lexers[language] = None
+    return _lexers[language]
+
+def _token_category(token_type):
+    """Возвращает категорию подсветки для типа токена."""
+    if token_type not in _token_categories:
+        _token_categories[token_type] = next(
+            (category for base, category in TOKEN_CATEGORIES if token_type in base), None
+        )
+    return _token_categories[token_type]
+
+def tokenize_code(language, code, cached_only=False):
+    """Разбивает код на отрезки подсветки по строкам: [[(начало, длина, категория), ...], ...].
+
+    Код разбирается целиком, поэтому многострочные строки и комментарии
+    подсвечиваются верно. Результат кэшируется по хэшу текста; при cached_only=True
+    возвращается None, если результата нет в кэше.
+    """
+    key = (language, hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest())
+    with _runs_cache_lock:
+        runs = _runs_cache.get(key)
+        if runs is not None:
+            _runs_cache.move_to_end(key)
+            return runs
+    if cached_only:
+        return None
+    lexer = _get_lexer(language, code)
+    if lexer is None:
+        runs = [[] for _ in range(code.count("\n") + 1)]
+    else:
+        runs = [[]]
+        column = 0
+        for _, token_type, value in lexer.get_tokens_unprocessed(code):
+            category = _token_category(token_type)
+            for index, part in enumerate(value.split("\n")):
+                if index:
+                    runs.append([])
+                    column = 0
+                if part and category:
+                    line = runs[-1]
+                    if line and line[-1][2] == category and line[-1][0] + line[-1][1] == column:
+                        line[-1] = (line[-1][0], line[-1][1] + len(part), category)
+                    else:
+                        line.append((column, len(part), category))
+                column += len(part)
+    with _runs_cache_lock:
+        _runs_cache[key] = runs
+        if len(_runs_cache) > HIGHLIGHT_SETTINGS["cache_size"]:
+            _runs_cache.popitem(last=False)
+    return runs
+
+def tokenize_fences(text):
+    """Разбирает все блоки кода текста, заполняя кэш разметки; возвращает их число.
+
+    Вызывается в фоновом потоке перед порционной вставкой большого сообщения,
+    чтобы подсветка при вставке брала разметку блоков кода из кэша.
+    """
+    lines = LINE_BREAK_PATTERN.split(text)
+    count = 0
+    index = 0
+    while index < len(lines):
+        fence = FENCE_PATTERN.match(lines[index])
+        index += 1
+        if not fence:
+            continue
+        start = index
+        while index < len(lines):
+            closing = FENCE_PATTERN.match(lines[index])
+            if closing and not closing.group(2) and closing.group(1)[0] == fence.group(1)[0]:
+                break
+            index += 1
+        tokenize_code(fence.group(2), "\n".join(lines[start:index]))
+        count += 1
+        index += 1
+    return count
+
+def highlight_formats(app):
+    """Возвращает форматы категорий подсветки для текущей темы приложения."""
+    theme = getattr(app, "current_theme", "dark")
+    styles = HIGHLIGHT_STYLES.get(theme, HIGHLIGHT_STYLES["dark"])
+    formats = {}
+    for category, color in styles.items():
+        text_format = QTextCharFormat()
+        text_format.setForeground(QColor(color))
+        formats[category] = text_format
+    return formats
+
+def _tokenize_fence(block_number, language, lines):
+    """Разбирает блок кода в фоновом потоке."""
+    return block_number, lines, tokenize_code(language, "\n".join(lines))
+
+def _release_highlight_worker(worker):
+    """Освобождает завершенный поток разбора блока кода."""
+    worker.wait()
+    _highlight_workers.discard(worker)
+
+class SyntaxHighlighter(QSyntaxHighlighter):
+    """Класс для подсветки синтаксиса блоков кода ``` в тексте сообщения.
+
+    Состояние текстового блока: -1 или 0 — обычный текст, n > 0 — строка блока кода,
+    открытого в текстовом блоке с номером n - 1. Блок кода разбирается лексером
+    Pygments целиком при подсветке открывающей строки; большие блоки разбираются
+    в фоновом потоке и подсвечиваются по готовности. Если документ вставляется
+    порциями, строки блока кода читаются из полного текста (set_source_text).
+    """
+    def __init__(self, document, app):
+        super().__init__(document)
+        self.app = app
+        self.formats = {}
+        self._fences = {}
+        self.source_lines = None
+        self.update_colors()
+
+    def set_source_text(self, text):
+        """Задает полный текст документа, который вставляется порциями."""
+        self.source_lines = LINE_BREAK_PATTERN.split(text) if text is not None else None
+
+    def update_colors(self):
+        """Обновляет форматы категорий подсветки в зависимости от темы."""
+        self.formats = highlight_formats(self.app)
+
+    def highlightBlock(self, text):
+        """Применяет подсветку к строке текста."""
+        previous_state = self.previousBlockState()
+        fence = FENCE_PATTERN.match(text)
+        if previous_state <= 0:
+            if not fence:
+                self.setCurrentBlockState(0)
+                return
+            # Открывающая строка блока кода
+            block_number = self.currentBlock().blockNumber()
+            self._fences[block_number] = self._read_fence(fence.group(1)[0], fence.group(2))
+            self.setFormat(0, len(text), self.formats["comment"])
+            self.setCurrentBlockState(block_number + 1)
+            return
+        entry = self._fences.get(previous_state - 1)
+        if entry is None or (fence and not fence.group(2) and fence.group(1)[0] == entry["fence_char"]):
+            # Закрывающая строка блока кода
+            self.setFormat(0, len(text), self.formats["comment"])
+            self.setCurrentBlockState(0)
+            return
+        line_index = self.currentBlock().blockNumber() - previous_state
+        if entry["runs"] is None:
+            # Блок кода еще разбирается в фоновом потоке
+            runs = []
+        elif 0 <= line_index < min(len(entry["lines"]), len(entry["runs"])) and entry["lines"][line_index] == text:
+            runs = entry["runs"][line_index]
+        else:
+            # Строка изменилась после разбора блока: подсвечиваем ее отдельно языком всего блока,
+            # определенным при его разборе, чтобы не определять язык по каждой строке
+            language = entry["language"] or resolve_language(None, "\n".join(entry["lines"]))
+            runs = tokenize_code(language, text)[0]
+        for start, length, category in runs:
+            self.setFormat(start, length, self.formats[category])
+        self.setCurrentBlockState(previous_state)
+
+    def _read_fence(self, fence_char, language):
+        """Собирает строки блока кода после открывающей строки и разбирает их."""
+        lines = []
+        for text in self._following_lines():
+            fence = FENCE_PATTERN.match(text)
+            if fence and not fence.group(2) and fence.group(1)[0] == fence_char:
+                break
+            lines.append(text)
+        code = "\n".join(lines)
+        runs = tokenize_code(language, code, cached_only=True)
+        if runs is None:
+            if len(lines) >= HIGHLIGHT_SETTINGS["async_min_lines"]:
+                worker = Worker(_tokenize_fence, self.currentBlock().blockNumber(), language, lines)
+                worker.signals.finished.connect(self._on_fence_tokenized)
+                worker.finished.connect(lambda: _release_highlight_worker(worker))
+                _highlight_workers.add(worker)
+                worker.start()
+            else:
+                runs = tokenize_code(language, code)
+        return {
+            "fence_char": fence_char,
+            "language": language,
+            "lines": lines,
+            "runs": runs
+        }
+
+    def _following_lines(self):
+        """Возвращает строки после текущего блока: из полного текста, если он задан, иначе из документа."""
+        if self.source_lines is not None:
+            yield from islice(self.source_lines, self.currentBlock().blockNumber() + 1, None)
+            return
+        block = self.currentBlock().next()
+        while block.isValid():
+            yield block.text()
+            block = block.next()
+
+    def _on_fence_tokenized(self, result):
+        """Подсвечивает строки блока кода, разобранного в фоновом потоке."""
+        block_number, lines, runs = result
+        entry = self._fences.get(block_number)
+        if entry is None or entry["lines"] is not lines:
+            return
+        entry["runs"] = runs
+        document = self.document()
+        for number in range(block_number + 1, block_number + 1 + len(lines)):
+            self.rehighlightBlock(document.findBlockByNumber(number))
+
+    def rehighlight(self):
+        """Перезапускает подсветку синтаксиса."""
+        self.update_colors()
+        super().rehighlight()
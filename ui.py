@@ -1,500 +1,634 @@
-from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QComboBox, QLabel, QTextEdit, QLineEdit, QScrollArea,
-    QMenu, QFileDialog, QMessageBox, QDialog, QFormLayout, QRadioButton, QFontComboBox, QSpinBox
-)
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QFont, QShortcut, QKeySequence, QAction
-from config import COLORS, THEMES, LOGGING, SERVER_LOGGING, API_SETTINGS_FILE
-from logging_config import configure_logging
-import logging
-import json
-import os
-from text_editors import NonScrollableTextEdit, EnterKeyTextEdit
-from encrypt import save_api_key
-
-# Инициализация логгера
-app_logger = logging.getLogger('app')
-
-def setup_ui(app):
-    """Настраивает пользовательский интерфейс приложения."""
-    app_logger.debug("Начало настройки UI")
-    central_widget = QWidget()
-    app.setCentralWidget(central_widget)
-    central_widget.setStyleSheet(f"background-color: {COLORS['background']};")
-    main_layout = QVBoxLayout(central_widget)
-    main_layout.setContentsMargins(10, 10, 10, 10)
-    top_layout = QHBoxLayout()
-    top_layout.setSpacing(10)
-    menu_button = QPushButton("Меню")
-    menu_button.setMinimumWidth(100)
-    menu_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    menu = QMenu(menu_button)
-    menu.addAction("Сохранить чат", app.save_chat)
-    menu.addAction("Загрузить чат", app.load_chat_from_file)
-    menu.addAction("Экспорт в файл", app.export_chat)
-    menu.addAction("Ввести API-ключ", lambda: prompt_for_api_key(app))
-    menu.addAction("Настройки API", lambda: prompt_for_api_settings(app))
-    menu.addAction("Настройки логирования", lambda: prompt_for_logging_settings(app))
-    menu.addAction("Выбрать тему", lambda: prompt_for_theme(app))
-    menu.addAction("Настройки шрифта", lambda: prompt_for_font_settings(app))
-    menu_button.setMenu(menu)
-    top_layout.addWidget(menu_button)
-    model_label = QLabel("Выберите модель:")
-    model_label.setMinimumWidth(120)
-    model_label.setStyleSheet(f"color: {COLORS['text']}; background-color: {COLORS['background']};")
-    top_layout.addWidget(model_label)
-    app.model_combobox = QComboBox()
-    app.model_combobox.setMinimumWidth(300)
-    app.model_combobox.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    top_layout.addWidget(app.model_combobox)
-    clear_button = QPushButton("Очистить чат")
-    clear_button.setMinimumWidth(120)
-    clear_button.clicked.connect(app.clear_chat)
-    clear_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    top_layout.addWidget(clear_button)
-    main_layout.addLayout(top_layout)
-    app.chat_area = QScrollArea()
-    app.chat_area.setWidgetResizable(True)
-    app.chat_area.setMinimumHeight(400)
-    app.messages_widget = QWidget()
-    app.messages_widget.setStyleSheet(f"background-color: {COLORS['background']};")
-    app.messages_layout = QVBoxLayout(app.messages_widget)
-    app.messages_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-    # Добавляем кнопку "Загрузить еще" в messages_layout
-    app.load_more_button = QPushButton("Загрузить еще")
-    app.load_more_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    app.load_more_button.clicked.connect(app.load_more_messages)
-    app.load_more_button.setVisible(False)
-    app.messages_layout.addWidget(app.load_more_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignHCenter)  # Явно добавляем в messages_layout
-    app.chat_area.setWidget(app.messages_widget)
-    app.chat_area.setStyleSheet(f"""
-        QScrollArea {{
-            background-color: {COLORS['background']};
-            border: 1px solid {COLORS['border']};
-        }}
-        QScrollBar:vertical {{
-            border: none;
-            background: {COLORS['widget_background']};
-            width: 10px;
-            margin: 0px 0px 0px 0px;
-        }}
-        QScrollBar::handle:vertical {{
-            background: {COLORS['border']};
-            min-height: 20px;
-            border-radius: 5px;
-        }}
-        QScrollBar::add-line:vertical {{
-            background: {COLORS['widget_background']};
-            height: 0px;
-            subcontrol-position: bottom;
-            subcontrol-origin: margin;
-        }}
-        QScrollBar::sub-line:vertical {{
-            background: {COLORS['widget_background']};
-            height: 0px;
-            subcontrol-position: top;
-            subcontrol-origin: margin;
-        }}
-        QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-            background: none;
-        }}
-    """)
-    main_layout.addWidget(app.chat_area)
-    input_layout = QVBoxLayout()
-    input_layout.setSpacing(5)
-    app.file_path_edit = QLineEdit()
-    app.file_path_edit.setReadOnly(True)
-    app.file_path_edit.setMinimumHeight(30)
-    app.file_path_edit.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    input_layout.addWidget(app.file_path_edit)
-    select_file_button = QPushButton("Загрузить файл")
-    select_file_button.setMinimumHeight(30)
-    select_file_button.clicked.connect(app.select_file)
-    select_file_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    input_layout.addWidget(select_file_button)
-    clear_file_button = QPushButton("Очистить файл")
-    clear_file_button.setMinimumHeight(30)
-    clear_file_button.clicked.connect(app.clear_file)
-    clear_file_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    input_layout.addWidget(clear_file_button)
-    image_layout = QHBoxLayout()
-    image_layout.setSpacing(5)
-    image_label = QLabel("URL изображения:")
-    image_label.setMinimumWidth(100)
-    image_label.setStyleSheet(f"color: {COLORS['text']}; background-color: {COLORS['background']};")
-    image_layout.addWidget(image_label)
-    app.image_url_edit = QLineEdit()
-    app.image_url_edit.setMinimumHeight(30)
-    app.image_url_edit.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    image_layout.addWidget(app.image_url_edit)
-    select_image_button = QPushButton("Файл")
-    select_image_button.setMinimumWidth(50)
-    select_image_button.clicked.connect(app.select_image)
-    select_image_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    clear_image_button = QPushButton("×")
-    clear_image_button.setMinimumWidth(30)
-    clear_image_button.clicked.connect(app.clear_image_data)
-    clear_image_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    image_layout.addWidget(select_image_button)
-    image_layout.addWidget(clear_image_button)
-    input_layout.addLayout(image_layout)
-    app.prompt_text = EnterKeyTextEdit(app)
-    app.prompt_text.setFixedHeight(80)
-    app.prompt_text.setStyleSheet(f"background-color: {COLORS['widget_background']}; border: 1px solid {COLORS['border']}; color: {COLORS['text']};")
-    input_layout.addWidget(app.prompt_text)
-    send_button = QPushButton("Отправить")
-    send_button.setMinimumHeight(40)
-    send_button.clicked.connect(app.send_request)
-    send_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    input_layout.addWidget(send_button)
-    main_layout.addLayout(input_layout)
-    app.status_label.setMinimumHeight(20)
-    app.status_label.setStyleSheet(f"color: {COLORS['text']}; background-color: {COLORS['background']};")
-    main_layout.addWidget(app.status_label)
-    app_logger.debug("UI успешно настроен")
-
-def setup_clipboard(app):
-    """Настраивает контекстное меню и горячие клавиши для работы с буфером обмена."""
-    app.context_menu = QMenu(app)
-    app.copy_action = QAction("Копировать текст", app)
-    app.copy_action.triggered.connect(app.copy_text)
-    app.select_all_action = QAction("Выделить всё", app)
-    app.select_all_action.triggered.connect(app.select_all_messages)
-    app.paste_action = QAction("Вставить", app)
-    app.paste_action.triggered.connect(app.paste_text)
-    app.context_menu.addAction(app.copy_action)
-    app.context_menu.addAction(app.select_all_action)
-    app.context_menu.addSeparator()
-    app.context_menu.addAction(app.paste_action)
-    QShortcut(QKeySequence("Ctrl+C"), app, app.copy_text)
-    QShortcut(QKeySequence("Ctrl+V"), app, app.paste_text)
-
-def prompt_for_api_key(app):
-    """Открывает диалог для ввода API-ключа."""
-    dialog = QMainWindow(app)
-    dialog.setWindowTitle("Введите API-ключ")
-    dialog.setFixedSize(400, 150)
-    dialog.setStyleSheet(f"background-color: {COLORS['background']};")
-    central_widget = QWidget()
-    dialog.setCentralWidget(central_widget)
-    layout = QVBoxLayout(central_widget)
-    label = QLabel("Введите ваш API-ключ:")
-    label.setStyleSheet(f"color: {COLORS['text']};")
-    layout.addWidget(label)
-    entry = QLineEdit()
-    entry.setEchoMode(QLineEdit.EchoMode.Password)
-    entry.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addWidget(entry)
-    save_button = QPushButton("Сохранить")
-    save_button.clicked.connect(lambda: _save_api_key(app, dialog, entry))
-    save_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addWidget(save_button)
-    dialog.show()
-
-def _save_api_key(app, dialog, entry):
-    """Сохраняет API-ключ из диалога."""
-    api_key = entry.text().strip()
-    if not api_key:
-        QMessageBox.critical(dialog, "Ошибка", "API-ключ не может быть пустым")
-        return
-    try:
-        save_api_key(api_key)
-        app.api_key = api_key
-        app.status_label.setText("API-ключ успешно сохранен")
-        dialog.close()
-        app.load_models()
-    except Exception as e:
-        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить API-ключ: {str(e)}")
-        app_logger.error(f"Ошибка сохранения API-ключа: {str(e)}")
-
-def prompt_for_api_settings(app):
-    """Открывает диалог для ввода настроек API."""
-    dialog = QMainWindow(app)
-    dialog.setWindowTitle("Настройки API")
-    dialog.setFixedSize(500, 400)
-    dialog.setStyleSheet(f"background-color: {COLORS['background']};")
-    central_widget = QWidget()
-    dialog.setCentralWidget(central_widget)
-    layout = QVBoxLayout(central_widget)
-    fields = [
-        ("BASE_URL", "Базовый URL API:", QLineEdit, str),
-        ("API_REQUEST_TIMEOUT", "Таймаут запроса (сек):", QLineEdit, int),
-        ("TEMPERATURE", "Температура (0-2):", QLineEdit, float),
-        ("MAX_COMPLETION_TOKENS", "Макс. токенов:", QLineEdit, int),
-        ("SEED", "Seed:", QLineEdit, int),
-        ("SYSTEM_PROMPT", "Системный промпт:", QTextEdit, str)
-    ]
-    input_widgets = {}
-    for key, label_text, widget_type, value_type in fields:
-        label = QLabel(label_text)
-        label.setStyleSheet(f"color: {COLORS['text']};")
-        layout.addWidget(label)
-        widget = widget_type()
-        if widget_type == QTextEdit:
-            widget.setFixedHeight(80)
-        widget.setText(str(app.api_settings[key]) if value_type == str else str(app.api_settings[key]))
-        widget.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-        layout.addWidget(widget)
-        input_widgets[key] = widget
-    save_button = QPushButton("Сохранить")
-    save_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    save_button.clicked.connect(lambda: _save_api_settings(app, dialog, input_widgets))
-    layout.addWidget(save_button)
-    dialog.show()
-
-def _save_api_settings(app, dialog, input_widgets):
-    """Сохраняет настройки API из диалога."""
-    try:
-        new_settings = {}
-        for key, widget in input_widgets.items():
-            value = widget.toPlainText() if isinstance(widget, QTextEdit) else widget.text().strip()
-            if not value:
-                raise ValueError(f"Поле {key} не может быть пустым")
-            if key == "API_REQUEST_TIMEOUT":
-                value = int(value)
-                if value <= 0:
-                    raise ValueError("Таймаут должен быть больше 0")
-            elif key == "TEMPERATURE":
-                value = float(value)
-                if not 0 <= value <= 2:
-                    raise ValueError("Температура должна быть от 0 до 2")
-            elif key == "MAX_COMPLETION_TOKENS":
-                value = int(value)
-                if value <= 0:
-                    raise ValueError("Количество токенов должно быть больше 0")
-            elif key == "SEED":
-                value = int(value)
-            elif key == "BASE_URL":
-                if not value.startswith("http"):
-                    raise ValueError("URL должен начинаться с http или https")
-            new_settings[key] = value
-        app.api_settings.update(new_settings)
-        app.save_api_settings()
-        app.status_label.setText("Настройки API сохранены")
-        dialog.close()
-    except ValueError as e:
-        QMessageBox.critical(dialog, "Ошибка", str(e))
-    except Exception as e:
-        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить настройки: {str(e)}")
-        app_logger.error(f"Ошибка сохранения настроек API: {str(e)}")
-
-def prompt_for_theme(app):
-    """Открывает диалог для выбора темы."""
-    dialog = QDialog(app)
-    dialog.setWindowTitle("Выбор темы")
-    dialog.setFixedSize(300, 150)
-    dialog.setStyleSheet(f"background-color: {COLORS['background']};")
-    layout = QFormLayout(dialog)
-    theme_group = QWidget()
-    theme_layout = QVBoxLayout(theme_group)
-    radio_buttons = {}
-    for theme_name in THEMES:
-        rb = QRadioButton(theme_name.capitalize())
-        rb.setStyleSheet(f"color: {COLORS['text']};")
-        if theme_name == app.current_theme:
-            rb.setChecked(True)
-        radio_buttons[theme_name] = rb
-        theme_layout.addWidget(rb)
-    layout.addRow("Тема:", theme_group)
-    save_button = QPushButton("Сохранить")
-    save_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    save_button.clicked.connect(lambda: _save_theme(app, dialog, radio_buttons))
-    layout.addWidget(save_button)
-    dialog.exec()
-
-def _save_theme(app, dialog, radio_buttons):
-    """Сохраняет выбранную тему из диалога."""
-    try:
-        selected_theme = next(theme for theme, rb in radio_buttons.items() if rb.isChecked())
-        app.current_theme = selected_theme
-        global COLORS
-        COLORS = THEMES[selected_theme].copy()
-        COLORS["font_family"] = THEMES[selected_theme]["font_family"]
-        COLORS["font_size"] = THEMES[selected_theme]["font_size"]
-        app_logger.info(f"Тема изменена на '{selected_theme}'")
-        app.save_theme_settings()
-        app.centralWidget().deleteLater()
-        app.setCentralWidget(QWidget())
-        setup_ui(app)
-        app.load_chat_history()
-        QTimer.singleShot(0, app.process_pending_messages)
-        for i in range(app.messages_layout.count()):
-            widget = app.messages_layout.itemAt(i).widget()
-            if isinstance(widget, app.ChatMessage):
-                widget.highlighter.rehighlight()
-        app.status_label.setText(f"Тема '{selected_theme}' применена")
-        dialog.accept()
-    except Exception as e:
-        QMessageBox.critical(dialog, "Ошибка", f"Не удалось применить тему: {str(e)}")
-        app_logger.error(f"Ошибка применения темы: {str(e)}")
-
-def prompt_for_font_settings(app):
-    """Открывает диалог для настройки шрифта."""
-    dialog = QDialog(app)
-    dialog.setWindowTitle("Настройки шрифта")
-    dialog.setFixedSize(300, 200)
-    dialog.setStyleSheet(f"background-color: {COLORS['background']};")
-    layout = QFormLayout(dialog)
-    font_label = QLabel("Шрифт:")
-    font_label.setStyleSheet(f"color: {COLORS['text']};")
-    font_combo = QFontComboBox()
-    font_combo.setCurrentFont(QFont(COLORS['font_family']))
-    font_combo.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(font_label, font_combo)
-    size_label = QLabel("Размер шрифта:")
-    size_label.setStyleSheet(f"color: {COLORS['text']};")
-    size_spin = QSpinBox()
-    size_spin.setRange(8, 24)
-    size_spin.setValue(COLORS['font_size'])
-    size_spin.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(size_label, size_spin)
-    save_button = QPushButton("Сохранить")
-    save_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    save_button.clicked.connect(lambda: _save_font_settings(app, dialog, font_combo, size_spin))
-    layout.addWidget(save_button)
-    dialog.exec()
-
-def _save_font_settings(app, dialog, font_combo, size_spin):
-    """Сохраняет настройки шрифта из диалога."""
-    try:
-        font_family = font_combo.currentFont().family()
-        font_size = size_spin.value()
-        global COLORS
-        COLORS["font_family"] = font_family
-        COLORS["font_size"] = font_size
-        app_logger.info(f"Шрифт изменен на '{font_family}' размером {font_size}pt")
-        app.save_theme_settings()
-        app.centralWidget().deleteLater()
-        app.setCentralWidget(QWidget())
-        setup_ui(app)
-        app.load_chat_history()
-        QTimer.singleShot(0, app.process_pending_messages)
-        app.status_label.setText(f"Шрифт '{font_family}' {font_size}pt применен")
-        dialog.accept()
-    except Exception as e:
-        QMessageBox.critical(dialog, "Ошибка", f"Не удалось применить шрифт: {str(e)}")
-        app_logger.error(f"Ошибка применения шрифта: {str(e)}")
-
-def prompt_for_logging_settings(app):
-    """Открывает диалог для настройки логирования."""
-    # Перезагружаем настройки логирования перед открытием диалога
-    # configure_logging()
-
-    dialog = QDialog(app)
-    dialog.setWindowTitle("Настройки логирования")
-    dialog.setFixedSize(500, 400)
-    dialog.setStyleSheet(f"background-color: {COLORS['background']};")
-    layout = QFormLayout(dialog)
-
-    # Уровень логов программы
-    app_log_level_label = QLabel("Уровень логов программы:")
-    app_log_level_label.setStyleSheet(f"color: {COLORS['text']};")
-    app_log_level_combo = QComboBox()
-    app_log_level_combo.addItems(["OFF", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
-    app_log_level_combo.setCurrentText(LOGGING["level"])
-    app_log_level_combo.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(app_log_level_label, app_log_level_combo)
-
-    # Файл логов программы
-    app_log_file_label = QLabel("Файл логов программы:")
-    app_log_file_label.setStyleSheet(f"color: {COLORS['text']};")
-    app_log_file_edit = QLineEdit()
-    app_log_file_edit.setText(LOGGING["filename"])
-    app_log_file_edit.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(app_log_file_label, app_log_file_edit)
-
-    # Режим записи логов программы
-    app_log_mode_label = QLabel("Режим записи логов программы:")
-    app_log_mode_label.setStyleSheet(f"color: {COLORS['text']};")
-    app_log_mode_combo = QComboBox()
-    app_log_mode_combo.addItems(["append", "recreate"])
-    app_log_mode_combo.setCurrentText(LOGGING.get("mode", "append"))
-    app_log_mode_combo.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(app_log_mode_label, app_log_mode_combo)
-
-    # Уровень логов сервера
-    server_log_level_label = QLabel("Уровень логов сервера:")
-    server_log_level_label.setStyleSheet(f"color: {COLORS['text']};")
-    server_log_level_combo = QComboBox()
-    server_log_level_combo.addItems(["OFF", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
-    server_log_level_combo.setCurrentText(SERVER_LOGGING["level"])
-    server_log_level_combo.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(server_log_level_label, server_log_level_combo)
-
-    # Файл логов сервера
-    server_log_file_label = QLabel("Файл логов сервера:")
-    server_log_file_label.setStyleSheet(f"color: {COLORS['text']};")
-    server_log_file_edit = QLineEdit()
-    server_log_file_edit.setText(SERVER_LOGGING["filename"])
-    server_log_file_edit.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(server_log_file_label, server_log_file_edit)
-
-    # Режим записи логов сервера
-    server_log_mode_label = QLabel("Режим записи логов сервера:")
-    server_log_mode_label.setStyleSheet(f"color: {COLORS['text']};")
-    server_log_mode_combo = QComboBox()
-    server_log_mode_combo.addItems(["append", "recreate"])
-    server_log_mode_combo.setCurrentText(SERVER_LOGGING.get("mode", "append"))
-    server_log_mode_combo.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    layout.addRow(server_log_mode_label, server_log_mode_combo)
-
-    # Кнопка сохранения
-    save_button = QPushButton("Сохранить")
-    save_button.setStyleSheet(f"background-color: {COLORS['widget_background']}; color: {COLORS['text']}; border: 1px solid {COLORS['border']};")
-    save_button.clicked.connect(lambda: _save_logging_settings(
-        app,
-        dialog,
-        app_log_level_combo, app_log_file_edit, app_log_mode_combo,
-        server_log_level_combo, server_log_file_edit, server_log_mode_combo
-    ))
-    layout.addWidget(save_button)
-
-    dialog.exec()
-
-def _save_logging_settings(app, dialog, app_log_level_combo, app_log_file_edit, app_log_mode_combo, server_log_level_combo, server_log_file_edit, server_log_mode_combo):
-    """Сохраняет настройки логирования из диалога."""
-    try:
-        new_app_log_file = app_log_file_edit.text().strip()
-        new_server_log_file = server_log_file_edit.text().strip()
-        app_log_level = app_log_level_combo.currentText()
-        server_log_level = server_log_level_combo.currentText()
-        app_log_mode = app_log_mode_combo.currentText()
-        server_log_mode = server_log_mode_combo.currentText()
-
-        # Валидация
-        if app_log_level != "OFF" and not new_app_log_file:
-            raise ValueError("Путь к файлу логов программы не может быть пустым, если логирование включено")
-        if server_log_level != "OFF" and not new_server_log_file:
-            raise ValueError("Путь к файлу логов сервера не может быть пустым, если логирование включено")
-        if new_app_log_file and not new_app_log_file.endswith(".log"):
-            new_app_log_file += ".log"
-        if new_server_log_file and not new_server_log_file.endswith(".log"):
-            new_server_log_file += ".log"
-
-        # Обновление конфигурации
-        LOGGING.update({
-            "level": app_log_level,
-            "filename": new_app_log_file,
-            "mode": app_log_mode
-        })
-        SERVER_LOGGING.update({
-            "level": server_log_level,
-            "filename": new_server_log_file,
-            "mode": server_log_mode
-        })
-
-        # Сохранение в JSON
-        app.save_logging_config()
-
-        # Переконфигурация логирования
-        configure_logging()
-
-        # Перезапуск сервера
-        app.restart_server()
-        app.status_label.setText("Настройки логирования сохранены")
-        app_logger.info("Настройки логирования обновлены")
-        dialog.accept()
-    except Exception as e:
-        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить настройки логирования: {str(e)}")
-        app_logger.error(f"Ошибка сохранения настроек логирования: {str(e)}")
\ No newline at end of file
+from PyQt6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QPushButton, QComboBox, QLabel, QTextEdit, QLineEdit,
+    QMenu, QFileDialog, QMessageBox, QDialog, QFormLayout, QRadioButton, QFontComboBox, QSpinBox,
+    QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem
+)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont, QShortcut, QKeySequence, QAction
+from config import COLORS, THEMES, LOGGING, SERVER_LOGGING, API_SETTINGS_FILE
+from logging_config import configure_logging
+import logging
+import json
+import os
+from text_editors import NonScrollableTextEdit, EnterKeyTextEdit
+from encrypt import save_api_key
+from worker import Worker
+from utils import _semantic_search_task, _load_full_history
+from chat_view import ChatHistoryView, ChatMessagesView, ContentRole
+from metrics import metrics, STAGES
+from profiler import profiler
+from styles import set_theme
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+def setup_ui(app):
+    """Настраивает пользовательский интерфейс приложения."""
+    app_logger.debug("Начало настройки UI")
+    central_widget = QWidget()
+    central_widget.setObjectName("centralWidget")
+    app.setCentralWidget(central_widget)
+    main_layout = QVBoxLayout(central_widget)
+    main_layout.setContentsMargins(10, 10, 10, 10)
+    top_layout = QHBoxLayout()
+    top_layout.setSpacing(10)
+    menu_button = QPushButton("Меню")
+    menu_button.setMinimumWidth(100)
+    menu = QMenu(menu_button)
+    menu.addAction("Сохранить чат", app.save_chat)
+    menu.addAction("Загрузить чат", app.load_chat_from_file)
+    menu.addAction("Экспорт в файл", app.export_chat)
+    menu.addAction("Архив истории", lambda: prompt_for_history_archive(app))
+    menu.addAction("Семантический поиск", lambda: prompt_for_semantic_search(app))
+    menu.addAction("Эмбеддинги из файла", app.embed_corpus)
+    menu.addAction("Экспорт эмбеддингов (.npy)", app.export_embeddings)
+    menu.addAction("Ввести API-ключ", lambda: prompt_for_api_key(app))
+    menu.addAction("Настройки API", lambda: prompt_for_api_settings(app))
+    response_cache_action = menu.addAction("Кэш ответов")
+    response_cache_action.setCheckable(True)
+    response_cache_action.setChecked(app.api_settings.get("RESPONSE_CACHE", False))
+    response_cache_action.toggled.connect(app.toggle_response_cache)
+    menu.addAction("Очистить кэш ответов", app.clear_response_cache)
+    attachment_retrieval_action = menu.addAction("Только релевантные фрагменты файла")
+    attachment_retrieval_action.setCheckable(True)
+    attachment_retrieval_action.setChecked(app.api_settings.get("ATTACHMENT_RETRIEVAL", False))
+    attachment_retrieval_action.toggled.connect(app.toggle_attachment_retrieval)
+    menu.addAction("Настройки логирования", lambda: prompt_for_logging_settings(app))
+    menu.addAction("Диагностика", lambda: prompt_for_diagnostics(app))
+    app.profiling_action = menu.addAction("Профилирование (cProfile + tracemalloc)")
+    app.profiling_action.setCheckable(True)
+    app.profiling_action.setChecked(profiler.active)
+    app.profiling_action.toggled.connect(app.toggle_profiling)
+    menu.addAction("Профилировать следующий запрос", app.profile_next_request)
+    menu.addAction("Выбрать тему", lambda: prompt_for_theme(app))
+    menu.addAction("Настройки шрифта", lambda: prompt_for_font_settings(app))
+    menu_button.setMenu(menu)
+    top_layout.addWidget(menu_button)
+    model_label = QLabel("Выберите модель:")
+    model_label.setMinimumWidth(120)
+    top_layout.addWidget(model_label)
+    app.model_combobox = QComboBox()
+    app.model_combobox.setMinimumWidth(300)
+    top_layout.addWidget(app.model_combobox)
+    clear_button = QPushButton("Очистить чат")
+    clear_button.setMinimumWidth(120)
+    clear_button.clicked.connect(app.clear_chat)
+    top_layout.addWidget(clear_button)
+    main_layout.addLayout(top_layout)
+    # Кнопка "Загрузить еще" находится над лентой: строки ленты — только сообщения
+    app.load_more_button = QPushButton("Загрузить еще")
+    app.load_more_button.clicked.connect(app.load_more_messages)
+    app.load_more_button.setVisible(False)
+    main_layout.addWidget(app.load_more_button, alignment=Qt.AlignmentFlag.AlignHCenter)
+    # Лента чата: виджеты сообщений создаются только для строк возле видимой области
+    app.chat_area = ChatMessagesView(app.create_message_widget)
+    app.chat_area.message_laid_out.connect(app._on_message_laid_out)
+    app.chat_area.setMinimumHeight(400)
+    app.chat_area.verticalScrollBar().valueChanged.connect(app.schedule_visibility_update)
+    app.chat_area.verticalScrollBar().rangeChanged.connect(app.schedule_visibility_update)
+    app.chat_area.viewport().installEventFilter(app)
+    main_layout.addWidget(app.chat_area)
+    input_layout = QVBoxLayout()
+    input_layout.setSpacing(5)
+    app.file_path_edit = QLineEdit()
+    app.file_path_edit.setReadOnly(True)
+    app.file_path_edit.setMinimumHeight(30)
+    input_layout.addWidget(app.file_path_edit)
+    select_file_button = QPushButton("Загрузить файл")
+    select_file_button.setMinimumHeight(30)
+    select_file_button.clicked.connect(app.select_file)
+    input_layout.addWidget(select_file_button)
+    clear_file_button = QPushButton("Очистить файл")
+    clear_file_button.setMinimumHeight(30)
+    clear_file_button.clicked.connect(app.clear_file)
+    input_layout.addWidget(clear_file_button)
+    image_layout = QHBoxLayout()
+    image_layout.setSpacing(5)
+    image_label = QLabel("URL изображения:")
+    image_label.setMinimumWidth(100)
+    image_layout.addWidget(image_label)
+    app.image_url_edit = QLineEdit()
+    app.image_url_edit.setMinimumHeight(30)
+    image_layout.addWidget(app.image_url_edit)
+    select_image_button = QPushButton("Файл")
+    select_image_button.setMinimumWidth(50)
+    select_image_button.clicked.connect(app.select_image)
+    clear_image_button = QPushButton("×")
+    clear_image_button.setMinimumWidth(30)
+    clear_image_button.clicked.connect(app.clear_image_data)
+    image_layout.addWidget(select_image_button)
+    image_layout.addWidget(clear_image_button)
+    input_layout.addLayout(image_layout)
+    app.prompt_text = EnterKeyTextEdit(app)
+    app.prompt_text.setFixedHeight(80)
+    input_layout.addWidget(app.prompt_text)
+    send_button = QPushButton("Отправить")
+    send_button.setMinimumHeight(40)
+    send_button.clicked.connect(app.send_request)
+    input_layout.addWidget(send_button)
+    main_layout.addLayout(input_layout)
+    app.status_label.setMinimumHeight(20)
+    main_layout.addWidget(app.status_label)
+    app_logger.debug("UI успешно настроен")
+
+def setup_clipboard(app):
+    """Настраивает контекстное меню и горячие клавиши для работы с буфером обмена."""
+    app.context_menu = QMenu(app)
+    app.copy_action = QAction("Копировать текст", app)
+    app.copy_action.triggered.connect(app.copy_text)
+    app.select_all_action = QAction("Выделить всё", app)
+    app.select_all_action.triggered.connect(app.select_all_messages)
+    app.paste_action = QAction("Вставить", app)
+    app.paste_action.triggered.connect(app.paste_text)
+    app.context_menu.addAction(app.copy_action)
+    app.context_menu.addAction(app.select_all_action)
+    app.context_menu.addSeparator()
+    app.context_menu.addAction(app.paste_action)
+    QShortcut(QKeySequence("Ctrl+C"), app, app.copy_text)
+    QShortcut(QKeySequence("Ctrl+V"), app, app.paste_text)
+
+def prompt_for_api_key(app):
+    """Открывает диалог для ввода API-ключа."""
+    dialog = QMainWindow(app)
+    dialog.setWindowTitle("Введите API-ключ")
+    dialog.setFixedSize(400, 150)
+    central_widget = QWidget()
+    dialog.setCentralWidget(central_widget)
+    layout = QVBoxLayout(central_widget)
+    label = QLabel("Введите ваш API-ключ:")
+    layout.addWidget(label)
+    entry = QLineEdit()
+    entry.setEchoMode(QLineEdit.EchoMode.Password)
+    layout.addWidget(entry)
+    save_button = QPushButton("Сохранить")
+    save_button.clicked.connect(lambda: _save_api_key(app, dialog, entry))
+    layout.addWidget(save_button)
+    dialog.show()
+
+def _save_api_key(app, dialog, entry):
+    """Сохраняет API-ключ из диалога."""
+    api_key = entry.text().strip()
+    if not api_key:
+        QMessageBox.critical(dialog, "Ошибка", "API-ключ не может быть пустым")
+        return
+    try:
+        save_api_key(api_key)
+        app.api_key = api_key
+        app.status_label.setText("API-ключ успешно сохранен")
+        dialog.close()
+        app.load_models()
+    except Exception as e:
+        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить API-ключ: {str(e)}")
+        app_logger.error(f"Ошибка сохранения API-ключа: {str(e)}")
+
+def prompt_for_api_settings(app):
+    """Открывает диалог для ввода настроек API."""
+    dialog = QMainWindow(app)
+    dialog.setWindowTitle("Настройки API")
+    dialog.setFixedSize(500, 400)
+    central_widget = QWidget()
+    dialog.setCentralWidget(central_widget)
+    layout = QVBoxLayout(central_widget)
+    fields = [
+        ("BASE_URL", "Базовый URL API:", QLineEdit, str),
+        ("API_REQUEST_TIMEOUT", "Таймаут запроса (сек):", QLineEdit, int),
+        ("TEMPERATURE", "Температура (0-2):", QLineEdit, float),
+        ("MAX_COMPLETION_TOKENS", "Макс. токенов:", QLineEdit, int),
+        ("SEED", "Seed:", QLineEdit, int),
+        ("SYSTEM_PROMPT", "Системный промпт:", QTextEdit, str)
+    ]
+    input_widgets = {}
+    for key, label_text, widget_type, value_type in fields:
+        label = QLabel(label_text)
+        layout.addWidget(label)
+        widget = widget_type()
+        if widget_type == QTextEdit:
+            widget.setFixedHeight(80)
+        widget.setText(str(app.api_settings[key]) if value_type == str else str(app.api_settings[key]))
+        layout.addWidget(widget)
+        input_widgets[key] = widget
+    save_button = QPushButton("Сохранить")
+    save_button.clicked.connect(lambda: _save_api_settings(app, dialog, input_widgets))
+    layout.addWidget(save_button)
+    dialog.show()
+
+def _save_api_settings(app, dialog, input_widgets):
+    """Сохраняет настройки API из диалога."""
+    try:
+        new_settings = {}
+        for key, widget in input_widgets.items():
+            value = widget.toPlainText() if isinstance(widget, QTextEdit) else widget.text().strip()
+            if not value:
+                raise ValueError(f"Поле {key} не может быть пустым")
+            if key == "API_REQUEST_TIMEOUT":
+                value = int(value)
+                if value <= 0:
+                    raise ValueError("Таймаут должен быть больше 0")
+            elif key == "TEMPERATURE":
+                value = float(value)
+                if not 0 <= value <= 2:
+                    raise ValueError("Температура должна быть от 0 до 2")
+            elif key == "MAX_COMPLETION_TOKENS":
+                value = int(value)
+                if value <= 0:
+                    raise ValueError("Количество токенов должно быть больше 0")
+            elif key == "SEED":
+                value = int(value)
+            elif key == "BASE_URL":
+                if not value.startswith("http"):
+                    raise ValueError("URL должен начинаться с http или https")
+            new_settings[key] = value
+        app.api_settings.update(new_settings)
+        app.save_api_settings()
+        app.status_label.setText("Настройки API сохранены")
+        dialog.close()
+    except ValueError as e:
+        QMessageBox.critical(dialog, "Ошибка", str(e))
+    except Exception as e:
+        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить настройки: {str(e)}")
+        app_logger.error(f"Ошибка сохранения настроек API: {str(e)}")
+
+def prompt_for_theme(app):
+    """Открывает диалог для выбора темы."""
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Выбор темы")
+    dialog.setFixedSize(300, 150)
+    layout = QFormLayout(dialog)
+    theme_group = QWidget()
+    theme_layout = QVBoxLayout(theme_group)
+    radio_buttons = {}
+    for theme_name in THEMES:
+        rb = QRadioButton(theme_name.capitalize())
+        if theme_name == app.current_theme:
+            rb.setChecked(True)
+        radio_buttons[theme_name] = rb
+        theme_layout.addWidget(rb)
+    layout.addRow("Тема:", theme_group)
+    save_button = QPushButton("Сохранить")
+    save_button.clicked.connect(lambda: _save_theme(app, dialog, radio_buttons))
+    layout.addWidget(save_button)
+    dialog.exec()
+
+def _save_theme(app, dialog, radio_buttons):
+    """Сохраняет выбранную тему из диалога."""
+    try:
+        selected_theme = next(theme for theme, rb in radio_buttons.items() if rb.isChecked())
+        app.current_theme = selected_theme
+        set_theme(selected_theme)
+        app_logger.info(f"Тема изменена на '{selected_theme}'")
+        app.save_theme_settings()
+        app.apply_theme()
+        app.status_label.setText(f"Тема '{selected_theme}' применена")
+        dialog.accept()
+    except Exception as e:
+        QMessageBox.critical(dialog, "Ошибка", f"Не удалось применить тему: {str(e)}")
+        app_logger.error(f"Ошибка применения темы: {str(e)}")
+
+def prompt_for_font_settings(app):
+    """Открывает диалог для настройки шрифта."""
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Настройки шрифта")
+    dialog.setFixedSize(300, 200)
+    layout = QFormLayout(dialog)
+    font_label = QLabel("Шрифт:")
+    font_combo = QFontComboBox()
+    font_combo.setCurrentFont(QFont(COLORS['font_family']))
+    layout.addRow(font_label, font_combo)
+    size_label = QLabel("Размер шрифта:")
+    size_spin = QSpinBox()
+    size_spin.setRange(8, 24)
+    size_spin.setValue(COLORS['font_size'])
+    layout.addRow(size_label, size_spin)
+    save_button = QPushButton("Сохранить")
+    save_button.clicked.connect(lambda: _save_font_settings(app, dialog, font_combo, size_spin))
+    layout.addWidget(save_button)
+    dialog.exec()
+
+def _save_font_settings(app, dialog, font_combo, size_spin):
+    """Сохраняет настройки шрифта из диалога."""
+    try:
+        font_family = font_combo.currentFont().family()
+        font_size = size_spin.value()
+        set_theme(app.current_theme, font_family, font_size)
+        app_logger.info(f"Шрифт изменен на '{font_family}' размером {font_size}pt")
+        app.save_theme_settings()
+        app.apply_theme()
+        app.status_label.setText(f"Шрифт '{font_family}' {font_size}pt применен")
+        dialog.accept()
+    except Exception as e:
+        QMessageBox.critical(dialog, "Ошибка", f"Не удалось применить шрифт: {str(e)}")
+        app_logger.error(f"Ошибка применения шрифта: {str(e)}")
+
+def prompt_for_logging_settings(app):
+    """Открывает диалог для настройки логирования."""
+    # Перезагружаем настройки логирования перед открытием диалога
+    # configure_logging()
+
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Настройки логирования")
+    dialog.setFixedSize(500, 400)
+    layout = QFormLayout(dialog)
+
+    # Уровень логов программы
+    app_log_level_label = QLabel("Уровень логов программы:")
+    app_log_level_combo = QComboBox()
+    app_log_level_combo.addItems(["OFF", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
+    app_log_level_combo.setCurrentText(LOGGING["level"])
+    layout.addRow(app_log_level_label, app_log_level_combo)
+
+    # Файл логов программы
+    app_log_file_label = QLabel("Файл логов программы:")
+    app_log_file_edit = QLineEdit()
+    app_log_file_edit.setText(LOGGING["filename"])
+    layout.addRow(app_log_file_label, app_log_file_edit)
+
+    # Режим записи логов программы
+    app_log_mode_label = QLabel("Режим записи логов программы:")
+    app_log_mode_combo = QComboBox()
+    app_log_mode_combo.addItems(["append", "recreate"])
+    app_log_mode_combo.setCurrentText(LOGGING.get("mode", "append"))
+    layout.addRow(app_log_mode_label, app_log_mode_combo)
+
+    # Уровень логов сервера
+    server_log_level_label = QLabel("Уровень логов сервера:")
+    server_log_level_combo = QComboBox()
+    server_log_level_combo.addItems(["OFF", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
+    server_log_level_combo.setCurrentText(SERVER_LOGGING["level"])
+    layout.addRow(server_log_level_label, server_log_level_combo)
+
+    # Файл логов сервера
+    server_log_file_label = QLabel("Файл логов сервера:")
+    server_log_file_edit = QLineEdit()
+    server_log_file_edit.setText(SERVER_LOGGING["filename"])
+    layout.addRow(server_log_file_label, server_log_file_edit)
+
+    # Режим записи логов сервера
+    server_log_mode_label = QLabel("Режим записи логов сервера:")
+    server_log_mode_combo = QComboBox()
+    server_log_mode_combo.addItems(["append", "recreate"])
+    server_log_mode_combo.setCurrentText(SERVER_LOGGING.get("mode", "append"))
+    layout.addRow(server_log_mode_label, server_log_mode_combo)
+
+    # Кнопка сохранения
+    save_button = QPushButton("Сохранить")
+    save_button.clicked.connect(lambda: _save_logging_settings(
+        app,
+        dialog,
+        app_log_level_combo, app_log_file_edit, app_log_mode_combo,
+        server_log_level_combo, server_log_file_edit, server_log_mode_combo
+    ))
+    layout.addWidget(save_button)
+
+    dialog.exec()
+
+def _save_logging_settings(app, dialog, app_log_level_combo, app_log_file_edit, app_log_mode_combo, server_log_level_combo, server_log_file_edit, server_log_mode_combo):
+    """Сохраняет настройки логирования из диалога."""
+    try:
+        new_app_log_file = app_log_file_edit.text().strip()
+        new_server_log_file = server_log_file_edit.text().strip()
+        app_log_level = app_log_level_combo.currentText()
+        server_log_level = server_log_level_combo.currentText()
+        app_log_mode = app_log_mode_combo.currentText()
+        server_log_mode = server_log_mode_combo.currentText()
+
+        # Валидация
+        if app_log_level != "OFF" and not new_app_log_file:
+            raise ValueError("Путь к файлу логов программы не может быть пустым, если логирование включено")
+        if server_log_level != "OFF" and not new_server_log_file:
+            raise ValueError("Путь к файлу логов сервера не может быть пустым, если логирование включено")
+        if new_app_log_file and not new_app_log_file.endswith(".log"):
+            new_app_log_file += ".log"
+        if new_server_log_file and not new_server_log_file.endswith(".log"):
+            new_server_log_file += ".log"
+
+        # Обновление конфигурации
+        LOGGING.update({
+            "level": app_log_level,
+            "filename": new_app_log_file,
+            "mode": app_log_mode
+        })
+        SERVER_LOGGING.update({
+            "level": server_log_level,
+            "filename": new_server_log_file,
+            "mode": server_log_mode
+        })
+
+        # Сохранение в JSON
+        app.save_logging_config()
+
+        # Переконфигурация логирования
+        configure_logging()
+
+        # Перезапуск сервера
+        app.restart_server()
+        app.status_label.setText("Настройки логирования сохранены")
+        app_logger.info("Настройки логирования обновлены")
+        dialog.accept()
+    except Exception as e:
+        QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить настройки логирования: {str(e)}")
+        app_logger.error(f"Ошибка сохранения настроек логирования: {str(e)}")
+
+def prompt_for_history_archive(app):
+    """Открывает архив полной истории чата в виртуализированном списке."""
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Архив истории")
+    dialog.resize(800, 600)
+    layout = QVBoxLayout(dialog)
+    view = ChatHistoryView(dialog)
+    layout.addWidget(view)
+    status = QLabel("Загрузка истории...")
+    layout.addWidget(status)
+    copy_shortcut = QShortcut(QKeySequence.StandardKey.Copy, view)
+    copy_shortcut.activated.connect(lambda: QApplication.clipboard().setText(view.selected_text()))
+
+    def show_full_message(index):
+        message_dialog = QDialog(dialog)
+        message_dialog.setWindowTitle("Сообщение")
+        message_dialog.resize(700, 500)
+        message_layout = QVBoxLayout(message_dialog)
+        text = QTextEdit()
+        text.setReadOnly(True)
+        text.setFont(QFont(COLORS['font_family'], COLORS['font_size']))
+        text.setPlainText(index.data(ContentRole))
+        message_layout.addWidget(text)
+        message_dialog.show()
+
+    def on_loaded(messages):
+        view.set_messages(messages)
+        status.setText(f"Сообщений: {len(messages)}. Ctrl+C — копировать выделенные, двойной щелчок — полный текст")
+
+    def on_error(error_msg):
+        status.setText(f"Ошибка загрузки истории: {error_msg}")
+
+    view.doubleClicked.connect(show_full_message)
+    worker = Worker(_load_full_history)
+    worker.signals.finished.connect(on_loaded)
+    worker.signals.error.connect(on_error)
+    worker.signals.finished.connect(lambda result: app.cleanup_worker(worker))
+    worker.signals.error.connect(lambda msg: app.cleanup_worker(worker))
+    app.workers.append(worker)
+    worker.start()
+    dialog.show()
+
+def prompt_for_semantic_search(app):
+    """Открывает панель семантического поиска по истории чата."""
+    embedding_models = [
+        app.model_combobox.itemText(i).replace("[Эмбеддинг]", "").strip()
+        for i in range(app.model_combobox.count())
+        if app.model_combobox.itemText(i).startswith("[Эмбеддинг]")
+    ]
+    if not embedding_models:
+        QMessageBox.critical(app, "Ошибка", "Нет доступных моделей эмбеддингов")
+        return
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Семантический поиск")
+    dialog.resize(700, 500)
+    layout = QVBoxLayout(dialog)
+    model_combo = QComboBox()
+    model_combo.addItems(embedding_models)
+    layout.addWidget(model_combo)
+    query_layout = QHBoxLayout()
+    query_edit = QLineEdit()
+    query_edit.setPlaceholderText("Что искать в истории чата?")
+    query_layout.addWidget(query_edit)
+    search_button = QPushButton("Искать")
+    query_layout.addWidget(search_button)
+    layout.addLayout(query_layout)
+    results_list = QListWidget()
+    layout.addWidget(results_list)
+    preview = QTextEdit()
+    preview.setReadOnly(True)
+    layout.addWidget(preview)
+    status = QLabel("")
+    layout.addWidget(status)
+    results_list.currentItemChanged.connect(
+        lambda item, _: preview.setPlainText(item.data(Qt.ItemDataRole.UserRole) if item else "")
+    )
+
+    def on_results(result):
+        results_list.clear()
+        for score, msg in result["results"]:
+            role = "Вы" if msg["role"] == "user" else "Ассистент"
+            snippet = " ".join(msg["text"].split())[:150]
+            item = QListWidgetItem(f"[{score:.3f}] {msg['timestamp']} {role}: {snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, msg["text"])
+            results_list.addItem(item)
+        status.setText(f"Сообщений в индексе: {result['total']} (новых: {result['added']})")
+        search_button.setEnabled(True)
+
+    def on_error(error_msg):
+        status.setText(error_msg)
+        search_button.setEnabled(True)
+
+    def run_search():
+        query = query_edit.text().strip()
+        if not query:
+            return
+        search_button.setEnabled(False)
+        status.setText("Поиск...")
+        worker = Worker(_semantic_search_task, model_combo.currentText(), query, app.api_settings, app.api_key)
+        worker.signals.finished.connect(on_results)
+        worker.signals.error.connect(on_error)
+        worker.signals.finished.connect(lambda result: app.cleanup_worker(worker))
+        worker.signals.error.connect(lambda msg: app.cleanup_worker(worker))
+        app.workers.append(worker)
+        worker.start()
+
+    search_button.clicked.connect(run_search)
+    query_edit.returnPressed.connect(run_search)
+    dialog.show()
+
+def prompt_for_diagnostics(app):
+    """Открывает панель диагностики с задержками запросов по моделям и зависаниями интерфейса."""
+    dialog = QDialog(app)
+    dialog.setWindowTitle("Диагностика")
+    dialog.resize(900, 500)
+    layout = QVBoxLayout(dialog)
+    summary_label = QLabel("Задержки по моделям, мс (p50 / p95):")
+    layout.addWidget(summary_label)
+    summary_table = QTableWidget()
+    layout.addWidget(summary_table)
+    recent_label = QLabel("Последние запросы:")
+    layout.addWidget(recent_label)
+    recent_table = QTableWidget()
+    layout.addWidget(recent_table)
+    stalls_label = QLabel()
+    layout.addWidget(stalls_label)
+    stalls_table = QTableWidget()
+    layout.addWidget(stalls_table)
+
+    def fill_tables():
+        summary = metrics.summary()
+        columns = ["Модель", "Запросов", "Из кэша", "Всего", *STAGES, "Токенов (ср.)"]
+        summary_table.setColumnCount(len(columns))
+        summary_table.setHorizontalHeaderLabels(columns)
+        summary_table.setRowCount(len(summary))
+        for row, (model_id, stats) in enumerate(summary.items()):
+            values = [model_id, str(stats["count"]), str(stats["cached"]), f"{stats['total_p50']:.0f} / {stats['total_p95']:.0f}"]
+            for stage in STAGES:
+                stage_stats = stats["stages"].get(stage)
+                values.append(f"{stage_stats['p50']:.1f} / {stage_stats['p95']:.1f}" if stage_stats else "—")
+            values.append(f"{stats['avg_completion_tokens']:.0f}" if stats["avg_completion_tokens"] else "—")
+            for column, value in enumerate(values):
+                summary_table.setItem(row, column, QTableWidgetItem(value))
+        summary_table.resizeColumnsToContents()
+        timelines = metrics.timelines()[-50:][::-1]
+        columns = ["Время", "Модель", "Всего, мс", "Запрос, Б", "Ответ, Б", "Токены", "Этапы, мс"]
+        recent_table.setColumnCount(len(columns))
+        recent_table.setHorizontalHeaderLabels(columns)
+        recent_table.setRowCount(len(timelines))
+        for row, timeline in enumerate(timelines):
+            stages = ", ".join(f"{stage}={timeline.stages[stage]:.1f}" for stage in STAGES if stage in timeline.stages)
+            values = [
+                timeline.started_at,
+                timeline.model_id + (" (кэш)" if timeline.cached else ""),
+                f"{timeline.total_ms:.0f}",
+                str(timeline.request_bytes),
+                str(timeline.response_bytes),
+                str(timeline.usage.get("total_tokens", "—")),
+                stages
+            ]
+            for column, value in enumerate(values):
+                recent_table.setItem(row, column, QTableWidgetItem(value))
+        recent_table.resizeColumnsToContents()
+        detector = app.stall_detector
+        histogram = ", ".join(
+            f"{label}: {count}" for label, count in zip(detector.histogram_labels(), detector.histogram)
+        )
+        stalls_label.setText(f"Зависания интерфейса ({histogram}):")
+        events = list(detector.events)[-50:][::-1]
+        columns = ["Время", "Длительность, мс", "Место", "Стеков"]
+        stalls_table.setColumnCount(len(columns))
+        stalls_table.setHorizontalHeaderLabels(columns)
+        stalls_table.setRowCount(len(events))
+        for row, event in enumerate(events):
+            values = [event["time"], f"{event['duration_ms']:.0f}", event["location"] or "—", str(len(event["samples"]))]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if event["samples"]:
+                    item.setToolTip("\n".join(event["samples"][0]["stack"]))
+                stalls_table.setItem(row, column, item)
+        stalls_table.resizeColumnsToContents()
+
+    def export_metrics():
+        filepath, _ = QFileDialog.getSaveFileName(dialog, "Экспорт метрик", "", "JSON файлы (*.json);;Все файлы (*.*)")
+        if not filepath:
+            return
+        try:
+            metrics.export(filepath)
+            app.status_label.setText(f"Метрики экспортированы в {os.path.basename(filepath)}")
+        except Exception as e:
+            QMessageBox.critical(dialog, "Ошибка", f"Не удалось экспортировать метрики: {str(e)}")
+            app_logger.error(f"Ошибка экспорта метрик: {str(e)}")
+
+    buttons_layout = QHBoxLayout()
+    refresh_button = QPushButton("Обновить")
+    refresh_button.clicked.connect(fill_tables)
+    buttons_layout.addWidget(refresh_button)
+    export_button = QPushButton("Экспорт")
+    export_button.clicked.connect(export_metrics)
+    buttons_layout.addWidget(export_button)
+    layout.addLayout(buttons_layout)
+    fill_tables()
+    dialog.show()
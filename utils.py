@@ -1,98 +1,174 @@
-import os
-import json
-import base64
-import requests
-from urllib.parse import urlparse
-from datetime import datetime
-from PIL import Image
-import logging
-from worker import Worker
-from config import (
-    SUPPORTED_IMAGE_FORMATS, MAX_FILE_SIZE, MAX_IMAGE_RESOLUTION, MIN_IMAGE_RESOLUTION,
-    CHAT_HISTORY_FILE, API_LOGS_DIR, DATE_FORMAT
-)
-
-# Инициализация логгера
-app_logger = logging.getLogger('app')
-
-def _is_valid_url(url):
-    """Проверяет валидность URL."""
-    try:
-        result = urlparse(url)
-        return all([result.scheme, result.netloc])
-    except:
-        return False
-
-def _process_images_task(filepaths):
-    """Обрабатывает выбранные изображения в фоновом потоке."""
-    results = []
-    for filepath in filepaths:
-        ext = os.path.splitext(filepath)[1][1:].lower()
-        if ext not in SUPPORTED_IMAGE_FORMATS:
-            raise ValueError(f"Неподдерживаемый формат: {ext}")
-        file_size = os.path.getsize(filepath)
-        if file_size > MAX_FILE_SIZE:
-            raise ValueError(f"Изображение слишком большое ({file_size//1024//1024} МБ).")
-        with Image.open(filepath) as img:
-            width, height = img.size
-            if width > MAX_IMAGE_RESOLUTION[0] or height > MAX_IMAGE_RESOLUTION[1]:
-                raise ValueError(f"Разрешение слишком высокое ({width}x{height}).")
-            if width < MIN_IMAGE_RESOLUTION[0] or height < MIN_IMAGE_RESOLUTION[1]:
-                raise ValueError(f"Разрешение слишком низкое ({width}x{height}). Минимальное: 512x512.")
-        with open(filepath, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
-        results.append((filepath, encoded_image))
-    return results
-
-def _save_chat_history_task(chat_history):
-    """Сохраняет историю чата в фоновом потоке."""
-    if not CHAT_HISTORY_FILE:
-        app_logger.warning("Не указан файл для сохранения истории чата")
-        return
-    history_file = os.path.abspath(CHAT_HISTORY_FILE)
-    history = list(chat_history)
-    for msg in history:
-        if "timestamp" in msg and not isinstance(msg["timestamp"], str):
-            msg["timestamp"] = msg["timestamp"].strftime(DATE_FORMAT)
-    os.makedirs(os.path.dirname(history_file) or ".", exist_ok=True)
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
-
-def _load_models_task(load_chat_models, load_embedding_models):
-    """Загружает списки чат- и эмбеддинг-моделей."""
-    chat_models = load_chat_models()
-    embedding_models = load_embedding_models()
-    return (
-        [f"[Чат] {model}" for model in chat_models] +
-        [f"[Эмбеддинг] {model}" for model in embedding_models]
-    )
-
-def _handle_embedding_task(model_id, prompt, api_settings, api_key):
-    """Обрабатывает задачу создания эмбеддинга."""
-    embeddings_url = f"{api_settings['BASE_URL']}/embeddings"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    data = {
-        "model": model_id,
-        "input": prompt
-    }
-    response = requests.post(embeddings_url, headers=headers, json=data, timeout=api_settings['API_REQUEST_TIMEOUT'])
-    response.raise_for_status()
-    embeddings = response.json()['data'][0]['embedding']
-    return {"choices": [{"message": {"content": f"Эмбеддинг: {embeddings[:10]}..."}}]}
-
-def _log_api_request(model_id, data):
-    """Логирует API-запрос в файл."""
-    os.makedirs(API_LOGS_DIR, exist_ok=True)
-    log_file = os.path.join(API_LOGS_DIR, f"api_request_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump({"model": model_id, "request": data}, f, ensure_ascii=False, indent=2)
-
-def _log_api_response(response):
-    """Логирует API-ответ в файл."""
-    os.makedirs(API_LOGS_DIR, exist_ok=True)
-    log_file = os.path.join(API_LOGS_DIR, f"api_response_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump(response, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+import os
+import json
+import base64
+from urllib.parse import urlparse
+from datetime import datetime
+from PIL import Image
+import logging
+import threading
+from jsonl_writer import JsonlWriter
+from embeddings import embed_texts, read_corpus
+from semantic_search import get_semantic_index
+from config import (
+    SUPPORTED_IMAGE_FORMATS, MAX_FILE_SIZE, MAX_IMAGE_RESOLUTION, MIN_IMAGE_RESOLUTION,
+    CHAT_HISTORY_FILE, API_LOGS_DIR, API_LOGGING, DATE_FORMAT
+)
+
+# Инициализация логгера
+app_logger = logging.getLogger('app')
+
+_api_log_writer = None
+_api_log_writer_lock = threading.Lock()
+
+def _is_valid_url(url):
+    """Проверяет валидность URL."""
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except:
+        return False
+
+def _process_images_task(filepaths):
+    """Обрабатывает выбранные изображения в фоновом потоке."""
+    results = []
+    for filepath in filepaths:
+        ext = os.path.splitext(filepath)[1][1:].lower()
+        if ext not in SUPPORTED_IMAGE_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат: {ext}")
+        file_size = os.path.getsize(filepath)
+        if file_size > MAX_FILE_SIZE:
+            raise ValueError(f"Изображение слишком большое ({file_size//1024//1024} МБ).")
+        with Image.open(filepath) as img:
+            width, height = img.size
+            if width > MAX_IMAGE_RESOLUTION[0] or height > MAX_IMAGE_RESOLUTION[1]:
+                raise ValueError(f"Разрешение слишком высокое ({width}x{height}).")
+            if width < MIN_IMAGE_RESOLUTION[0] or height < MIN_IMAGE_RESOLUTION[1]:
+                raise ValueError(f"Разрешение слишком низкое ({width}x{height}). Минимальное: 512x512.")
+        with open(filepath, "rb") as image_file:
+            encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
+        results.append((filepath, encoded_image))
+    return results
+
+def _save_chat_history_task(chat_history):
+    """Сохраняет историю чата в фоновом потоке."""
+    if not CHAT_HISTORY_FILE:
+        app_logger.warning("Не указан файл для сохранения истории чата")
+        return
+    history_file = os.path.abspath(CHAT_HISTORY_FILE)
+    history = list(chat_history)
+    for msg in history:
+        if "timestamp" in msg and not isinstance(msg["timestamp"], str):
+            msg["timestamp"] = msg["timestamp"].strftime(DATE_FORMAT)
+    os.makedirs(os.path.dirname(history_file) or ".", exist_ok=True)
+    with open(history_file, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+def _load_models_task(load_chat_models, load_embedding_models):
+    """Загружает списки чат- и эмбеддинг-моделей."""
+    chat_models = load_chat_models()
+    embedding_models = load_embedding_models()
+    return (
+        [f"[Чат] {model}" for model in chat_models] +
+        [f"[Эмбеддинг] {model}" for model in embedding_models]
+    )
+
+def _handle_embedding_task(model_id, prompt, api_settings, api_key):
+    """Обрабатывает задачу создания эмбеддинга."""
+    vectors = embed_texts(model_id, [prompt], api_settings, api_key)
+    preview = [round(float(value), 6) for value in vectors[0][:10]]
+    return {
+        "choices": [{"message": {"content": f"Эмбеддинг ({vectors.shape[1]} измерений): {preview}..."}}],
+        "embeddings": vectors
+    }
+
+def _embed_corpus_task(model_id, filepath, api_settings, api_key):
+    """Создает эмбеддинги для всех текстов файла в фоновом потоке."""
+    texts = read_corpus(filepath)
+    if not texts:
+        raise ValueError("Файл не содержит текстов для эмбеддинга")
+    return embed_texts(model_id, texts, api_settings, api_key)
+
+def _elide_images(value):
+    """Заменяет base64-данные изображений на краткое описание."""
+    if isinstance(value, dict):
+        return {key: _elide_images(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_elide_images(item) for item in value]
+    if isinstance(value, str) and value.startswith("data:image/") and ";base64," in value:
+        header, payload = value.split(",", 1)
+        return f"{header},<опущено {len(payload)} символов>"
+    return value
+
+def _prepare_api_log_record(record):
+    """Подготавливает запись журнала API в потоке записи."""
+    if API_LOGGING["elide_images"]:
+        record = _elide_images(record)
+    return record
+
+def _get_api_log_writer():
+    """Возвращает фоновый писатель журнала API, создавая его при первом обращении."""
+    global _api_log_writer
+    with _api_log_writer_lock:
+        if _api_log_writer is None:
+            _api_log_writer = JsonlWriter(
+                API_LOGS_DIR,
+                "api",
+                max_bytes=API_LOGGING["segment_max_bytes"],
+                max_seconds=API_LOGGING["segment_max_seconds"],
+                use_gzip=API_LOGGING["gzip"],
+                transform=_prepare_api_log_record
+            )
+        return _api_log_writer
+
+def _log_api_request(model_id, data, request_id=None):
+    """Логирует API-запрос в журнал."""
+    _get_api_log_writer().write({
+        "type": "request",
+        "request_id": request_id,
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "model": model_id,
+        "request": data
+    })
+
+def _log_api_response(response, request_id=None):
+    """Логирует API-ответ в журнал."""
+    _get_api_log_writer().write({
+        "type": "response",
+        "request_id": request_id,
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "response": response
+    })
+
+def _load_full_history():
+    """Читает полную историю чата из файла."""
+    history_file = os.path.abspath(CHAT_HISTORY_FILE)
+    if not CHAT_HISTORY_FILE or not os.path.exists(history_file):
+        return []
+    with open(history_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _update_completion_index_task(index):
+    """Добавляет в индекс автодополнения сообщения полной истории и сохраняет его."""
+    added = index.update(_load_full_history())
+    index.save()
+    return added
+
+def _history_signature():
+    """Возвращает подпись файла истории чата: время изменения и размер."""
+    history_file = os.path.abspath(CHAT_HISTORY_FILE)
+    if not CHAT_HISTORY_FILE or not os.path.exists(history_file):
+        return None
+    stat = os.stat(history_file)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _semantic_search_task(model_id, query, api_settings, api_key, top_k=None):
+    """Обновляет семантический индекс истории и ищет сообщения, близкие к запросу."""
+    index = get_semantic_index(model_id)
+    added = 0
+    # Полная история читается и хэшируется, только если файл изменился с прошлого обновления
+    signature = _history_signature()
+    if signature is None or signature != index.source_signature:
+        added = index.update(_load_full_history(), api_settings, api_key)
+        index.set_source_signature(signature)
+    query_vector = embed_texts(model_id, [query], api_settings, api_key)[0]
+    return {"added": added, "total": len(index), "results": index.search(query_vector, top_k)}